@@ -16,6 +16,7 @@ migrate = Migrate()
 login = LoginManager()
 login.login_view = 'auth.login'
 
+from app import jobs
 from app.api import api as api_bp
 from app.auth import auth as auth_bp
 from app.errors import errors as errors_bp
@@ -40,6 +41,7 @@ def create_app(config_object=Config):
     app.register_blueprint(finance_bp)
 
     register_jinja_filters(app.jinja_env)
+    jobs.init_app(app)
 
     logger.setLevel(logging.DEBUG)
     log_format = '[%(asctime)s] [%(name)s:%(lineno)d] [%(levelname)s] %(message)s'
@@ -4,8 +4,9 @@ from werkzeug.http import HTTP_STATUS_CODES
 
 from app import db
 from app.api import api
+from app.conditional import conditional
 from app.models import Account, User
-from app.finance.accounts import AccountManager
+from app.finance.balances import get_account_balances
 
 
 def error_response(status_code, message=None):
@@ -54,19 +55,21 @@ def create_user():
 
 
 @api.route('/user/<int:user_id>/accounts')
+@conditional(lambda user_id: user_id)
 def get_user_accounts(user_id):
     user = (
         User.query.filter(User.id == user_id)
-        .options(joinedload(User.accounts))
+        .options(joinedload(User.accounts).joinedload(Account.category))
         .first_or_404()
     )
+    balances = get_account_balances(user_id=user.id)
     payload = {'accounts': []}
     for account in user.accounts:
         account_data = {
             'id': account.id,
             'name': account.name,
             'type': account.category.name,
-            'current_balance': round(account.get_ending_balance(), 2),
+            'current_balance': float(balances[account.id]),
         }
         payload['accounts'].append(account_data)
     return response(payload)
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+import threading
+import time
+
+from flask import current_app
+
+from app.redis_connection import get_redis_connection
+
+_missing = object()
+
+
+class LRUCache:
+    # Bounded per-process cache. The least recently used entry goes once
+    # maxsize is reached and entries older than ttl seconds are never returned
+    def __init__(self, maxsize=128, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, compute):
+        # Two requests missing at once both compute, the last one is kept
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryFragmentCache:
+    # Rendered html kept in this worker process only
+    def __init__(self, maxsize=512, ttl=3600):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @property
+    def hits(self):
+        return self._cache.hits
+
+    @property
+    def misses(self):
+        return self._cache.misses
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisFragmentCache:
+    # Rendered html shared by every worker, redis expires the entries after
+    # ttl seconds. The counters are per process like the in-memory ones
+    key_prefix = 'financial:fragment:'
+
+    def __init__(self, connection, ttl=3600):
+        self.connection = connection
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.connection.get(self.key_prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode('utf-8')
+
+    def set(self, key, value):
+        self.connection.setex(self.key_prefix + key, self.ttl, value.encode('utf-8'))
+
+    def clear(self):
+        keys = list(self.connection.scan_iter(self.key_prefix + '*'))
+        if keys:
+            self.connection.delete(*keys)
+
+
+def get_fragment_cache(app=None):
+    app = app or current_app
+    cache = app.extensions.get('fragment_cache')
+    if cache is None:
+        backend = app.config.get('FRAGMENT_CACHE_BACKEND', 'memory')
+        ttl = app.config['FRAGMENT_CACHE_TTL']
+        if backend == 'redis':
+            connection = get_redis_connection(app)
+            if connection is None:
+                raise ValueError('REDIS_HOST must be set to use the redis cache')
+            cache = RedisFragmentCache(connection, ttl=ttl)
+        elif backend == 'memory':
+            cache = MemoryFragmentCache(
+                maxsize=app.config['FRAGMENT_CACHE_SIZE'], ttl=ttl
+            )
+        else:
+            raise ValueError('Unknown fragment cache backend {}'.format(backend))
+        app.extensions['fragment_cache'] = cache
+    return cache
@@ -0,0 +1,54 @@
+from datetime import date, datetime
+from functools import wraps
+
+from flask import make_response, request
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+
+from app.versions import CATEGORY_VERSION, get_ledger_version_name, get_versions
+
+# Pages built only from one user's ledger and the category tree can be answered
+# with 304 Not Modified straight from the version counters, before the view
+# runs any of its report queries
+
+
+def get_validators(user_id, daily=False):
+    ledger_version = get_ledger_version_name(user_id)
+    versions = get_versions([ledger_version, CATEGORY_VERSION])
+    etag = '{}-{}-{}'.format(
+        user_id, versions[ledger_version][0], versions[CATEGORY_VERSION][0]
+    )
+    updated = [updated_at for _, updated_at in versions.values() if updated_at]
+    if daily:
+        # Pages whose range depends on today, like balances up to today or the
+        # trailing months, change at midnight without any write
+        today = date.today()
+        etag = '{}-{}'.format(etag, today.isoformat())
+        updated.append(datetime(today.year, today.month, today.day))
+    return etag, max(updated, default=None)
+
+
+def conditional(get_user_id, daily=False):
+    # get_user_id is called with the view arguments
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = get_validators(get_user_id(**kwargs), daily)
+            if is_resource_modified(
+                request.environ, etag=etag, last_modified=last_modified
+            ):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = Response(status=304)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Browsers keep the page but check back on every visit
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,65 +1,77 @@
 from datetime import date
-from app.utils import get_decimal, merge_dict_of_lists
+
+from app.finance.matrix import MonthMatrix, rollup_categories
+from app.finance.snapshots import get_snapshots
+from app.money import Cents
 
 
 class AccountData:
-    def __init__(self, account):
+    def __init__(self, account, snapshots=None):
         self.name = account.name
-        self._starting_balance = get_decimal(account.starting_balance)
+        self._starting_balance = Cents() + (account.starting_balance or 0)
         self._category = account.category
-        self.transactions = sorted(account.transactions, key=lambda x: x.date)
-        self._ending_monthly_balances = self._generate_monthly_ending_balances()
+        self._category_id = account.category_id
+        if snapshots is None:
+            snapshots = get_snapshots([account.id])[account.id]
+        self._ending_monthly_balances = self._generate_monthly_ending_balances(
+            snapshots
+        )
 
     def __repr__(self):
         return '<AccountData {}>'.format(self.name)
 
-    def _generate_monthly_ending_balances(self):
-        ending_monthly_balances = {}
-        current_balance = self._starting_balance
-
-        for transaction in self.transactions:
-            previous_balance = current_balance
-            current_balance += get_decimal(transaction.amount)
-
-            transaction_year = transaction.date.year
-            current_date = date.today()
-            num_months = (
-                12 if transaction_year < current_date.year else current_date.month
-            )
-
-            # add year and use previous values for entire year
-            if transaction_year not in ending_monthly_balances:
-                ending_monthly_balances[transaction_year] = [
-                    previous_balance for _ in range(0, num_months)
-                ]
-
-            # overwrite the values for the remainder of the year after transaction
-            for month_index in range(transaction.date.month - 1, num_months):
-                ending_monthly_balances[transaction_year][month_index] = current_balance
-
-            # update all future years with new values up until end_date
-            for i in range(transaction_year + 1, current_date.year + 1):
-                num_months = 12 if i < current_date.year else current_date.month
-                ending_monthly_balances[i] = [
-                    current_balance for _ in range(0, num_months)
-                ]
-
-        return ending_monthly_balances
+    def _generate_monthly_ending_balances(self, snapshots):
+        # snapshots are the stored (year, month, ending balance) rows for months
+        # with transactions, every other month carries the previous balance
+        if not snapshots:
+            return None
+
+        current_date = date.today()
+        balances = MonthMatrix(snapshots[0][0], current_date.year)
+        values = balances.values
+        current_balance = self._starting_balance.value
+        snapshot_index = 0
+        for index in range(len(values)):
+            while (
+                snapshot_index < len(snapshots)
+                and balances.index(*snapshots[snapshot_index][:2]) <= index
+            ):
+                current_balance = snapshots[snapshot_index][2].value
+                snapshot_index += 1
+            values[index] = current_balance
+
+        return balances
 
     def get_monthly_ending_balances(self):
         return self._ending_monthly_balances
 
+    def has_years(self, first_year, last_year):
+        balances = self._ending_monthly_balances
+        return (
+            balances is not None
+            and balances.first_year <= last_year
+            and balances.last_year >= first_year
+        )
+
     def get_starting_balance(self):
         return self._starting_balance
 
+    def get_category_id(self):
+        return self._category_id
+
 
 class AccountManager:
     def __init__(self, accounts=[]):
         self._accounts = []
-        self._total_monthly_balances = {}
-        self._monthly_balances_by_account = {}
+        # One query for the month end balances of every account
+        snapshots = get_snapshots([account.id for account in accounts])
+        first_years = [rows[0][0] for rows in snapshots.values() if rows]
+        current_year = date.today().year
+        self._total_monthly_balances = MonthMatrix(
+            min(first_years, default=current_year), current_year
+        )
         for account in accounts:
-            self.add_account(account)
+            self.add_account(AccountData(account, snapshots[account.id]))
 
     def add_account(self, account):
         if not isinstance(account, AccountData):
@@ -67,18 +79,40 @@ class AccountManager:
 
         self._accounts.append(account)
         account_monthly_balances = account.get_monthly_ending_balances()
-        self._monthly_balances_by_account[account.name] = account_monthly_balances
+        if account_monthly_balances is None:
+            return
 
-        self._total_monthly_balances = merge_dict_of_lists(
-            self._total_monthly_balances, account_monthly_balances
-        )
-
-    def get_accounts_monthly_ending_balances_for_year(self, year):
-        ending_balances = {}
-        for account_name, yearly_data in self._monthly_balances_by_account.items():
-            if year in yearly_data:
-                ending_balances[account_name] = yearly_data.get(year)
-        return ending_balances
-
-    def get_total_monthly_ending_balances_for_year(self, year):
-        return self._total_monthly_balances.get(year)
+        total = self._total_monthly_balances
+        if account_monthly_balances.first_year < total.first_year:
+            total = self._total_monthly_balances = total.resized(
+                account_monthly_balances.first_year, total.last_year
+            )
+        total += account_monthly_balances
+
+    def get_accounts_monthly_ending_balances(self, first_year, last_year):
+        # account name -> MonthMatrix, accounts without balances in those years
+        # are left out
+        return {
+            account.name: account.get_monthly_ending_balances().resized(
+                first_year, last_year
+            )
+            for account in self._accounts
+            if account.has_years(first_year, last_year)
+        }
+
+    def get_category_monthly_ending_balances(self, first_year, last_year, tree):
+        # category name -> MonthMatrix of first_year..last_year, the balances of
+        # the accounts in the category and all of its sub categories
+        matrices = {}
+        for account in self._accounts:
+            if not account.has_years(first_year, last_year):
+                continue
+            category_id = account.get_category_id()
+            if category_id not in matrices:
+                matrices[category_id] = MonthMatrix(first_year, last_year)
+            matrices[category_id] += account.get_monthly_ending_balances()
+        return rollup_categories(tree, matrices, first_year, last_year)
+
+    def get_total_monthly_ending_balances(self):
+        # MonthMatrix of every account from the first balance to this year
+        return self._total_monthly_balances
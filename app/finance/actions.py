@@ -1,19 +1,43 @@
-import csv
-from datetime import datetime
+import json
+import shutil
+import zipfile
 
-from flask import redirect, render_template, request, url_for
+from flask import abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
 from app import db
-from app.finance import finance
+from app.finance import finance, rollups, snapshots
+from app.finance.categories import (
+    CATEGORY_VERSION,
+    forget_category_tree,
+    get_category_tree,
+)
 from app.finance.forms import (
     AccountForm,
     AddCategoryForm,
+    BatchUploadForm,
     EditTransactionCategoryForm,
+    FileFormatForm,
     FileUploadForm,
     PaychecksForm,
 )
-from app.models import Account, Category, Transaction, Paycheck
+from app.finance.importer import (
+    get_category_ids_by_name,
+    iter_uploaded_files,
+    match_account,
+)
+from app.finance.parsers import DEFAULT_IMPORT_RULES, is_ofx_file
+from app.finance.sniffer import (
+    FormatDetectionError,
+    detect_file_format,
+    preview_rows,
+    read_sample,
+)
+from app.jobs import get_job_queue
+from app.models import Account, Category, ImportJournal, Transaction, Paycheck
+from app.money import Cents
+from app.uploads import COPY_BUFFER_SIZE, create_upload, remove_upload, spool_upload
+from app.versions import bump_ledger_version, bump_version
 
 
 @finance.route('/account/<int:account_id>/edit', methods=['GET', 'POST'])
@@ -42,14 +66,12 @@ def edit_account(account_id):
             data['description_column'] = account_file_format['description_column']
             data['amount_column'] = account_file_format['amount_column']
             data['category_column'] = account_file_format['category_column']
+            data['delimiter'] = account_file_format.get('delimiter', ',')
 
     form = AccountForm(data=data)
-    root_categories = Category.query.filter(
-        Category.parent == None, Category.name.in_(['Assetts', 'Liabilities'])
-    ).all()
-    categories = []
-    for category in root_categories:
-        categories.extend(category.get_transaction_level_children())
+    categories = get_category_tree().get_transaction_level_categories(
+        ['Assetts', 'Liabilities']
+    )
     form.account_category.choices = [(0, 'None')] + sorted(
         [(category.id, category.name) for category in categories], key=lambda x: x[1]
     )
@@ -57,6 +79,11 @@ def edit_account(account_id):
     if request.form:
         if account:
             account.name = form.name.data
+            snapshots.shift_balances(
+                account.id,
+                Cents.from_amount(form.starting_balance.data or 0)
+                - (account.starting_balance or 0),
+            )
         else:
             account = Account(name=form.name.data, user=current_user)
             db.session.add(account)
@@ -72,8 +99,10 @@ def edit_account(account_id):
             form.description_column.data,
             form.amount_column.data,
             form.category_column.data,
+            form.delimiter.data,
         )
         db.session.commit()
+        bump_ledger_version(account.user_id)
         return redirect(url_for('finance.account_details', account_id=account.id))
 
     return render_template('finance/forms/edit_account.html', type=label, form=form)
@@ -83,14 +112,30 @@ def edit_account(account_id):
 @login_required
 def delete_account(account_id):
     account = Account.query.filter(Account.id == account_id).first_or_404()
+    rollups.remove_account_transactions(account)
+    snapshots.delete(account.id)
     # Transactions should be handled by a cascade delete
     for transaction in account.transactions:
         db.session.delete(transaction)
+    ImportJournal.query.filter_by(account_id=account.id).delete(
+        synchronize_session=False
+    )
+    user_id = account.user_id
     db.session.delete(account)
     db.session.commit()
+    bump_ledger_version(user_id)
     return redirect(url_for('finance.accounts'))
 
 
+def redirect_to_job(job):
+    # The inline job queue has already run the job, there's no progress to watch
+    if job.is_done:
+        if job.error:
+            flash('The import failed: {}'.format(job.error))
+        return redirect(job.redirect_url)
+    return redirect(url_for('finance.import_progress', job_id=job.id))
+
+
 @finance.route('/account/<int:account_id>/transactions', methods=['GET', 'POST'])
 @login_required
 def transactions(account_id):
@@ -98,131 +143,122 @@ def transactions(account_id):
     account = Account.query.filter(Account.id == account_id).first_or_404()
 
     if form.validate_on_submit():
-        account_file_format = account.get_file_format()
-        if account_file_format:
-            file_contents = form.file_upload.data.read().decode('utf-8').splitlines()
-            data = list(csv.reader(file_contents, delimiter=','))
-            # combine these queries
-            uncategorized_expense_category = Category.query.filter(
-                Category.name == "Uncategorized Expense"
-            ).first()
-            uncategorized_income_category = Category.query.filter(
-                Category.name == "Other Income"
-            ).first()
-
-            if account_id == 10:
-                options_premium_received_category = Category.query.filter(
-                    Category.name == "Options Premium"
-                ).first()
-                options_premium_paid_category = Category.query.filter(
-                    Category.name == "Options Premium Paid"
-                ).first()
-
-            for row in data[account_file_format['header_rows'] :]:
-                if not row:
-                    continue
+        redirect_url = url_for('finance.account_details', account_id=account_id)
+        upload = form.file_upload.data
+        # OFX/QFX statements are self describing and don't need a file format
+        file_type = 'ofx' if is_ofx_file(upload.filename) else 'csv'
+        if file_type == 'ofx' or account.get_file_format():
+            job = get_job_queue().enqueue(
+                'import_transactions',
+                spool_upload(upload.stream),
+                user_id=current_user.id,
+                redirect_url=redirect_url,
+                account_id=account_id,
+                file_type=file_type,
+            )
+            return redirect_to_job(job)
+        return redirect(redirect_url)
+    return render_template('finance/forms/file_upload.html', form=form)
 
-                date_data = row[account_file_format['date_column'] - 1]
-                date_data = date_data.strip()
-                if date_data in [
-                    '',
-                    '** No Record found for the given criteria **',
-                    '***END OF FILE***',
-                ] or date_data.startswith('Total activity from'):
-                    continue
 
-                date = datetime.strptime(
-                    date_data, account_file_format['date_format']
-                ).date()
-
-                # TODO: make this configurable in DB
-                amount_needs_invert = False
-                if account_id in [14, 15, 16]:
-                    # American Express, Apple Card, and Capital One accounts needs amount inverted
-                    amount_needs_invert = True
-
-                amount_data = row[account_file_format['amount_column'] - 1]
-                if account_id == 14 and amount_data is '':
-                    # Capital Ones credit column is after the debit column
-                    amount_data = row[account_file_format['amount_column']]
-                    # Credits don't need to be inverted
-                    amount_needs_invert = False
-
-                amount_data = amount_data.replace('$', '')
-                amount_data = amount_data.replace('+', '')
-                amount_data = amount_data.replace(' ', '')
-                amount_data = amount_data.replace(',', '')
-                amount_data = float(amount_data)
-
-                if amount_needs_invert:
-                    amount_data = -amount_data
-
-                description = row[account_file_format['description_column'] - 1]
-                description = description.strip()
-
-                # Merrill Edge ignore cash sweeps
-                if account_id == 12 and (description.startswith('Deposit ML') or description.startswith('Withdrawal ML')):
-                    continue
+@finance.route('/account/<int:account_id>/detect_format', methods=['GET', 'POST'])
+@login_required
+def detect_format(account_id):
+    form = FileUploadForm()
+    account = Account.query.filter(Account.id == account_id).first_or_404()
 
-                # TD Ameritrade ignore cash sweeps
-                if account_id == 10:
-                    if description.startswith('CASH ALTERNATIVES PURCHASE') or description.startswith('CASH ALTERNATIVES REDEMPTION'):
-                        continue
-                    elif description.startswith('CASH ALTERNATIVES INTEREST'):
-                        # Interest amount is in the quantity column to the right of the description column
-                        amount_data = float(row[account_file_format['description_column']])
-
-                if (
-                    len(data[account_file_format['header_rows']])
-                    >= account_file_format['category_column']
-                ):
-                    category_name = row[account_file_format['category_column'] - 1]
-                    category_obj = Category.query.filter(
-                        Category.name == category_name
-                    ).first()
-                    category = (
-                        category_obj
-                        if category_obj
-                        else (
-                            uncategorized_expense_category
-                            if amount_data < 0
-                            else uncategorized_income_category
-                        )
-                    )
-                else:
-                    category = None
-                    if account_id == 10:
-                        if description.startswith('Sold'):
-                            category = options_premium_received_category
-                        elif description.startswith('Bought'):
-                            category = options_premium_paid_category
-
-                    if category is None:
-                        category = (
-                            uncategorized_expense_category
-                            if amount_data < 0
-                            else uncategorized_income_category
-                        )
-
-                transaction = Transaction.query.filter(
-                    Transaction.date == date,
-                    Transaction.description == description,
-                    Transaction.amount == amount_data,
-                    Transaction.account_id == account_id,
-                ).first()
-
-                if not transaction:
-                    transaction = Transaction(
-                        date=date,
-                        description=description,
-                        amount=amount_data,
-                        category=category,
-                        account_id=account_id,
-                    )
-                    db.session.add(transaction)
-            db.session.commit()
-        return redirect(url_for('finance.account_details', account_id=account_id))
-    return render_template('finance/forms/file_upload.html', form=form)
+    if form.validate_on_submit():
+        text = read_sample(form.file_upload.data.stream)
+        try:
+            file_format, import_rules = detect_file_format(text)
+        except FormatDetectionError as e:
+            flash(str(e))
+            return render_template('finance/forms/detect_format.html', form=form)
+
+        # Nothing is saved until the preview is confirmed
+        rules = dict(account.get_import_rules(), **import_rules)
+        rows = preview_rows(
+            text, account.id, file_format, rules, get_category_ids_by_name()
+        )
+        tree = get_category_tree()
+        categories = {
+            row['category_id']: tree.get(row['category_id']).name
+            for row in rows
+            if tree.get(row['category_id'])
+        }
+        return render_template(
+            'finance/format_preview.html',
+            account=account,
+            file_format=file_format,
+            rows=rows,
+            categories=categories,
+            form=FileFormatForm(
+                file_format=json.dumps(file_format),
+                import_rules=json.dumps(import_rules),
+            ),
+        )
+    return render_template('finance/forms/detect_format.html', form=form)
+
+
+@finance.route('/account/<int:account_id>/file_format', methods=['POST'])
+@login_required
+def save_file_format(account_id):
+    form = FileFormatForm()
+    account = Account.query.filter(Account.id == account_id).first_or_404()
+    if not form.validate_on_submit():
+        abort(400)
+
+    try:
+        file_format = json.loads(form.file_format.data)
+        import_rules = json.loads(form.import_rules.data or '{}')
+        if set(import_rules) - set(DEFAULT_IMPORT_RULES):
+            raise ValueError('Unknown import rules')
+        account.update_file_format(**file_format)
+        account.update_import_rules(**import_rules)
+    except (TypeError, ValueError):
+        abort(400)
+    db.session.commit()
+    bump_ledger_version(account.user_id)
+    flash('Saved the file format of {}'.format(account.name))
+    return redirect(url_for('finance.account_details', account_id=account.id))
+
+
+@finance.route('/accounts/batch_upload', methods=['GET', 'POST'])
+@login_required
+def batch_upload():
+    form = BatchUploadForm()
+
+    if form.validate_on_submit():
+        accounts = [
+            account for account in current_user.accounts if account.get_file_format()
+        ]
+        files = []
+        unmatched_files = []
+        with create_upload() as spool, zipfile.ZipFile(spool, 'w') as archive:
+            for name, stream in iter_uploaded_files(form.files.data):
+                account = match_account(name, accounts)
+                if account is None:
+                    unmatched_files.append(name)
+                    continue
+                member = '{}.csv'.format(len(files))
+                with archive.open(member, 'w') as target:
+                    shutil.copyfileobj(stream, target, COPY_BUFFER_SIZE)
+                files.append({'name': name, 'member': member, 'account_id': account.id})
+
+        if unmatched_files:
+            flash('No account matched {}'.format(', '.join(unmatched_files)))
+        if files:
+            job = get_job_queue().enqueue(
+                'import_batch',
+                spool.name,
+                user_id=current_user.id,
+                redirect_url=url_for('finance.accounts'),
+                files=files,
+            )
+            return redirect_to_job(job)
+        remove_upload(spool.name)
+        return redirect(url_for('finance.accounts'))
+    return render_template('finance/forms/batch_upload.html', form=form)
 
 
 @finance.route(
@@ -234,24 +270,18 @@ def edit_transaction_category(transaction_id):
 
     if request.form:
         new_category_id = int(request.form.get('category'))
+        old_category_id = transaction.category_id
         transaction.category_id = new_category_id
+        rollups.move_transaction(transaction, old_category_id)
         db.session.commit()
+        bump_ledger_version(transaction.account.user_id)
         return transaction.category.name
 
     form = EditTransactionCategoryForm(data={'category': transaction.category.id})
-    categories = Category.query.all()
-    form.category.choices = [
-        (category.id, category.name)
-        for category in categories
-        if category.is_transaction_level
-        and category.top_level_parent().name
-        in [
-            'Expense',
-            'Income',
-            'Transfer',
-            'Investment',
-        ]
-    ]
+    categories = get_category_tree().get_transaction_level_categories(
+        ['Expense', 'Income', 'Transfer', 'Investment']
+    )
+    form.category.choices = [(category.id, category.name) for category in categories]
 
     return render_template(
         'finance/forms/edit_transaction_category.html',
@@ -264,22 +294,29 @@ def edit_transaction_category(transaction_id):
 @login_required
 def add_category():
     form = AddCategoryForm()
-    categories = Category.query.all()
+    tree = get_category_tree()
     form.parent.choices = [(0, 'None')] + sorted(
-        [(category.id, category.name) for category in categories], key=lambda x: x[1]
+        [(category.id, category.name) for category in tree.all()], key=lambda x: x[1]
     )
 
     if request.form:
         if form.parent.data:
-            parent_category = Category.query.get_or_404(form.parent.data)
+            parent_category = tree.get(form.parent.data)
+            if parent_category is None:
+                abort(404)
             new_rank = len(parent_category.children)
-            db.session.add(
-                Category(name=form.name.data, parent_id=form.parent.data, rank=new_rank)
+            category = Category(
+                name=form.name.data, parent_id=form.parent.data, rank=new_rank
             )
         else:
-            new_rank = Category.num_root_categories() + 1
-            db.session.add(Category(name=form.name.data, rank=new_rank))
+            new_rank = len(tree.roots) + 1
+            category = Category(name=form.name.data, rank=new_rank)
+        db.session.add(category)
+        db.session.flush()
+        category.add_to_closure()
         db.session.commit()
+        bump_version(CATEGORY_VERSION)
+        forget_category_tree()
 
     return render_template('finance/forms/add_category.html', form=form)
 
@@ -289,100 +326,14 @@ def add_category():
 def add_paycheck():
     form = FileUploadForm()
 
-    date_col = 1
-    gross_pay_col = 2
-    fed_tax_col = 3
-    ss_tax_col = 4
-    med_tax_col = 5
-    ma_pfml_tax_col = 6
-    state_tax_col = 7
-    dental_col = 8
-    health_col = 9
-    fsa_col = 10
-    traditional_ret_col = 11
-    roth_ret_col = 12
-    net_pay_col = 13
-    ret_match_col = 14
-    std_col = 15
-    transit_col = 16
-    company_col = 17
-    gtl_col = None
-    gym_reimbursement_col = None
-    expense_reimbursement_col = None
-    espp_col = None
-
     if form.validate_on_submit():
-        file_contents = form.file_upload.data.read().decode('utf-8').splitlines()
-        data = list(csv.reader(file_contents, delimiter=','))
-        for row in data[1:]:
-            date = row[date_col - 1]
-            date = datetime.strptime(date, '%m/%d/%Y').date()
-            gross_pay = row[gross_pay_col - 1]
-            federal_income_tax = row[fed_tax_col - 1]
-            ma_pfml_tax = float(row[ma_pfml_tax_col - 1])
-            social_security_tax = row[ss_tax_col - 1]
-            medicare_tax = row[med_tax_col - 1]
-            state_income_tax = row[state_tax_col - 1]
-            dental_insurance = row[dental_col - 1]
-            health_insurance = row[health_col - 1]
-            fsa = float(row[fsa_col - 1])
-            traditional_retirement = row[traditional_ret_col - 1]
-            roth_retirement = row[roth_ret_col - 1]
-            net_pay = row[net_pay_col - 1]
-            retirement_match = row[ret_match_col - 1]
-            std = float(row[std_col - 1])
-            transit = float(row[transit_col - 1])
-            gtl = float(row[gtl_col - 1]) if gtl_col else None
-            gym_reimbursement = float(row[gym_reimbursement_col - 1]) if gym_reimbursement_col else None
-            expense_reimbursement = float(row[expense_reimbursement_col - 1]) if expense_reimbursement_col else None
-            company_name = row[company_col - 1]
-            espp = float(row[espp_col - 1]) if espp_col else None
-
-            exists = Paycheck.query.filter(
-                Paycheck.date == date,
-                Paycheck.company_name == company_name,
-                Paycheck.gross_pay == gross_pay,
-                Paycheck.net_pay == net_pay,
-            ).first()
-            if not exists:
-                paycheck = Paycheck(
-                    date=date,
-                    company_name=company_name,
-                    gross_pay=gross_pay,
-                    federal_income_tax=federal_income_tax,
-                    social_security_tax=social_security_tax,
-                    medicare_tax=medicare_tax,
-                    state_income_tax=state_income_tax,
-                    health_insurance=health_insurance,
-                    dental_insurance=dental_insurance,
-                    traditional_retirement=traditional_retirement,
-                    roth_retirement=roth_retirement,
-                    retirement_match=retirement_match,
-                    net_pay=net_pay,
-                    user=current_user,
-                )
-                other_fields = {}
-                if gtl:
-                    other_fields['gtl'] = gtl
-                if gym_reimbursement:
-                    other_fields['gym_reimbursement'] = gym_reimbursement
-                if expense_reimbursement:
-                    other_fields['expense_reimbursement'] = expense_reimbursement
-                if espp:
-                    other_fields['espp'] = espp
-                if fsa:
-                    other_fields['fsa'] = fsa
-                if ma_pfml_tax:
-                    other_fields['ma_pfml_tax'] = ma_pfml_tax
-                if std:
-                    other_fields['std'] = std
-                if transit:
-                    other_fields['transit'] = transit
-                paycheck.update_properties(other_fields)
-                db.session.add(paycheck)
-
-        db.session.commit()
-        return redirect(url_for('finance.paychecks'))
+        job = get_job_queue().enqueue(
+            'import_paychecks',
+            spool_upload(form.file_upload.data.stream),
+            user_id=current_user.id,
+            redirect_url=url_for('finance.paychecks'),
+        )
+        return redirect_to_job(job)
     return render_template('finance/forms/file_upload.html', form=form)
     '''
     form = PaychecksForm()
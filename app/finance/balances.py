@@ -0,0 +1,30 @@
+from sqlalchemy import and_, func
+
+from app import db
+from app.models import Account, Transaction
+from app.money import Cents
+
+
+def get_account_balances(user_id=None, end_date=None, account_ids=None):
+    # account_id -> balance at the end of end_date (or now), one grouped query
+    # for all of a user's accounts instead of loading every transaction
+    join_condition = Transaction.account_id == Account.id
+    if end_date is not None:
+        join_condition = and_(join_condition, Transaction.date <= end_date)
+    query = (
+        db.session.query(
+            Account.id,
+            Account.starting_balance,
+            func.coalesce(func.sum(Transaction.amount), 0),
+        )
+        .outerjoin(Transaction, join_condition)
+        .group_by(Account.id, Account.starting_balance)
+    )
+    if user_id is not None:
+        query = query.filter(Account.user_id == user_id)
+    if account_ids is not None:
+        query = query.filter(Account.id.in_(account_ids))
+    return {
+        account_id: Cents() + (starting_balance or 0) + total
+        for account_id, starting_balance, total in query
+    }
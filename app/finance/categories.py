@@ -0,0 +1,150 @@
+import logging
+import threading
+
+from flask import g, has_request_context
+
+from app import db
+from app.models import Category
+from app.versions import CATEGORY_VERSION, get_version
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryNode:
+    # Detached stand in for a Category row with the same tree helpers, so
+    # templates and reports can walk the hierarchy without touching the db
+    def __init__(self, id, name, parent_id, rank, category_type):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.rank = rank
+        self.category_type = category_type
+        self.parent = None
+        self.children = []
+        self.ancestors = ()
+        self.leaves = ()
+
+    def __repr__(self):
+        return '<CategoryNode {}>'.format(self.name)
+
+    @property
+    def is_transaction_level(self):
+        return self.parent is not None and not self.children
+
+    def top_level_parent(self):
+        return self.ancestors[0]
+
+    def get_parent_categories(self):
+        return list(self.ancestors)
+
+    def get_transaction_level_children(self):
+        return list(self.leaves)
+
+
+class CategoryTree:
+    def __init__(self, rows, version=0):
+        self.version = version
+        self._nodes = {}
+        self._names = {}
+        for row in rows:
+            node = CategoryNode(*row)
+            self._nodes[node.id] = node
+            # Keep the first match to mirror the old Category.query...first() lookup
+            self._names.setdefault(node.name, node)
+
+        self.roots = []
+        for node in self._nodes.values():
+            parent = self._nodes.get(node.parent_id)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                node.parent = parent
+                parent.children.append(node)
+        for root in self.roots:
+            self._link(root, ())
+
+    def _link(self, node, ancestors):
+        node.ancestors = ancestors + (node,)
+        leaves = []
+        for child in node.children:
+            self._link(child, node.ancestors)
+            if child.is_transaction_level:
+                leaves.append(child)
+            else:
+                leaves.extend(child.leaves)
+        node.leaves = tuple(leaves)
+
+    @classmethod
+    def load(cls, version=0):
+        rows = db.session.query(
+            Category.id,
+            Category.name,
+            Category.parent_id,
+            Category.rank,
+            Category.category_type,
+        ).order_by(Category.id)
+        return cls(rows, version=version)
+
+    def get(self, category_id):
+        return self._nodes.get(category_id)
+
+    def get_by_name(self, name):
+        return self._names.get(name)
+
+    def get_ids_by_name(self):
+        return {name: node.id for name, node in self._names.items()}
+
+    def all(self):
+        return list(self._nodes.values())
+
+    def get_roots(self, names=None):
+        if names is None:
+            return list(self.roots)
+        return [node for node in self.roots if node.name in names]
+
+    def get_ancestors(self, category_id):
+        node = self._nodes.get(category_id)
+        return node.ancestors if node else ()
+
+    def top_level_parent(self, category_id):
+        node = self._nodes.get(category_id)
+        return node.ancestors[0] if node else None
+
+    def get_leaves(self, category_id):
+        node = self._nodes.get(category_id)
+        return node.leaves if node else ()
+
+    def get_transaction_level_categories(self, root_names):
+        leaves = []
+        for root in self.get_roots(root_names):
+            leaves.extend(root.leaves)
+        return leaves
+
+
+_tree = None
+_lock = threading.Lock()
+
+
+def get_category_tree():
+    # Costs one lookup of the version per request, the tree is only reloaded
+    # after add_category bumped it in this or another worker. Job workers keep
+    # one app context for their lifetime so they look the version up every time
+    if has_request_context() and 'category_tree' in g:
+        return g.category_tree
+
+    global _tree
+    version = get_version(CATEGORY_VERSION)
+    with _lock:
+        if _tree is None or _tree.version != version:
+            logger.info('Loading category tree version %s', version)
+            _tree = CategoryTree.load(version)
+        tree = _tree
+    if has_request_context():
+        g.category_tree = tree
+    return tree
+
+
+def forget_category_tree():
+    # For the rest of a request that changed the categories
+    if has_request_context():
+        g.pop('category_tree', None)
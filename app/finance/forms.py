@@ -5,12 +5,22 @@ from wtforms import (
     DateField,
     FileField,
     FloatField,
+    HiddenField,
+    MultipleFileField,
     SelectField,
     StringField,
     SubmitField,
 )
 from wtforms.validators import DataRequired, Optional
 
+DATE_FORMAT_CHOICES = [
+    ('%m/%d/%Y', 'MM/DD/YYYY'),
+    ('%m/%d/%y', 'MM/DD/YY'),
+    ('%Y-%m-%d', 'YYYY-MM-DD'),
+    ('%Y-%m-%dT%H:%M:%S', 'YYYY-MM-DDTHH:MM:SS'),
+]
+DELIMITER_CHOICES = [(',', 'Comma'), (';', 'Semicolon'), ('\t', 'Tab'), ('|', 'Pipe')]
+
 
 class AccountForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
@@ -18,18 +28,11 @@ class AccountForm(FlaskForm):
     header_rows = StringField('Number of Header Rows')
     num_columns = StringField('Number of Columns')
     date_column = StringField('Date Column')
-    date_format = SelectField(
-        'Date Format',
-        choices=[
-            ('%m/%d/%Y', 'MM/DD/YYYY'),
-            ('%m/%d/%y', 'MM/DD/YY'),
-            ('%Y-%m-%d', 'YYYY-MM-DD'),
-            ('%Y-%m-%dT%H:%M:%S', 'YYYY-MM-DDTHH:MM:SS'),
-        ],
-    )
+    date_format = SelectField('Date Format', choices=DATE_FORMAT_CHOICES)
     description_column = StringField('Description Column')
     amount_column = StringField('Amount Column')
     category_column = StringField('Category Column')
+    delimiter = SelectField('Delimiter', choices=DELIMITER_CHOICES)
     account_category = SelectField('Account Category', coerce=int)
 
 
@@ -38,6 +41,18 @@ class FileUploadForm(FlaskForm):
     submit = SubmitField('Submit')
 
 
+class FileFormatForm(FlaskForm):
+    # The detected format as JSON, saved once the preview looks right
+    file_format = HiddenField(validators=[DataRequired()])
+    import_rules = HiddenField()
+    submit = SubmitField('Save Format')
+
+
+class BatchUploadForm(FlaskForm):
+    files = MultipleFileField('Files (CSV or zip, named after their account)')
+    submit = SubmitField('Submit')
+
+
 class AddCategoryForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
     parent = SelectField('Parent Category', coerce=int, validators=[DataRequired()])
@@ -0,0 +1,528 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from datetime import datetime
+import hashlib
+import io
+from itertools import islice
+import json
+import logging
+import os
+import time
+import zipfile
+
+from app import db
+from app.finance.categories import get_category_tree
+from app.finance.parsers import parse_file, parse_ofx_rows, parse_rows
+from app.finance import snapshots
+from app.finance.rollups import add_transactions, refresh_months
+from app.models import (
+    Account,
+    ImportJournal,
+    Paycheck,
+    Transaction,
+    get_transaction_fingerprint,
+)
+from app.money import Cents
+from app.uploads import remove_upload, spool_upload
+from app.versions import bump_ledger_version
+
+logger = logging.getLogger(__name__)
+
+# Keeps IN (...) lists under SQLite's default bound parameter limit
+LOOKUP_BATCH_SIZE = 500
+DEFAULT_CHUNK_SIZE = 1000
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 1-based CSV column of each paycheck field, fields set to None aren't in the file
+DEFAULT_PAYCHECK_COLUMNS = {
+    'date': 1,
+    'gross_pay': 2,
+    'federal_income_tax': 3,
+    'social_security_tax': 4,
+    'medicare_tax': 5,
+    'ma_pfml_tax': 6,
+    'state_income_tax': 7,
+    'dental_insurance': 8,
+    'health_insurance': 9,
+    'fsa': 10,
+    'traditional_retirement': 11,
+    'roth_retirement': 12,
+    'net_pay': 13,
+    'retirement_match': 14,
+    'std': 15,
+    'transit': 16,
+    'company_name': 17,
+    'gtl': None,
+    'gym_reimbursement': None,
+    'expense_reimbursement': None,
+    'espp': None,
+}
+PAYCHECK_AMOUNT_COLUMNS = [
+    'gross_pay',
+    'federal_income_tax',
+    'social_security_tax',
+    'medicare_tax',
+    'state_income_tax',
+    'health_insurance',
+    'dental_insurance',
+    'traditional_retirement',
+    'roth_retirement',
+    'retirement_match',
+    'net_pay',
+]
+# Stored in Paycheck.properties when they are non zero
+PAYCHECK_PROPERTY_FIELDS = [
+    'gtl',
+    'gym_reimbursement',
+    'expense_reimbursement',
+    'espp',
+    'fsa',
+    'ma_pfml_tax',
+    'std',
+    'transit',
+]
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows_parsed = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.rows_parsed / self.elapsed
+
+    def summary(self):
+        return '{} rows parsed, {} inserted, {} skipped ({:,.0f} rows/sec)'.format(
+            self.rows_parsed, self.inserted, self.skipped, self.rows_per_second
+        )
+
+    def __repr__(self):
+        return '<ImportResult {}>'.format(self.summary())
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def insert_ignore(table):
+    # Rows colliding with a unique index are dropped by the database instead of
+    # aborting the whole batch
+    return (
+        table.insert()
+        .prefix_with('IGNORE', dialect='mysql')
+        .prefix_with('OR IGNORE', dialect='sqlite')
+    )
+
+
+def fingerprint_transactions(account_ids):
+    # Fingerprints the transactions left without one, the exact duplicates the
+    # fingerprint migration skipped, and returns those whose fingerprint another
+    # transaction of the account already has, for the caller to delete
+    query = Transaction.query.filter(
+        Transaction.account_id.in_(account_ids),
+        Transaction.fingerprint.is_(None),
+        Transaction.date.isnot(None),
+        Transaction.amount.isnot(None),
+    ).order_by(Transaction.id)
+    duplicates = []
+    for transaction in query.all():
+        fingerprint = get_transaction_fingerprint(
+            transaction.date, transaction.description, transaction.amount
+        )
+        existing = (
+            db.session.query(Transaction.id)
+            .filter(
+                Transaction.account_id == transaction.account_id,
+                Transaction.fingerprint == fingerprint,
+            )
+            .first()
+        )
+        if existing is None:
+            transaction.fingerprint = fingerprint
+            db.session.flush()
+        else:
+            duplicates.append(transaction)
+    return duplicates
+
+
+def get_content_hash(stream):
+    content_hash = hashlib.sha256()
+    for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b''):
+        content_hash.update(block)
+    stream.seek(0)
+    return content_hash.hexdigest()
+
+
+def iter_uploaded_files(uploads):
+    # (name, binary stream) of every uploaded file and every file in uploaded zips
+    for upload in uploads:
+        if upload.filename.lower().endswith('.zip'):
+            # zipfile needs a seekable file, werkzeug's SpooledTemporaryFile
+            # upload stream isn't one before Python 3.11
+            path = spool_upload(upload.stream)
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    for member in archive.infolist():
+                        name = member.filename
+                        if member.is_dir() or name.startswith('__MACOSX/'):
+                            continue
+                        with archive.open(member) as stream:
+                            yield name, stream
+            finally:
+                remove_upload(path)
+        else:
+            yield upload.filename, upload.stream
+
+
+def match_account(filename, accounts):
+    # Files are mapped to the account with the longest name that starts their
+    # path or file name, e.g. "Checking/2019-01.csv" or "Checking 2019-01.csv"
+    path = filename.lower()
+    basename = os.path.basename(path)
+    matches = [
+        account
+        for account in accounts
+        if path.startswith(account.name.lower())
+        or basename.startswith(account.name.lower())
+    ]
+    return max(matches, key=lambda account: len(account.name), default=None)
+
+
+def parse_files(files, max_workers=None):
+    # Parsing is pure CPU so several files are spread over a process pool
+    if len(files) < 2:
+        return [parse_file(*file_args) for file_args in files]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(parse_file, *zip(*files)))
+
+
+def get_category_ids_by_name():
+    return get_category_tree().get_ids_by_name()
+
+
+class TransactionImporter:
+    def __init__(self, account, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.account_id = account.id
+        self.user_id = account.user_id
+        self.file_format = account.get_file_format()
+        self.import_rules = account.get_import_rules()
+        self.chunk_size = chunk_size
+        self.category_ids = get_category_ids_by_name()
+
+    def get_format_hash(self):
+        file_format = json.dumps(
+            {'file_format': self.file_format, 'import_rules': self.import_rules},
+            sort_keys=True,
+        )
+        return hashlib.sha1(file_format.encode('utf-8')).hexdigest()
+
+    def get_delimiter(self):
+        return (self.file_format or {}).get('delimiter', ',')
+
+    def get_journal(self, stream):
+        content_hash = get_content_hash(stream)
+        format_hash = self.get_format_hash()
+        journal = ImportJournal.query.filter(
+            ImportJournal.account_id == self.account_id,
+            ImportJournal.content_hash == content_hash,
+        ).first()
+        if journal is None:
+            journal = ImportJournal(
+                account_id=self.account_id,
+                content_hash=content_hash,
+                format_hash=format_hash,
+            )
+            db.session.add(journal)
+        elif journal.format_hash != format_hash:
+            # The file is parsed differently now so earlier progress doesn't apply
+            journal.restart(format_hash)
+        db.session.commit()
+        return journal
+
+    def import_stream(self, stream, progress=None, file_type='csv'):
+        journal = self.get_journal(stream)
+        if journal.status == ImportJournal.COMPLETE:
+            result = ImportResult()
+            result.rows_parsed = result.skipped = journal.rows_parsed
+            if progress:
+                progress(result)
+            logger.info(
+                'Skipping import for account %s, file %s was already imported',
+                self.account_id,
+                journal.content_hash,
+            )
+            return result
+
+        # Decode the binary upload incrementally rather than reading it whole
+        if file_type == 'ofx':
+            text = io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+            rows = self.parse_ofx(text)
+        else:
+            text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+            rows = self.parse(csv.reader(text, delimiter=self.get_delimiter()))
+        try:
+            return self.import_rows(rows, progress=progress, journal=journal)
+        finally:
+            text.detach()
+
+    def import_file(self, file_contents, progress=None, journal=None):
+        reader = csv.reader(file_contents, delimiter=self.get_delimiter())
+        return self.import_rows(self.parse(reader), progress=progress, journal=journal)
+
+    def import_rows(self, rows, progress=None, journal=None):
+        start = time.perf_counter()
+        result = ImportResult()
+
+        if journal and journal.rows_parsed:
+            # Resume after the last committed chunk of an interrupted import
+            logger.info(
+                'Resuming import for account %s after %s rows',
+                self.account_id,
+                journal.rows_parsed,
+            )
+            result.rows_parsed = journal.rows_parsed
+            result.inserted = journal.inserted
+            result.skipped = journal.skipped
+            rows = islice(rows, journal.rows_parsed, None)
+
+        try:
+            # Each chunk is deduped, inserted and committed on its own so memory
+            # stays flat. A row that fails to parse stops the import there, the
+            # chunks committed before it stay and the journal resumes after them
+            for chunk in chunked(rows, self.chunk_size):
+                new_rows = self.remove_duplicates(chunk)
+                inserted = self.insert(new_rows)
+
+                result.rows_parsed += len(chunk)
+                result.inserted += inserted
+                result.skipped += len(chunk) - inserted
+                if journal:
+                    journal.chunks_committed += 1
+                    journal.rows_parsed = result.rows_parsed
+                    journal.inserted = result.inserted
+                    journal.skipped = result.skipped
+                db.session.commit()
+                if inserted:
+                    bump_ledger_version(self.user_id)
+
+                result.elapsed = time.perf_counter() - start
+                if progress:
+                    progress(result)
+        except Exception:
+            db.session.rollback()
+            if journal:
+                journal.status = ImportJournal.FAILED
+                db.session.commit()
+            raise
+
+        if journal:
+            journal.status = ImportJournal.COMPLETE
+            db.session.commit()
+
+        result.elapsed = time.perf_counter() - start
+        logger.info(
+            'Imported transactions for account %s: %s',
+            self.account_id,
+            result.summary(),
+        )
+        return result
+
+    def import_parsed(self, rows, progress=None):
+        # Rows parsed elsewhere (e.g. in a process pool) go in as one transaction
+        start = time.perf_counter()
+        result = ImportResult()
+        try:
+            for chunk in chunked(rows, self.chunk_size):
+                inserted = self.insert(self.remove_duplicates(chunk))
+                result.rows_parsed += len(chunk)
+                result.inserted += inserted
+                result.skipped += len(chunk) - inserted
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if result.inserted:
+            bump_ledger_version(self.user_id)
+
+        result.elapsed = time.perf_counter() - start
+        if progress:
+            progress(result)
+        logger.info(
+            'Imported transactions for account %s: %s',
+            self.account_id,
+            result.summary(),
+        )
+        return result
+
+    def parse_ofx(self, stream):
+        try:
+            yield from parse_ofx_rows(stream, self.account_id, self.category_ids)
+        except (KeyError, ValueError) as e:
+            raise ValueError('Could not parse OFX transaction: {!r}'.format(e))
+
+    def parse(self, reader):
+        try:
+            yield from parse_rows(
+                reader,
+                self.account_id,
+                self.file_format,
+                self.import_rules,
+                self.category_ids,
+            )
+        except (IndexError, ValueError) as e:
+            raise ValueError('Could not parse line {}: {}'.format(reader.line_num, e))
+
+    def remove_duplicates(self, rows):
+        fingerprints = list({row['fingerprint'] for row in rows})
+        existing_fingerprints = set()
+        for batch in chunked(fingerprints, LOOKUP_BATCH_SIZE):
+            query = db.session.query(Transaction.fingerprint).filter(
+                Transaction.account_id == self.account_id,
+                Transaction.fingerprint.in_(batch),
+            )
+            existing_fingerprints.update(fingerprint for (fingerprint,) in query)
+
+        new_rows = []
+        for row in rows:
+            if row['fingerprint'] in existing_fingerprints:
+                continue
+            existing_fingerprints.add(row['fingerprint'])
+            new_rows.append(row)
+        return new_rows
+
+    def insert(self, rows):
+        if not rows:
+            return 0
+        result = db.session.execute(insert_ignore(Transaction.__table__), rows)
+        inserted = result.rowcount if result.rowcount >= 0 else len(rows)
+        if inserted == len(rows):
+            add_transactions(self.user_id, rows)
+            snapshots.add_transactions(self.account_id, rows)
+        else:
+            # The unique index dropped rows another import inserted meanwhile, so
+            # recount the months involved from the ledger
+            refresh_months(
+                self.user_id, {(row['date'].year, row['date'].month) for row in rows}
+            )
+            snapshots.rebuild([Account.query.get(self.account_id)])
+        return inserted
+
+
+class PaycheckImporter:
+    def __init__(self, user_id, columns=None, header_rows=1, date_format='%m/%d/%Y'):
+        self.user_id = user_id
+        self.columns = dict(DEFAULT_PAYCHECK_COLUMNS)
+        self.columns.update(columns or {})
+        self.header_rows = header_rows
+        self.date_format = date_format
+
+    def import_file(self, file_contents, progress=None):
+        start = time.perf_counter()
+        result = ImportResult()
+
+        reader = csv.reader(file_contents, delimiter=',')
+        rows = list(self.parse(islice(reader, self.header_rows, None)))
+        result.rows_parsed = len(rows)
+        if progress:
+            progress(result)
+
+        new_rows = self.remove_duplicates(rows)
+        if new_rows:
+            db.session.execute(Paycheck.__table__.insert(), new_rows)
+        db.session.commit()
+        if new_rows:
+            bump_ledger_version(self.user_id)
+
+        result.inserted = len(new_rows)
+        result.skipped = result.rows_parsed - result.inserted
+        result.elapsed = time.perf_counter() - start
+        if progress:
+            progress(result)
+        logger.info(
+            'Imported paychecks for user %s: %s', self.user_id, result.summary()
+        )
+        return result
+
+    def parse(self, rows):
+        date_index = self.columns['date'] - 1
+        company_index = self.columns['company_name'] - 1
+        amount_indexes = [
+            (field, self.columns[field] - 1)
+            for field in PAYCHECK_AMOUNT_COLUMNS
+            if self.columns.get(field)
+        ]
+        property_indexes = [
+            (field, self.columns[field] - 1)
+            for field in PAYCHECK_PROPERTY_FIELDS
+            if self.columns.get(field)
+        ]
+        date_format = self.date_format
+        user_id = self.user_id
+
+        for row in rows:
+            if not row:
+                continue
+            paycheck = {
+                'date': datetime.strptime(row[date_index], date_format).date(),
+                'company_name': row[company_index],
+                'user_id': user_id,
+            }
+            for field, index in amount_indexes:
+                paycheck[field] = Cents.from_amount(row[index])
+
+            properties = {}
+            for field, index in property_indexes:
+                value = float(row[index])
+                if value:
+                    properties[field] = value
+            paycheck['properties'] = json.dumps(properties)
+            yield paycheck
+
+    def get_key(self, date, company_name, gross_pay, net_pay):
+        return (
+            date,
+            company_name,
+            Cents() + (gross_pay or 0),
+            Cents() + (net_pay or 0),
+        )
+
+    def remove_duplicates(self, rows):
+        if not rows:
+            return []
+
+        dates = [row['date'] for row in rows]
+        existing_keys = {
+            self.get_key(*paycheck)
+            for paycheck in db.session.query(
+                Paycheck.date,
+                Paycheck.company_name,
+                Paycheck.gross_pay,
+                Paycheck.net_pay,
+            ).filter(
+                Paycheck.user_id == self.user_id,
+                Paycheck.date.between(min(dates), max(dates)),
+            )
+        }
+
+        new_rows = []
+        for row in rows:
+            key = self.get_key(
+                row['date'],
+                row['company_name'],
+                row.get('gross_pay'),
+                row.get('net_pay'),
+            )
+            if key in existing_keys:
+                continue
+            existing_keys.add(key)
+            new_rows.append(row)
+        return new_rows
@@ -0,0 +1,121 @@
+from array import array
+from operator import add, sub
+
+from app.money import Cents
+
+
+class MonthMatrix:
+    # Cents for every month of first_year..last_year in one flat array, twelve
+    # slots a year, so adding two matrices is a single pass over machine ints
+    __slots__ = ('first_year', 'last_year', 'values')
+
+    def __init__(self, first_year, last_year, values=None):
+        self.first_year = first_year
+        self.last_year = last_year
+        if values is None:
+            values = array('q', bytes(8 * 12 * (last_year - first_year + 1)))
+        self.values = values
+
+    def __repr__(self):
+        return '<MonthMatrix {}-{}>'.format(self.first_year, self.last_year)
+
+    def __contains__(self, year):
+        return self.first_year <= year <= self.last_year
+
+    def index(self, year, month):
+        return (year - self.first_year) * 12 + month - 1
+
+    def copy(self):
+        return MonthMatrix(self.first_year, self.last_year, array('q', self.values))
+
+    def resized(self, first_year, last_year):
+        matrix = MonthMatrix(first_year, last_year)
+        matrix += self
+        return matrix
+
+    def get(self, year, month):
+        return Cents(self.values[self.index(year, month)])
+
+    def add(self, year, month, amount):
+        self.values[self.index(year, month)] += Cents.from_amount(amount).value
+
+    def set(self, year, month, amount):
+        self.values[self.index(year, month)] = Cents.from_amount(amount).value
+
+    def get_year(self, year, num_months=12):
+        # {month: Cents}, the row shape the statement templates read
+        if year not in self:
+            return {month: Cents() for month in range(1, num_months + 1)}
+        start = self.index(year, 1)
+        return {
+            month: Cents(value)
+            for month, value in enumerate(
+                self.values[start : start + num_months], start=1
+            )
+        }
+
+    def _combine(self, other, operator):
+        # Only the years both matrices cover take part
+        first_year = max(self.first_year, other.first_year)
+        last_year = min(self.last_year, other.last_year)
+        if first_year > last_year:
+            return
+        start = self.index(first_year, 1)
+        stop = self.index(last_year, 12) + 1
+        other_start = other.index(first_year, 1)
+        self.values[start:stop] = array(
+            'q',
+            map(
+                operator,
+                self.values[start:stop],
+                other.values[other_start : other_start + stop - start],
+            ),
+        )
+
+    def __iadd__(self, other):
+        self._combine(other, add)
+        return self
+
+    def __isub__(self, other):
+        self._combine(other, sub)
+        return self
+
+    def __add__(self, other):
+        matrix = self.copy()
+        matrix += other
+        return matrix
+
+    def __sub__(self, other):
+        matrix = self.copy()
+        matrix -= other
+        return matrix
+
+
+def rollup_categories(tree, matrices, first_year, last_year):
+    # matrices maps category ids to MonthMatrix. Returns category name -> the
+    # sum of the category and everything below it, built bottom up so every
+    # parent is one add per child instead of one per leaf and ancestor
+    totals = {}
+
+    def rollup(node):
+        total = None
+        matrix = matrices.get(node.id)
+        if matrix is not None:
+            total = MonthMatrix(first_year, last_year)
+            total += matrix
+        for child in node.children:
+            child_total = rollup(child)
+            if child_total is not None:
+                if total is None:
+                    total = MonthMatrix(first_year, last_year)
+                total += child_total
+        if total is not None:
+            if node.name in totals:
+                totals[node.name] += total
+            else:
+                totals[node.name] = total
+        return total
+
+    for root in tree.roots:
+        rollup(root)
+    return totals
@@ -0,0 +1,245 @@
+import csv
+from datetime import datetime
+import html
+import io
+from itertools import islice
+import json
+import re
+import zipfile
+
+from app.models import get_fitid_fingerprint, get_transaction_fingerprint
+from app.money import Cents
+
+IGNORED_DATE_VALUES = frozenset(
+    ['', '** No Record found for the given criteria **', '***END OF FILE***']
+)
+IGNORED_DATE_PREFIXES = ('Total activity from',)
+
+AMOUNT_TRANSLATION = str.maketrans('', '', '$+ ,')
+
+OFX_EXTENSIONS = ('.ofx', '.qfx')
+# Matches both SGML (OFX 1.x, leaf tags left open) and XML (OFX 2.x) elements
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+OFX_BLOCK_SIZE = 64 * 1024
+
+DEFAULT_IMPORT_RULES = {
+    # Flip the sign of every amount, e.g. credit cards that export charges as positive
+    'invert_amount': False,
+    # When the amount cell is empty read the next column instead, without inverting
+    'credit_column_fallback': False,
+    # Rows whose description starts with one of these are not imported
+    'ignore_description_prefixes': [],
+    # [{'description_prefix': ..., 'amount_column': ...}], read the amount from
+    # another column for matching rows. 'description_offset': 1 instead of
+    # 'amount_column' reads the column right of the description column
+    'amount_column_overrides': [],
+    # [{'description_prefix': ..., 'category': ...}], used when the file has no
+    # category column
+    'description_categories': [],
+}
+
+
+def get_import_rules(rules=None):
+    import_rules = dict(DEFAULT_IMPORT_RULES)
+    import_rules.update(rules or {})
+    return import_rules
+
+
+def parse_amount(amount_data):
+    return Cents.from_amount(amount_data.translate(AMOUNT_TRANSLATION))
+
+
+def compile_row_parser(
+    account_id, file_format, rules, category_ids, has_category_column
+):
+    rules = get_import_rules(rules)
+    date_index = file_format['date_column'] - 1
+    date_format = file_format['date_format']
+    amount_index = file_format['amount_column'] - 1
+    description_index = file_format['description_column'] - 1
+    category_index = file_format['category_column'] - 1
+
+    invert_amount = rules['invert_amount']
+    credit_column_fallback = rules['credit_column_fallback']
+    ignore_prefixes = tuple(rules['ignore_description_prefixes'])
+    amount_overrides = [
+        (
+            override['description_prefix'],
+            override['amount_column'] - 1
+            if 'amount_column' in override
+            else description_index + override['description_offset'],
+        )
+        for override in rules['amount_column_overrides']
+    ]
+    description_categories = [
+        (rule['description_prefix'], category_ids.get(rule['category']))
+        for rule in rules['description_categories']
+    ]
+    uncategorized_expense_id = category_ids.get('Uncategorized Expense')
+    uncategorized_income_id = category_ids.get('Other Income')
+
+    # Statements repeat the same few hundred dates, so strptime runs once per value
+    dates = {}
+
+    def parse_row(row):
+        if not row:
+            return None
+
+        date_data = row[date_index].strip()
+        if date_data in IGNORED_DATE_VALUES or date_data.startswith(
+            IGNORED_DATE_PREFIXES
+        ):
+            return None
+
+        description = row[description_index].strip()
+        if ignore_prefixes and description.startswith(ignore_prefixes):
+            return None
+
+        date = dates.get(date_data)
+        if date is None:
+            date = dates[date_data] = datetime.strptime(date_data, date_format).date()
+
+        amount_data = row[amount_index]
+        if credit_column_fallback and amount_data == '':
+            amount = parse_amount(row[amount_index + 1])
+        else:
+            amount = parse_amount(amount_data)
+            if invert_amount:
+                amount = -amount
+
+        for prefix, column_index in amount_overrides:
+            if description.startswith(prefix):
+                amount = parse_amount(row[column_index])
+                break
+
+        category_id = None
+        if has_category_column:
+            category_id = category_ids.get(row[category_index])
+        else:
+            for prefix, prefix_category_id in description_categories:
+                if description.startswith(prefix):
+                    category_id = prefix_category_id
+                    break
+
+        if category_id is None:
+            category_id = (
+                uncategorized_expense_id if amount < 0 else uncategorized_income_id
+            )
+
+        return {
+            'date': date,
+            'description': description,
+            'amount': amount,
+            'category_id': category_id,
+            'account_id': account_id,
+            'fingerprint': get_transaction_fingerprint(date, description, amount),
+        }
+
+    return parse_row
+
+
+def parse_rows(reader, account_id, file_format, rules, category_ids):
+    rows = iter(reader)
+    for _ in islice(rows, file_format['header_rows']):
+        pass
+
+    first_row = next(rows, None)
+    if first_row is None:
+        return
+    parse_row = compile_row_parser(
+        account_id,
+        file_format,
+        rules,
+        category_ids,
+        has_category_column=len(first_row) >= file_format['category_column'],
+    )
+
+    parsed_row = parse_row(first_row)
+    if parsed_row:
+        yield parsed_row
+    for row in rows:
+        parsed_row = parse_row(row)
+        if parsed_row:
+            yield parsed_row
+
+
+def parse_file(name, account_id, file_format, rules, category_ids, path, member):
+    # Module level and free of db access so it can run in a worker process. The
+    # file is the member of the zip archive at path
+    with zipfile.ZipFile(path) as archive, archive.open(member) as stream:
+        reader = csv.reader(
+            io.TextIOWrapper(stream, encoding='utf-8', newline=''),
+            delimiter=file_format.get('delimiter', ','),
+        )
+        try:
+            rows = list(
+                parse_rows(reader, account_id, file_format, rules, category_ids)
+            )
+        except (IndexError, ValueError) as e:
+            raise ValueError(
+                'Could not parse {} line {}: {}'.format(name, reader.line_num, e)
+            )
+    return account_id, rows
+
+
+def is_ofx_file(filename):
+    return bool(filename) and filename.lower().endswith(OFX_EXTENSIONS)
+
+
+def iter_ofx_transactions(stream, block_size=OFX_BLOCK_SIZE):
+    # Tokenizes the statement block by block and yields each <STMTTRN> as a dict
+    # of its fields, so the document is never held in memory as a tree
+    buffer = ''
+    transaction = None
+    while True:
+        block = stream.read(block_size)
+        buffer += block
+        if block:
+            # The text after the last '<' may belong to a tag cut off by the block
+            cut = buffer.rfind('<')
+            if cut == -1:
+                continue
+            text, buffer = buffer[:cut], buffer[cut:]
+        else:
+            text, buffer = buffer, ''
+
+        for closing, name, value in OFX_TAG.findall(text):
+            name = name.upper()
+            if name == 'STMTTRN':
+                if closing and transaction is not None:
+                    yield transaction
+                transaction = None if closing else {}
+            elif transaction is not None and not closing:
+                transaction[name] = html.unescape(value.strip())
+
+        if not block:
+            return
+
+
+def parse_ofx_rows(stream, account_id, category_ids):
+    uncategorized_expense_id = category_ids.get('Uncategorized Expense')
+    uncategorized_income_id = category_ids.get('Other Income')
+
+    for transaction in iter_ofx_transactions(stream):
+        # DTPOSTED is YYYYMMDD optionally followed by time and timezone
+        date_data = transaction['DTPOSTED'][:8]
+        date = datetime.strptime(date_data, '%Y%m%d').date()
+        amount = parse_amount(transaction['TRNAMT'])
+        description = transaction.get('NAME') or transaction.get('MEMO') or ''
+        fitid = transaction.get('FITID')
+
+        yield {
+            'date': date,
+            'description': description[:240],
+            'amount': amount,
+            'category_id': (
+                uncategorized_expense_id if amount < 0 else uncategorized_income_id
+            ),
+            'account_id': account_id,
+            'fingerprint': (
+                get_fitid_fingerprint(fitid)
+                if fitid
+                else get_transaction_fingerprint(date, description, amount)
+            ),
+            'properties': json.dumps({'fitid': fitid} if fitid else {}),
+        }
@@ -0,0 +1,156 @@
+import calendar
+from datetime import date
+
+from app.money import Cents
+
+# Report columns are built from (year, month) keyed MonthMatrix rows, so any
+# range of months, or of whole years, is a slice of the same aggregates
+
+MAX_YEARS = 50
+# The query arguments ReportRange.from_args reads
+RANGE_ARGS = ('months', 'years', 'start', 'end', 'yearly', 'year')
+
+
+def add_months(year, month, months):
+    period = year * 12 + month - 1 + months
+    return period // 12, period % 12 + 1
+
+
+class ReportRange:
+    # start and end are (year, month), both included
+    def __init__(self, start, end, yearly=False):
+        self.start = start
+        self.end = end
+        self.yearly = yearly
+
+    def __repr__(self):
+        return '<ReportRange {}-{:02d} {}-{:02d}{}>'.format(
+            *self.start, *self.end, ' yearly' if self.yearly else ''
+        )
+
+    @classmethod
+    def for_year(cls, year):
+        return cls((year, 1), (year, 12))
+
+    @classmethod
+    def trailing_months(cls, months, today=None):
+        today = today or date.today()
+        end = (today.year, today.month)
+        return cls(add_months(*end, 1 - months), end)
+
+    @classmethod
+    def trailing_years(cls, years, today=None):
+        today = today or date.today()
+        return cls((today.year - years + 1, 1), (today.year, 12), yearly=True)
+
+    @classmethod
+    def from_args(cls, args):
+        # ?months=24, ?years=5, ?start=2019-04&end=2021-03 or ?year=2019.
+        # Raises ValueError for anything else
+        if args.get('months'):
+            report_range = cls.trailing_months(int(args['months']))
+        elif args.get('years'):
+            report_range = cls.trailing_years(int(args['years']))
+        elif args.get('start') or args.get('end'):
+            report_range = cls(
+                parse_month(args.get('start', '')),
+                parse_month(args.get('end', '')),
+                yearly=bool(args.get('yearly')),
+            )
+        else:
+            report_range = cls.for_year(int(args.get('year') or date.today().year))
+        if report_range.is_empty():
+            raise ValueError('The range ends before it starts')
+        if report_range.last_year - report_range.first_year >= MAX_YEARS:
+            raise ValueError('Ranges are limited to {} years'.format(MAX_YEARS))
+        return report_range
+
+    @property
+    def first_year(self):
+        return self.start[0]
+
+    @property
+    def last_year(self):
+        return self.end[0]
+
+    @property
+    def key(self):
+        return '{}-{:02d}:{}-{:02d}:{}'.format(
+            *self.start, *self.end, 'yearly' if self.yearly else 'monthly'
+        )
+
+    def get_title(self):
+        # '2019', '2015 - 2019' or 'Apr 2019 - Mar 2020'
+        if self.start == (self.first_year, 1) and self.end == (self.last_year, 12):
+            if self.first_year == self.last_year:
+                return str(self.first_year)
+            return '{} - {}'.format(self.first_year, self.last_year)
+        return '{} {} - {} {}'.format(
+            calendar.month_abbr[self.start[1]],
+            self.first_year,
+            calendar.month_abbr[self.end[1]],
+            self.last_year,
+        )
+
+    def is_empty(self):
+        return self.end < self.start
+
+    def clipped(self, end):
+        # The same range ending no later than end, e.g. today for balances
+        return ReportRange(self.start, min(self.end, end), self.yearly)
+
+    def months(self):
+        year, month = self.start
+        while (year, month) <= self.end:
+            yield year, month
+            year, month = add_months(year, month, 1)
+
+    def get_columns(self):
+        # (label, year, month) per column, month is None for yearly columns
+        if self.yearly:
+            return [
+                (str(year), year, None)
+                for year in range(self.first_year, self.last_year + 1)
+            ]
+        if self.first_year == self.last_year:
+            return [
+                (calendar.month_name[month], year, month)
+                for year, month in self.months()
+            ]
+        return [
+            ('{} {}'.format(calendar.month_abbr[month], year), year, month)
+            for year, month in self.months()
+        ]
+
+    def get_row(self, matrix, balances=False):
+        # One Cents per column. Yearly columns sum the months, or take the
+        # last month in the range for balances
+        values = [
+            matrix.get(year, month) if year in matrix else Cents()
+            for year, month in self.months()
+        ]
+        if not self.yearly:
+            return values
+
+        row = []
+        year_start = 0
+        for year in range(self.first_year, self.last_year + 1):
+            last_month = self.end[1] if year == self.last_year else 12
+            first_month = self.start[1] if year == self.first_year else 1
+            year_values = values[year_start : year_start + last_month - first_month + 1]
+            year_start += len(year_values)
+            row.append(year_values[-1] if balances else sum(year_values, Cents()))
+        return row
+
+
+def get_range_args(args):
+    # Only the range arguments of a query string, for links to the same range
+    return {name: args[name] for name in RANGE_ARGS if args.get(name)}
+
+
+def parse_month(value):
+    # '2019-04' -> (2019, 4)
+    year, month = (int(part) for part in value.split('-'))
+    if not 1 <= month <= 12:
+        raise ValueError('Invalid month {}'.format(value))
+    return year, month
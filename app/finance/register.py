@@ -0,0 +1,136 @@
+from datetime import date
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import aliased, joinedload
+
+from app import db
+from app.finance.snapshots import get_balance_before
+from app.models import Transaction
+
+# An account's transactions one page at a time in (date, id) order. Pages
+# start after or end before a (date, id) cursor so every page is an index range
+# scan of ix_transaction_account_id_date_id, however deep into the register
+
+
+def parse_cursor(value):
+    # '2019-04-30:1234' -> (date(2019, 4, 30), 1234), raises ValueError
+    if not value:
+        return None
+    day, transaction_id = value.split(':')
+    year, month, day = (int(part) for part in day.split('-'))
+    return date(year, month, day), int(transaction_id)
+
+
+def format_cursor(transaction):
+    return '{:%Y-%m-%d}:{}'.format(transaction.date, transaction.id)
+
+
+def is_after(columns, cursor):
+    day, transaction_id = cursor
+    return or_(
+        columns.date > day, and_(columns.date == day, columns.id > transaction_id)
+    )
+
+
+def is_before(columns, cursor):
+    day, transaction_id = cursor
+    return or_(
+        columns.date < day, and_(columns.date == day, columns.id < transaction_id)
+    )
+
+
+def has_transactions(account_id, condition):
+    # Fetches at most one row, still an index range scan
+    return (
+        db.session.query(Transaction.id)
+        .filter(Transaction.account_id == account_id, condition)
+        .first()
+        is not None
+    )
+
+
+def get_balance_before_transaction(account_id, transaction):
+    # The last month end snapshot plus this month's rows before the transaction
+    day = transaction.date
+    month_total = (
+        db.session.query(func.sum(Transaction.amount))
+        .filter(
+            Transaction.account_id == account_id,
+            Transaction.date >= day.replace(day=1),
+            is_before(Transaction, (day, transaction.id)),
+        )
+        .scalar()
+    )
+    return get_balance_before(account_id, day.year, day.month) + (month_total or 0)
+
+
+class RegisterPage:
+    def __init__(self, rows, has_previous, has_next):
+        # rows are (transaction, balance after it), balance is None unless
+        # running balances were asked for
+        self.rows = rows
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.rows:
+            return format_cursor(self.rows[0][0])
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.rows:
+            return format_cursor(self.rows[-1][0])
+
+
+def get_register_page(
+    account_id, after=None, before=None, per_page=100, running_balance=False
+):
+    query = db.session.query(Transaction).filter(Transaction.account_id == account_id)
+    if before is not None:
+        query = query.filter(is_before(Transaction, before)).order_by(
+            Transaction.date.desc(), Transaction.id.desc()
+        )
+    else:
+        if after is not None:
+            query = query.filter(is_after(Transaction, after))
+        query = query.order_by(Transaction.date, Transaction.id)
+    # One extra row tells whether there's another page in that direction
+    page = query.limit(per_page + 1).subquery()
+
+    page_transaction = aliased(Transaction, page)
+    columns = [page_transaction]
+    if running_balance:
+        # Summed over the page only, on top of the balance before its first row
+        columns.append(func.sum(page.c.amount).over(order_by=(page.c.date, page.c.id)))
+    rows = (
+        db.session.query(*columns)
+        .options(joinedload(page_transaction.category))
+        .order_by(page.c.date, page.c.id)
+        .all()
+    )
+
+    if running_balance and rows:
+        opening_balance = get_balance_before_transaction(account_id, rows[0][0])
+        rows = [(row[0], opening_balance + row[1]) for row in rows]
+    else:
+        rows = [(transaction, None) for transaction in rows]
+
+    # The extra row answers for the paging direction, the other direction has
+    # another page when a row lies on the other side of the cursor
+    has_more = len(rows) > per_page
+    if before is not None:
+        return RegisterPage(
+            rows[-per_page:],
+            has_previous=has_more,
+            has_next=has_transactions(account_id, ~is_before(Transaction, before)),
+        )
+    return RegisterPage(
+        rows[:per_page],
+        has_previous=after is not None
+        and has_transactions(account_id, ~is_after(Transaction, after)),
+        has_next=has_more,
+    )
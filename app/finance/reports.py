@@ -0,0 +1,168 @@
+from collections import defaultdict
+import json
+
+from sqlalchemy import extract, func
+
+from app import db
+from app.finance.categories import get_category_tree
+from app.finance.matrix import MonthMatrix, rollup_categories
+from app.finance.rollups import covers_whole_months, get_month_totals
+from app.models import Account, Paycheck, Transaction
+from app.money import Cents
+
+# Category each paycheck field is booked to. Deductions count against their
+# category, the fields in PAYCHECK_INCOME_FIELDS are booked as income
+PAYCHECK_CATEGORY_NAMES = {
+    'gross_pay': 'Gross Pay',
+    'federal_income_tax': 'Federal Income Tax',
+    'social_security_tax': 'Social Security Tax',
+    'medicare_tax': 'Medicare Tax',
+    'ma_pfml_tax': 'MA PFML Tax',
+    'state_income_tax': 'State Income Tax',
+    'health_insurance': 'Health Insurance Premium',
+    'dental_insurance': 'Dental Insurance Premium',
+    'traditional_retirement': 'Traditional 401K Contribution',
+    'roth_retirement': 'Roth 401K Contribution',
+    'retirement_match': '401K Match',
+    'retirement_match_in': '401K Match In',
+    'gtl': 'G.T.L.',
+    'gtl_in': 'G.T.L. In',
+    # 'gym_reimbursement': 'Gym Reimbursement',
+    'gym_reimbursement': 'Other Income',
+    'fsa': 'FSA Contribution',
+    'net_pay': 'Net Pay',
+    'expense_reimbursement': 'Expense Reimbursement',
+    'espp': 'ESPP Refunded',
+    'std': 'Short Term Disability',
+    'transit': 'Transit - Pretax',
+}
+PAYCHECK_INCOME_FIELDS = frozenset(
+    [
+        'gross_pay',
+        'net_pay',
+        'gym_reimbursement',
+        'expense_reimbursement',
+        'gtl_in',
+        'retirement_match_in',
+    ]
+)
+# The employer match and group term life are booked twice, once as income
+PAYCHECK_MIRRORED_FIELDS = {'retirement_match': 'retirement_match_in', 'gtl': 'gtl_in'}
+PAYCHECK_STATEMENT_ROOTS = ['Income', 'Expense', 'Tax', 'Investment']
+
+
+def get_leaf_monthly_totals(user_id, start_date, end_date):
+    # Whole months are read from the category_month_total rollup
+    if covers_whole_months(start_date, end_date):
+        return get_month_totals(user_id, start_date, end_date)
+    return get_ledger_leaf_totals(user_id, start_date, end_date)
+
+
+def get_ledger_leaf_totals(user_id, start_date, end_date):
+    # One row per (category, year, month) instead of one ORM object per
+    # transaction
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    return (
+        db.session.query(
+            Transaction.category_id, year, month, func.sum(Transaction.amount)
+        )
+        .join(Account, Account.id == Transaction.account_id)
+        .filter(
+            Account.user_id == user_id,
+            Transaction.date.between(start_date, end_date),
+        )
+        .group_by(Transaction.category_id, year, month)
+        .all()
+    )
+
+
+class CategoryRollup:
+    # Leaf totals go into one MonthMatrix per category, the parents are only
+    # summed once everything has been added
+    def __init__(self, start_date, end_date, tree=None):
+        self.first_year = start_date.year
+        self.last_year = end_date.year
+        self.tree = tree or get_category_tree()
+        self.leaf_totals = {}
+
+    def add(self, category_id, year, month, amount):
+        matrix = self.leaf_totals.get(category_id)
+        if matrix is None:
+            matrix = self.leaf_totals[category_id] = MonthMatrix(
+                self.first_year, self.last_year
+            )
+        matrix.add(int(year), int(month), amount)
+
+    def add_all(self, leaf_totals):
+        for category_id, year, month, amount in leaf_totals:
+            self.add(category_id, year, month, amount)
+
+    def get_totals(self):
+        # category name -> MonthMatrix
+        return rollup_categories(
+            self.tree, self.leaf_totals, self.first_year, self.last_year
+        )
+
+
+def get_paycheck_field_categories(tree):
+    # field -> (category id, sign), resolved once per report
+    field_categories = {}
+    for field, category_name in PAYCHECK_CATEGORY_NAMES.items():
+        category = tree.get_by_name(category_name)
+        if category is None:
+            continue
+        if category.top_level_parent().name not in PAYCHECK_STATEMENT_ROOTS:
+            continue
+        sign = 1 if field in PAYCHECK_INCOME_FIELDS else -1
+        field_categories[field] = (category.id, sign)
+    return field_categories
+
+
+def get_paycheck_monthly_totals(user_id, start_date, end_date, tree=None):
+    # Paychecks projected onto the ledger as (category_id, year, month, amount)
+    # rows, the same shape as get_leaf_monthly_totals
+    field_categories = get_paycheck_field_categories(tree or get_category_tree())
+    year = extract('year', Paycheck.date)
+    month = extract('month', Paycheck.date)
+    filters = [
+        Paycheck.user_id == user_id,
+        Paycheck.date.between(start_date, end_date),
+    ]
+
+    field_totals = defaultdict(Cents)
+    paycheck_columns = Paycheck.__table__.c
+    fields = [field for field in PAYCHECK_CATEGORY_NAMES if field in paycheck_columns]
+    query = (
+        db.session.query(
+            year, month, *[func.sum(paycheck_columns[field]) for field in fields]
+        )
+        .filter(*filters)
+        .group_by(year, month)
+    )
+    for row in query:
+        row_period = (int(row[0]), int(row[1]))
+        for field, total in zip(fields, row[2:]):
+            if total:
+                field_totals[field, row_period] += total
+
+    # The optional fields are stored in properties as dollars, only a few
+    # paychecks have any
+    properties_query = db.session.query(year, month, Paycheck.properties).filter(
+        *filters, Paycheck.properties.notin_(['{}', ''])
+    )
+    for row_year, row_month, properties in properties_query:
+        for field, value in json.loads(properties).items():
+            field_totals[field, (int(row_year), int(row_month))] += value
+
+    for (field, row_period), total in list(field_totals.items()):
+        mirrored_field = PAYCHECK_MIRRORED_FIELDS.get(field)
+        if mirrored_field:
+            field_totals[mirrored_field, row_period] += total
+
+    rows = []
+    for (field, row_period), total in field_totals.items():
+        if field in field_categories:
+            category_id, sign = field_categories[field]
+            rows.append((category_id, *row_period, sign * total))
+    return rows
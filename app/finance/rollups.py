@@ -0,0 +1,220 @@
+import calendar
+from collections import defaultdict
+import logging
+
+from sqlalchemy import and_, extract, func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Account, CategoryMonthTotal, Transaction
+from app.money import Cents
+
+logger = logging.getLogger(__name__)
+
+
+def covers_whole_months(start_date, end_date):
+    last_day = calendar.monthrange(end_date.year, end_date.month)[1]
+    return start_date.day == 1 and end_date.day == last_day
+
+
+def get_ledger_month_totals(user_id=None, account_id=None):
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    query = (
+        db.session.query(
+            Account.user_id,
+            Transaction.category_id,
+            year,
+            month,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id),
+        )
+        .join(Account, Account.id == Transaction.account_id)
+        .group_by(Account.user_id, Transaction.category_id, year, month)
+    )
+    if user_id is not None:
+        query = query.filter(Account.user_id == user_id)
+    if account_id is not None:
+        query = query.filter(Transaction.account_id == account_id)
+    return query
+
+
+def get_month_totals(user_id, start_date, end_date):
+    # (category_id, year, month, total) rows for whole months, read from the
+    # rollup
+    period = CategoryMonthTotal.year * 12 + CategoryMonthTotal.month
+    return (
+        db.session.query(
+            CategoryMonthTotal.category_id,
+            CategoryMonthTotal.year,
+            CategoryMonthTotal.month,
+            func.sum(CategoryMonthTotal.total),
+        )
+        .filter(
+            CategoryMonthTotal.user_id == user_id,
+            CategoryMonthTotal.count > 0,
+            period.between(
+                start_date.year * 12 + start_date.month,
+                end_date.year * 12 + end_date.month,
+            ),
+        )
+        .group_by(
+            CategoryMonthTotal.category_id,
+            CategoryMonthTotal.year,
+            CategoryMonthTotal.month,
+        )
+        .all()
+    )
+
+
+def get_deltas(rows, sign=1):
+    deltas = defaultdict(lambda: [Cents(), 0])
+    for row in rows:
+        delta = deltas[row['category_id'], row['date'].year, row['date'].month]
+        delta[0] += sign * row['amount']
+        delta[1] += sign
+    return deltas
+
+
+def apply_deltas(user_id, deltas):
+    # deltas maps (category_id, year, month) to [total, count] changes. Runs in
+    # the caller's transaction so the rollup commits together with the ledger
+    table = CategoryMonthTotal.__table__
+    for (category_id, year, month), (total, count) in sorted(
+        deltas.items(), key=lambda item: (item[0][0] or 0, item[0][1], item[0][2])
+    ):
+        key = and_(
+            table.c.user_id == user_id,
+            table.c.category_id == category_id,
+            table.c.year == year,
+            table.c.month == month,
+        )
+        update = (
+            table.update()
+            .where(key)
+            .values(total=table.c.total + total, count=table.c.count + count)
+        )
+        if not db.session.execute(update).rowcount:
+            try:
+                # The savepoint keeps the caller's changes when another worker
+                # inserted the month first
+                with db.session.begin_nested():
+                    db.session.execute(
+                        table.insert().values(
+                            user_id=user_id,
+                            category_id=category_id,
+                            year=year,
+                            month=month,
+                            total=total,
+                            count=count,
+                        )
+                    )
+            except IntegrityError:
+                db.session.execute(update)
+        elif count < 0:
+            db.session.execute(table.delete().where(and_(key, table.c.count <= 0)))
+
+
+def add_transactions(user_id, rows):
+    apply_deltas(user_id, get_deltas(rows))
+
+
+def move_transaction(transaction, old_category_id):
+    if old_category_id == transaction.category_id:
+        return
+    row = {'date': transaction.date, 'amount': transaction.amount}
+    deltas = get_deltas([dict(row, category_id=old_category_id)], sign=-1)
+    deltas.update(get_deltas([dict(row, category_id=transaction.category_id)]))
+    apply_deltas(transaction.account.user_id, deltas)
+
+
+def remove_account_transactions(account):
+    deltas = {
+        (category_id, int(year), int(month)): [-total, -count]
+        for _, category_id, year, month, total, count in get_ledger_month_totals(
+            account_id=account.id
+        )
+    }
+    apply_deltas(account.user_id, deltas)
+
+
+def refresh_months(user_id, months):
+    # Recomputes the given (year, month)s from the ledger, for when the exact
+    # change isn't known
+    table = CategoryMonthTotal.__table__
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    for row_year, row_month in months:
+        db.session.execute(
+            table.delete().where(
+                and_(
+                    table.c.user_id == user_id,
+                    table.c.year == row_year,
+                    table.c.month == row_month,
+                )
+            )
+        )
+        query = get_ledger_month_totals(user_id=user_id).filter(
+            year == row_year, month == row_month
+        )
+        insert_totals(query)
+
+
+def insert_totals(query):
+    rows = [
+        {
+            'user_id': user_id,
+            'category_id': category_id,
+            'year': int(year),
+            'month': int(month),
+            'total': total,
+            'count': count,
+        }
+        for user_id, category_id, year, month, total, count in query
+    ]
+    if rows:
+        db.session.execute(CategoryMonthTotal.__table__.insert(), rows)
+    return len(rows)
+
+
+def rebuild(user_id=None):
+    table = CategoryMonthTotal.__table__
+    delete = table.delete()
+    if user_id is not None:
+        delete = delete.where(table.c.user_id == user_id)
+    db.session.execute(delete)
+    inserted = insert_totals(get_ledger_month_totals(user_id=user_id))
+    logger.info('Rebuilt %s category month totals', inserted)
+    return inserted
+
+
+def check(user_id=None):
+    # Returns (key, ledger (total, count), rollup (total, count)) for every
+    # user, category and month where the rollup disagrees with the ledger
+    ledger = {
+        (row_user_id, category_id, int(year), int(month)): (total, count)
+        for row_user_id, category_id, year, month, total, count in (
+            get_ledger_month_totals(user_id=user_id)
+        )
+    }
+    query = db.session.query(
+        CategoryMonthTotal.user_id,
+        CategoryMonthTotal.category_id,
+        CategoryMonthTotal.year,
+        CategoryMonthTotal.month,
+        CategoryMonthTotal.total,
+        CategoryMonthTotal.count,
+    ).filter(CategoryMonthTotal.count != 0)
+    if user_id is not None:
+        query = query.filter(CategoryMonthTotal.user_id == user_id)
+    rollup = {tuple(row[:4]): (row.total, row.count) for row in query}
+
+    mismatches = []
+    for key in sorted(set(ledger) | set(rollup), key=lambda key: str(key)):
+        ledger_total, ledger_count = ledger.get(key, (Cents(), 0))
+        rollup_total, rollup_count = rollup.get(key, (Cents(), 0))
+        if ledger_count != rollup_count or ledger_total != rollup_total:
+            mismatches.append(
+                (key, (ledger_total, ledger_count), (rollup_total, rollup_count))
+            )
+    return mismatches
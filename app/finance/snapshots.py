@@ -0,0 +1,190 @@
+from collections import defaultdict
+import logging
+
+from sqlalchemy import and_, extract, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Account, AccountMonthBalance, Transaction
+from app.money import Cents
+
+logger = logging.getLogger(__name__)
+
+
+def get_period(year, month):
+    return year * 12 + month
+
+
+def get_monthly_net_changes(account_ids=None):
+    # (account_id, year, month, net change) for every month with transactions
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    query = db.session.query(
+        Transaction.account_id, year, month, func.sum(Transaction.amount)
+    ).group_by(Transaction.account_id, year, month)
+    if account_ids is not None:
+        query = query.filter(Transaction.account_id.in_(account_ids))
+    return query.order_by(Transaction.account_id, year, month)
+
+
+def compute_snapshots(accounts):
+    # One prefix sum over the monthly net changes of each account
+    starting_balances = {
+        account.id: Cents() + (account.starting_balance or 0) for account in accounts
+    }
+    balances = dict(starting_balances)
+    rows = []
+    for account_id, year, month, net_change in get_monthly_net_changes(
+        list(starting_balances)
+    ):
+        balances[account_id] += net_change
+        rows.append(
+            {
+                'account_id': account_id,
+                'year': int(year),
+                'month': int(month),
+                'net_change': net_change,
+                'ending_balance': balances[account_id],
+            }
+        )
+    return rows
+
+
+def rebuild(accounts):
+    table = AccountMonthBalance.__table__
+    account_ids = [account.id for account in accounts]
+    if not account_ids:
+        return 0
+    db.session.execute(table.delete().where(table.c.account_id.in_(account_ids)))
+    rows = compute_snapshots(accounts)
+    if rows:
+        db.session.execute(table.insert(), rows)
+    logger.info('Rebuilt %s account month balances', len(rows))
+    return len(rows)
+
+
+def add_transactions(account_id, rows):
+    # Runs in the caller's transaction so the snapshots commit with the ledger
+    net_changes = defaultdict(Cents)
+    for row in rows:
+        net_changes[row['date'].year, row['date'].month] += row['amount']
+    for (year, month), net_change in sorted(net_changes.items()):
+        add_net_change(account_id, year, month, net_change)
+
+
+def add_net_change(account_id, year, month, net_change):
+    table = AccountMonthBalance.__table__
+    period = table.c.year * 12 + table.c.month
+    key = and_(
+        table.c.account_id == account_id, table.c.year == year, table.c.month == month
+    )
+    if db.session.execute(select([table.c.id]).where(key)).scalar() is None:
+        balance = get_balance_before(account_id, year, month)
+        try:
+            # The savepoint keeps the caller's changes when another worker
+            # inserted the month first, its row is updated below instead
+            with db.session.begin_nested():
+                db.session.execute(
+                    table.insert().values(
+                        account_id=account_id,
+                        year=year,
+                        month=month,
+                        net_change=0,
+                        ending_balance=balance,
+                    )
+                )
+        except IntegrityError:
+            pass
+    db.session.execute(
+        table.update().where(key).values(net_change=table.c.net_change + net_change)
+    )
+    # Every later month end moves by the same amount
+    db.session.execute(
+        table.update()
+        .where(
+            and_(table.c.account_id == account_id, period >= get_period(year, month))
+        )
+        .values(ending_balance=table.c.ending_balance + net_change)
+    )
+
+
+def get_balance_before(account_id, year, month):
+    period = AccountMonthBalance.year * 12 + AccountMonthBalance.month
+    balance = (
+        db.session.query(AccountMonthBalance.ending_balance)
+        .filter(
+            AccountMonthBalance.account_id == account_id,
+            period < get_period(year, month),
+        )
+        .order_by(period.desc())
+        .limit(1)
+        .scalar()
+    )
+    if balance is None:
+        balance = (
+            db.session.query(Account.starting_balance)
+            .filter(Account.id == account_id)
+            .scalar()
+        )
+    return balance or Cents()
+
+
+def shift_balances(account_id, difference):
+    # For a changed starting balance
+    if not difference:
+        return
+    table = AccountMonthBalance.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.account_id == account_id)
+        .values(ending_balance=table.c.ending_balance + difference)
+    )
+
+
+def delete(account_id):
+    table = AccountMonthBalance.__table__
+    db.session.execute(table.delete().where(table.c.account_id == account_id))
+
+
+def get_snapshots(account_ids):
+    # account_id -> [(year, month, ending balance)] in month order
+    snapshots = {account_id: [] for account_id in account_ids}
+    query = (
+        db.session.query(
+            AccountMonthBalance.account_id,
+            AccountMonthBalance.year,
+            AccountMonthBalance.month,
+            AccountMonthBalance.ending_balance,
+        )
+        .filter(AccountMonthBalance.account_id.in_(account_ids))
+        .order_by(
+            AccountMonthBalance.account_id,
+            AccountMonthBalance.year,
+            AccountMonthBalance.month,
+        )
+    )
+    for account_id, year, month, ending_balance in query:
+        snapshots[account_id].append((year, month, ending_balance))
+    return snapshots
+
+
+def check(accounts):
+    # Returns (account_id, year, month, expected, stored) for every month
+    # whose stored balance disagrees with a fresh prefix sum
+    expected = {
+        (row['account_id'], row['year'], row['month']): row['ending_balance']
+        for row in compute_snapshots(accounts)
+    }
+    stored = {}
+    snapshots = get_snapshots([account.id for account in accounts])
+    for account_id, rows in snapshots.items():
+        for year, month, ending_balance in rows:
+            stored[account_id, year, month] = ending_balance
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        if key not in expected or key not in stored:
+            mismatches.append((*key, expected.get(key), stored.get(key)))
+        elif expected[key] != stored[key]:
+            mismatches.append((*key, expected[key], stored[key]))
+    return mismatches
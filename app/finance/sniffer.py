@@ -0,0 +1,266 @@
+from collections import Counter
+import csv
+from datetime import datetime
+import io
+
+from app.finance.forms import DATE_FORMAT_CHOICES
+from app.finance.parsers import IGNORED_DATE_PREFIXES, IGNORED_DATE_VALUES
+from app.finance.parsers import compile_row_parser, parse_amount
+
+# Only this much of an upload is read, whatever the size of the file
+SAMPLE_SIZE = 8 * 1024
+DELIMITERS = ',;\t|'
+PREVIEW_ROWS = 10
+
+HEADER_NAMES = {
+    'date': ('date', 'posted', 'transaction date', 'trade date'),
+    'description': ('description', 'payee', 'name', 'memo', 'details'),
+    'amount': ('amount', 'value', 'net amount'),
+    'debit': ('debit', 'debits', 'debit amount', 'withdrawal', 'withdrawals'),
+    'credit': ('credit', 'credits', 'credit amount', 'deposit', 'deposits'),
+    'category': ('category',),
+}
+# Header words of running balance and total columns, which are never amounts
+TOTAL_HEADER_WORDS = ('balance', 'total')
+
+
+class FormatDetectionError(ValueError):
+    pass
+
+
+def read_sample(stream, size=SAMPLE_SIZE):
+    sample = stream.read(size)
+    if hasattr(stream, 'seek'):
+        stream.seek(0)
+    text = sample.decode('utf-8', errors='replace').lstrip('\ufeff')
+    if len(sample) == size:
+        # The last line is most likely cut off by the sample boundary
+        text = text[: text.rfind('\n') + 1] or text
+    return text
+
+
+def sniff_delimiter(text):
+    # csv.Sniffer is thrown off by the preamble lines some banks export, so pick
+    # the delimiter which splits the most rows into the same number of columns
+    best_delimiter, best_rows = ',', 0
+    for delimiter in DELIMITERS:
+        lengths = Counter(
+            len(row)
+            for row in csv.reader(io.StringIO(text), delimiter=delimiter)
+            if len(row) > 1
+        )
+        if lengths:
+            _, rows = lengths.most_common(1)[0]
+            if rows > best_rows:
+                best_delimiter, best_rows = delimiter, rows
+    return best_delimiter
+
+
+def parse_date(value, date_format):
+    try:
+        return datetime.strptime(value.strip(), date_format)
+    except ValueError:
+        return None
+
+
+def is_amount(value):
+    if not value.strip():
+        return False
+    try:
+        parse_amount(value)
+    except ValueError:
+        return False
+    return True
+
+
+def match_date_format(values):
+    # The format which parses the most values, earlier choices win ties
+    best_format, best_count = None, 0
+    for date_format, _ in DATE_FORMAT_CHOICES:
+        count = sum(1 for value in values if parse_date(value, date_format))
+        if count > best_count:
+            best_format, best_count = date_format, count
+    return best_format, best_count
+
+
+def find_header_column(header, field):
+    names = HEADER_NAMES[field]
+    for index, name in enumerate(header):
+        if name.strip().lower() in names:
+            return index
+    return None
+
+
+def is_total_column(name):
+    name = name.strip().lower()
+    return any(word in name for word in TOTAL_HEADER_WORDS)
+
+
+def detect_file_format(text):
+    # Returns the file format and the import rules it needs, like reading
+    # separate Debit and Credit columns, for an account's update_file_format and
+    # update_import_rules
+    delimiter = sniff_delimiter(text)
+    rows = [row for row in csv.reader(io.StringIO(text), delimiter=delimiter)]
+    lengths = Counter(len(row) for row in rows if len(row) > 1)
+    if not lengths:
+        raise FormatDetectionError('Could not find any columns in the file')
+    num_columns = lengths.most_common(1)[0][0]
+
+    # Data rows start at the first full width row with a parseable date
+    header_rows = None
+    for index, row in enumerate(rows):
+        if len(row) == num_columns and any(
+            parse_date(value, date_format)
+            for value in row
+            for date_format, _ in DATE_FORMAT_CHOICES
+        ):
+            header_rows = index
+            break
+    if header_rows is None:
+        raise FormatDetectionError('Could not find a date column in the file')
+
+    header = rows[header_rows - 1] if header_rows else []
+    header_columns = {
+        field: find_header_column(header, field) for field in HEADER_NAMES
+    }
+    for field, index in header_columns.items():
+        if index is not None and index >= num_columns:
+            raise FormatDetectionError(
+                'The header has a {} column but the rows are only {} columns '
+                'wide'.format(field, num_columns)
+            )
+
+    data = [row for row in rows[header_rows:] if len(row) == num_columns]
+    columns = list(zip(*data))
+
+    date_index = header_columns['date']
+    date_format = None
+    if date_index is not None:
+        date_format, _ = match_date_format(columns[date_index])
+    if date_format is None:
+        best_count = 0
+        for index, values in enumerate(columns):
+            column_format, count = match_date_format(values)
+            if count > best_count:
+                date_index, date_format, best_count = index, column_format, count
+
+    # Skip the rows the importer skips, like totals, by their date column
+    data = [
+        row
+        for row in data
+        if row[date_index].strip() not in IGNORED_DATE_VALUES
+        and not row[date_index].startswith(IGNORED_DATE_PREFIXES)
+    ]
+    if not data:
+        raise FormatDetectionError('Could not find any transactions in the file')
+    columns = list(zip(*data))
+
+    total_indexes = {
+        index for index, name in enumerate(header) if is_total_column(name)
+    }
+    debit_index, credit_index = header_columns['debit'], header_columns['credit']
+    import_rules = {}
+    amount_index = header_columns['amount']
+    if amount_index is not None and any(is_amount(v) for v in columns[amount_index]):
+        pass
+    elif debit_index is not None and credit_index is not None:
+        # Read the debit column and fall back to the credit column next to it
+        # when a row has no debit
+        if credit_index != debit_index + 1:
+            raise FormatDetectionError(
+                'The Credit column has to come right after the Debit column'
+            )
+        amount_index = debit_index
+        debits = [
+            parse_amount(value) for value in columns[debit_index] if is_amount(value)
+        ]
+        import_rules = {
+            'credit_column_fallback': True,
+            # Debits are usually exported as positive amounts
+            'invert_amount': sum(1 for debit in debits if debit > 0) * 2 > len(debits),
+        }
+    else:
+        # Prefer columns with cents over counts like quantities or check numbers
+        candidates = [
+            (
+                sum(1 for value in values if is_amount(value)),
+                sum(1 for value in values if '.' in value),
+                index,
+            )
+            for index, values in enumerate(columns)
+            if index != date_index and index not in total_indexes
+        ]
+        candidates = [c for c in candidates if c[0] * 2 > len(data)]
+        if not candidates:
+            raise FormatDetectionError('Could not find an amount column in the file')
+        with_cents = [c for c in candidates if c[1] * 2 > len(data)]
+        if header and len(with_cents) > 1:
+            # The header names none of them, rather than guess wrong
+            raise FormatDetectionError(
+                'Could not tell which of the columns {} is the amount'.format(
+                    ', '.join(header[c[2]] for c in with_cents)
+                )
+            )
+        amount_index = max(candidates, key=lambda c: (c[1], c[0], -c[2]))[2]
+
+    description_index = header_columns['description']
+    if description_index is None:
+        # The free text column with the most distinct and longest values
+        excluded = {date_index, amount_index, debit_index, credit_index}
+        candidates = [
+            (len(set(values)), sum(len(value) for value in values), index)
+            for index, values in enumerate(columns)
+            if index not in excluded
+            and index not in total_indexes
+            and sum(1 for value in values if is_amount(value)) * 2 <= len(data)
+        ]
+        if not candidates:
+            raise FormatDetectionError(
+                'Could not find a description column in the file'
+            )
+        description_index = max(candidates, key=lambda c: (c[0], c[1], -c[2]))[2]
+
+    category_index = header_columns['category']
+
+    file_format = {
+        'header_rows': header_rows,
+        'num_columns': num_columns,
+        'date_column': date_index + 1,
+        'date_format': date_format,
+        'description_column': description_index + 1,
+        'amount_column': amount_index + 1,
+        # A column past the end of the row means the file has no categories
+        'category_column': (
+            category_index + 1 if category_index is not None else num_columns + 1
+        ),
+        'delimiter': delimiter,
+    }
+    return file_format, import_rules
+
+
+def preview_rows(
+    text, account_id, file_format, rules, category_ids, limit=PREVIEW_ROWS
+):
+    reader = csv.reader(io.StringIO(text), delimiter=file_format['delimiter'])
+    rows = list(reader)[file_format['header_rows'] :]
+    if not rows:
+        return []
+    parse_row = compile_row_parser(
+        account_id,
+        file_format,
+        rules,
+        category_ids,
+        has_category_column=len(rows[0]) >= file_format['category_column'],
+    )
+    preview = []
+    for row in rows:
+        try:
+            parsed_row = parse_row(row)
+        except (IndexError, ValueError):
+            continue
+        if parsed_row:
+            preview.append(parsed_row)
+            if len(preview) == limit:
+                break
+    return preview
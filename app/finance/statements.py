@@ -0,0 +1,123 @@
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from app.cache import LRUCache
+from app.finance.categories import get_category_tree
+from app.finance.matrix import MonthMatrix
+from app.finance.reports import (
+    CategoryRollup,
+    get_leaf_monthly_totals,
+    get_paycheck_monthly_totals,
+)
+from app.models import CategoryMonthTotal, Paycheck
+from app.versions import get_ledger_version
+
+# The income statement, cash flow statement and charts all read the same
+# category x month totals. They're computed for whole years and kept per user,
+# year and data version in a per-process LRU cache, any range of months is put
+# together from the cached years
+
+
+def add_summary_rows(totals, year):
+    def get_total(name):
+        total = totals.get(name)
+        return MonthMatrix(year, year) if total is None else total
+
+    income_after_taxes = get_total('Income') + get_total('Tax')
+    net_income = income_after_taxes + get_total('Expense')
+    totals['Income After Taxes'] = income_after_taxes
+    totals['Net Income'] = net_income
+    totals['Net Cash Difference'] = net_income + get_total('Investment')
+    return totals
+
+
+def compute_statement_years(user_id, first_year, last_year):
+    # year -> category name -> MonthMatrix of the year, including the derived
+    # summary rows. The ledger is read once for all the years
+    start_date = date(first_year, 1, 1)
+    end_date = date(last_year, 12, 31)
+    years = range(first_year, last_year + 1)
+
+    rows = {year: [] for year in years}
+    for row in get_paycheck_monthly_totals(user_id, start_date, end_date):
+        rows[int(row[1])].append(row)
+
+    for row in get_leaf_monthly_totals(user_id, start_date, end_date):
+        rows[int(row[1])].append(row)
+    totals = {}
+    for year in years:
+        rollup = CategoryRollup(date(year, 1, 1), date(year, 12, 31))
+        rollup.add_all(rows[year])
+        totals[year] = rollup.get_totals()
+
+    return {year: add_summary_rows(totals[year], year) for year in years}
+
+
+def get_statement_cache(app=None):
+    app = app or current_app
+    cache = app.extensions.get('statement_cache')
+    if cache is None:
+        cache = app.extensions['statement_cache'] = LRUCache(
+            maxsize=app.config['STATEMENT_CACHE_SIZE'],
+            ttl=app.config['STATEMENT_CACHE_TTL'],
+        )
+    return cache
+
+
+def get_statement_matrices(user_id, first_year, last_year):
+    # category name -> MonthMatrix of first_year..last_year, put together from
+    # the cached years. Shared between requests, callers must not modify the
+    # result
+    cache = get_statement_cache()
+    version = (get_ledger_version(user_id), get_category_tree().version)
+    years = {}
+    for year in range(first_year, last_year + 1):
+        cached = cache.get((user_id, year) + version)
+        if cached is not None:
+            years[year] = cached
+
+    missing = [year for year in range(first_year, last_year + 1) if year not in years]
+    if missing:
+        computed = compute_statement_years(user_id, missing[0], missing[-1])
+        for year in missing:
+            years[year] = computed[year]
+            cache.set((user_id, year) + version, computed[year])
+
+    if first_year == last_year:
+        return years[first_year]
+
+    matrices = {}
+    for year_matrices in years.values():
+        for name, matrix in year_matrices.items():
+            if name not in matrices:
+                matrices[name] = MonthMatrix(first_year, last_year)
+            matrices[name] += matrix
+    return matrices
+
+
+def get_report_years(user_id):
+    # Every year from the user's first transaction or paycheck to this year,
+    # newest first
+    def compute():
+        first_total_year = (
+            db.session.query(func.min(CategoryMonthTotal.year))
+            .filter(CategoryMonthTotal.user_id == user_id)
+            .scalar()
+        )
+        first_paycheck_date = (
+            db.session.query(func.min(Paycheck.date))
+            .filter(Paycheck.user_id == user_id)
+            .scalar()
+        )
+        years = [date.today().year]
+        if first_total_year is not None:
+            years.append(first_total_year)
+        if first_paycheck_date is not None:
+            years.append(first_paycheck_date.year)
+        return list(range(years[0], min(years) - 1, -1))
+
+    key = ('years', user_id, get_ledger_version(user_id), date.today().year)
+    return get_statement_cache().get_or_set(key, compute)
@@ -0,0 +1,82 @@
+from collections import defaultdict
+import io
+
+from flask import current_app
+
+from app.finance.importer import (
+    ImportResult,
+    PaycheckImporter,
+    TransactionImporter,
+    get_category_ids_by_name,
+    parse_files,
+)
+from app.jobs import task
+from app.models import Account
+from app.uploads import open_upload
+
+
+@task('import_transactions')
+def import_transactions(job, payload, account_id, file_type='csv'):
+    account = Account.query.get(account_id)
+    importer = TransactionImporter(
+        account, chunk_size=current_app.config['IMPORT_CHUNK_SIZE']
+    )
+    with open_upload(payload) as stream:
+        importer.import_stream(
+            stream, progress=job.report_progress, file_type=file_type
+        )
+
+
+@task('import_paychecks')
+def import_paychecks(job, payload):
+    importer = PaycheckImporter(
+        job.user_id, columns=current_app.config['PAYCHECK_COLUMNS']
+    )
+    with open_upload(payload) as stream:
+        file_contents = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        importer.import_file(file_contents, progress=job.report_progress)
+
+
+@task('import_batch')
+def import_batch(job, payload, files):
+    account_ids = {file['account_id'] for file in files}
+    accounts = {
+        account.id: account
+        for account in Account.query.filter(Account.id.in_(account_ids))
+    }
+    category_ids = get_category_ids_by_name()
+
+    with open_upload(payload) as archive:
+        # Each file is read from the spooled archive by the process parsing it
+        parse_args = [
+            (
+                file['name'],
+                file['account_id'],
+                accounts[file['account_id']].get_file_format(),
+                accounts[file['account_id']].get_import_rules(),
+                category_ids,
+                archive.name,
+                file['member'],
+            )
+            for file in files
+        ]
+        parsed_files = parse_files(
+            parse_args, max_workers=current_app.config['IMPORT_PROCESSES']
+        )
+
+    rows_by_account = defaultdict(list)
+    for account_id, rows in parsed_files:
+        rows_by_account[account_id].extend(rows)
+
+    result = ImportResult()
+    result.rows_parsed = sum(len(rows) for rows in rows_by_account.values())
+    job.report_progress(result)
+
+    for account_id, rows in rows_by_account.items():
+        importer = TransactionImporter(
+            accounts[account_id], chunk_size=current_app.config['IMPORT_CHUNK_SIZE']
+        )
+        account_result = importer.import_parsed(rows)
+        result.inserted += account_result.inserted
+        result.skipped += account_result.skipped
+        job.report_progress(result)
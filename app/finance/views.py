@@ -1,13 +1,37 @@
 import calendar
 from datetime import date
 import json
-
-from flask import redirect, render_template, request, url_for
+import logging
+
+from flask import (
+    abort,
+    current_app,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask_login import current_user, login_required
+from markupsafe import Markup
+from sqlalchemy.orm import joinedload
+from werkzeug.urls import url_encode
 
+from app.cache import get_fragment_cache
+from app.conditional import conditional
 from app.finance import finance
 from app.finance.accounts import AccountManager
-from app.models import Account, Category, Paycheck, Transaction
+from app.finance.balances import get_account_balances
+from app.finance.categories import get_category_tree
+from app.finance.matrix import MonthMatrix
+from app.finance.ranges import ReportRange, get_range_args
+from app.finance.register import get_register_page, parse_cursor
+from app.finance.statements import get_report_years, get_statement_matrices
+from app.jobs import get_job_queue
+from app.models import Account, CategoryClosure, Paycheck, Transaction
+from app.versions import get_ledger_version
+
+logger = logging.getLogger(__name__)
 
 
 @finance.route('/')
@@ -35,15 +59,31 @@ def account_details(account_id):
 @login_required
 def view_transactions(account_id):
     account = Account.query.filter(Account.id == account_id).first_or_404()
+    try:
+        after = parse_cursor(request.args.get('after'))
+        before = parse_cursor(request.args.get('before'))
+    except ValueError:
+        abort(400)
+    running_balance = bool(request.args.get('balance'))
+    page = get_register_page(
+        account.id,
+        after=after,
+        before=before,
+        per_page=current_app.config['TRANSACTIONS_PER_PAGE'],
+        running_balance=running_balance,
+    )
     return render_template(
-        'finance/transactions.html', transactions=list(account.transactions)
+        'finance/transactions.html',
+        account=account,
+        page=page,
+        running_balance=running_balance,
     )
 
 
 @finance.route('/categories')
 @login_required
 def categories():
-    root_categories = Category.query.filter(Category.parent == None).all()
+    root_categories = get_category_tree().get_roots()
     return render_template('finance/categories.html', categories=root_categories)
 
 
@@ -54,283 +94,188 @@ def paychecks():
     return render_template('finance/paychecks.html', paychecks=paychecks)
 
 
-def month_choices():
-    choices = []
-    for i, month in enumerate(calendar.month_name):
-        if i == 0:
-            month = "Select Month"
-        choices.append((i, month))
-    return choices
+def get_job_or_404(job_id):
+    job = get_job_queue().get_job(job_id)
+    if job is None or job.user_id != current_user.id:
+        abort(404)
+    return job
 
 
-def paycheck_col_to_category_name(col_name):
-    translation = {
-        'gross_pay': 'Gross Pay',
-        'federal_income_tax': 'Federal Income Tax',
-        'social_security_tax': 'Social Security Tax',
-        'medicare_tax': 'Medicare Tax',
-        'ma_pfml_tax': 'MA PFML Tax',
-        'state_income_tax': 'State Income Tax',
-        'health_insurance': 'Health Insurance Premium',
-        'dental_insurance': 'Dental Insurance Premium',
-        'traditional_retirement': 'Traditional 401K Contribution',
-        'roth_retirement': 'Roth 401K Contribution',
-        'retirement_match': '401K Match',
-        'retirement_match_in': '401K Match In',
-        'gtl': 'G.T.L.',
-        'gtl_in': 'G.T.L. In',
-        #'gym_reimbursement': 'Gym Reimbursement',
-        'gym_reimbursement': 'Other Income',
-        'fsa': 'FSA Contribution',
-        'net_pay': 'Net Pay',
-        'expense_reimbursement': 'Expense Reimbursement',
-        'espp': 'ESPP Refunded',
-        'std': 'Short Term Disability',
-        'transit': 'Transit - Pretax',
-    }
-    return translation[col_name]
-
-
-def convert_paychecks_to_transactions(paychecks):
-    transactions = []
-    for paycheck in paychecks:
-        paycheck_dict = paycheck.__dict__
-        paycheck_dict['retirement_match_in'] = paycheck.retirement_match
-        paycheck_date = paycheck_dict.get('date')
-        for key, value in paycheck.get_properties().items():
-            paycheck_dict[key] = value
-            if key == 'gtl':
-                paycheck_dict['{}_in'.format(key)] = value
-
-        [
-            paycheck_dict.pop(k)
-            for k in [
-                '_sa_instance_state',
-                'id',
-                'user_id',
-                'company_name',
-                'date',
-                'properties',
-            ]
-        ]
-
-        for key, value in paycheck_dict.items():
-            if key not in [
-                'gross_pay',
-                'net_pay',
-                'gym_reimbursement',
-                'expense_reimbursement',
-                'gtl_in',
-                'retirement_match_in',
-            ]:
-                value = -value
-            cat_name = paycheck_col_to_category_name(key)
-            category = Category.query.filter(Category.name == cat_name).first()
-            top_level_category = category.top_level_parent()
-            if top_level_category.name in ['Income', 'Expense', 'Tax', 'Investment']:
-                transaction = Transaction(
-                    amount=value, date=paycheck_date, category=category
-                )
-                transactions.append(transaction)
-    return transactions
-
-
-def initialized_category_data(num_months):
-    return {index: total for index, total in enumerate([0] * num_months, start=1)}
-
-
-def get_accounts_category_monthly_balances(year):
-    def list_to_dict(list):
-        return {i: data for i, data in enumerate(list, start=1)}
-
-    current_date = date.today()
-    num_months = 12 if year < current_date.year else current_date.month
-
-    account_manager = AccountManager(current_user.accounts)
-    account_ending_balances = account_manager.get_accounts_monthly_ending_balances_for_year(
-        year
-    )
+@finance.route('/import/<string:job_id>')
+@login_required
+def import_progress(job_id):
+    job = get_job_or_404(job_id)
+    return render_template('finance/import_progress.html', job=job)
 
-    accounts_monthly_ending_balance = {}
 
-    for account_name, ending_balances in account_ending_balances.items():
-        accounts_monthly_ending_balance[account_name] = list_to_dict(ending_balances)
+@finance.route('/import/<string:job_id>/progress')
+@login_required
+def import_progress_data(job_id):
+    job = get_job_or_404(job_id)
+    return jsonify(job.get_api_repr())
+
+
+def get_report_range():
+    try:
+        return ReportRange.from_args(request.args)
+    except ValueError:
+        abort(400)
+
+
+def get_range_choices():
+    # (query string, label) for the range selector, the trailing ranges and then
+    # every year with data
+    choices = [
+        ('months={}'.format(months), 'Last {} Months'.format(months))
+        for months in (12, 24, 36)
+    ]
+    choices += [
+        ('years={}'.format(years), 'Last {} Years'.format(years)) for years in (5, 10)
+    ]
+    choices += [
+        ('year={}'.format(year), str(year))
+        for year in get_report_years(current_user.id)
+    ]
+    return choices
 
-    for (
-        account
-    ) in (
-        current_user.accounts
-    ):  # maybe pass in user or accounts to make this function predictable
-        ending_balances = accounts_monthly_ending_balance.get(account.name)
-        if ending_balances:
-            parent_categories = (
-                account.category.get_parent_categories() if account.category else []
-            )
-            for parent in parent_categories:
-                if parent.name not in accounts_monthly_ending_balance:
-                    accounts_monthly_ending_balance[
-                        parent.name
-                    ] = initialized_category_data(num_months)
-                accounts_monthly_ending_balance[parent.name] = add_dict_totals(
-                    accounts_monthly_ending_balance.get(parent.name), ending_balances
-                )
-
-    total_current_assetts = accounts_monthly_ending_balance.get(
-        'Current Assetts', initialized_category_data(num_months)
-    )
-    total_current_liabilities = accounts_monthly_ending_balance.get(
-        'Current Liabilities', initialized_category_data(num_months)
-    )
-    accounts_monthly_ending_balance['Working Capital'] = add_dict_totals(
-        total_current_assetts, total_current_liabilities
-    )
 
-    total_assetts = accounts_monthly_ending_balance.get(
-        'Assetts', initialized_category_data(num_months)
-    )
-    total_liabilities = accounts_monthly_ending_balance.get(
-        'Liabilities', initialized_category_data(num_months)
-    )
-    accounts_monthly_ending_balance['Net Worth'] = add_dict_totals(
-        total_assetts, total_liabilities
+def get_accounts_category_monthly_balances(first_year, last_year):
+    # name -> MonthMatrix of first_year..last_year for the accounts, the account
+    # categories and the balance sheet summary rows
+    manager = AccountManager(current_user.accounts)
+    balances = manager.get_accounts_monthly_ending_balances(first_year, last_year)
+    category_balances = manager.get_category_monthly_ending_balances(
+        first_year, last_year, get_category_tree()
     )
+    balances.update(category_balances)
 
-    return accounts_monthly_ending_balance
+    def get_total(name):
+        total = balances.get(name)
+        return MonthMatrix(first_year, last_year) if total is None else total
 
+    working_capital = get_total('Current Assetts') + get_total('Current Liabilities')
+    balances['Working Capital'] = working_capital
+    balances['Net Worth'] = get_total('Assetts') + get_total('Liabilities')
+    return balances
 
-def get_category_monthly_totals(start_date, end_date):
-    # currently only works if start and end date are in the same year. TODO: Fix
-    num_months = end_date.month - start_date.month + 1
 
-    transactions = (
-        Transaction.query.join(Account, Account.id == Transaction.account_id)
-        .filter(
-            Account.user_id == current_user.id,
-            Transaction.date.between(start_date, end_date),
-        )
-        .all()
-    )
-    paychecks = Paycheck.query.filter(
-        Paycheck.user_id == current_user.id, Paycheck.date.between(start_date, end_date)
-    ).all()
-
-    paycheck_transactions = convert_paychecks_to_transactions(paychecks)
-    transactions.extend(paycheck_transactions)
-
-    category_monthly_totals = {}
-    for transaction in transactions:
-        parent_categories = transaction.category.get_parent_categories()
-        for parent_category in parent_categories:
-            if parent_category.name not in category_monthly_totals:
-                category_monthly_totals[
-                    parent_category.name
-                ] = initialized_category_data(num_months)
-            category_monthly_totals[parent_category.name][
-                transaction.date.month
-            ] += transaction.amount
-
-    total_income = category_monthly_totals.get(
-        'Income', initialized_category_data(num_months)
-    )
-    total_tax = category_monthly_totals.get(
-        'Tax', initialized_category_data(num_months)
-    )
-    total_expense = category_monthly_totals.get(
-        'Expense', initialized_category_data(num_months)
-    )
-    total_investment = category_monthly_totals.get(
-        'Investment', initialized_category_data(num_months)
+def get_category_monthly_totals(report_range):
+    return get_statement_matrices(
+        current_user.id, report_range.first_year, report_range.last_year
     )
 
-    category_monthly_totals[
-        'Income After Taxes'
-    ] = income_after_taxes = add_dict_totals(total_income, total_tax)
-    category_monthly_totals['Net Income'] = net_income = add_dict_totals(
-        income_after_taxes, total_expense
-    )
-    category_monthly_totals['Net Cash Difference'] = add_dict_totals(
-        net_income, total_investment
-    )
 
-    return category_monthly_totals
+def get_current_user_id(**kwargs):
+    return current_user.id
+
+
+STATEMENT_TITLES = {
+    'balance_sheet': 'Balance Sheet',
+    'income_statement': 'Income Statement',
+    'cash_flow': 'Cash Flow Statement',
+}
 
 
-def add_dict_totals(dict1, dict2):
-    total = {}
-    for key, value1 in dict1.items():
-        value2 = dict2.get(key, 0)
-        total[key] = value1 + value2
-    return total
+def render_statement(statement_type, report_range, root_names, get_totals, **rows):
+    # The table is cached as rendered html until the user's data, the category
+    # tree or the day changes, the balance sheet runs up to today
+    tree = get_category_tree()
+    # The links in the table carry the range arguments, so they're part of the key
+    range_args = get_range_args(request.args)
+    key = 'statement:{}:{}:{}:{}:{}:{}:{}'.format(
+        current_user.id,
+        statement_type,
+        report_range.key,
+        url_encode(range_args, sort=True),
+        get_ledger_version(current_user.id),
+        tree.version,
+        date.today().isoformat(),
+    )
+    cache = get_fragment_cache()
+    table = cache.get(key)
+    if table is None:
+        balances = statement_type == 'balance_sheet'
+        table = render_template(
+            'finance/statement_table.html',
+            columns=report_range.get_columns(),
+            range_args=range_args,
+            root_categories=tree.get_roots(root_names),
+            category_monthly_totals={
+                name: report_range.get_row(matrix, balances=balances)
+                for name, matrix in get_totals().items()
+            },
+            **rows
+        )
+        cache.set(key, table)
+        logger.debug(
+            'Rendered %s, cache hits %s misses %s', key, cache.hits, cache.misses
+        )
+
+    return render_template(
+        'finance/financial_statement.html',
+        selected_range=request.query_string.decode()
+        or 'year={}'.format(date.today().year),
+        range_choices=get_range_choices(),
+        page_title='{} {}'.format(
+            report_range.get_title(), STATEMENT_TITLES[statement_type]
+        ),
+        statement_table=Markup(table),
+    )
 
 
 @finance.route('/balance_sheet')
 @login_required
+@conditional(get_current_user_id, daily=True)
 def balance_sheet():
-    year = int(request.args.get('year', date.today().year))
-
-    current_monthly_totals = get_accounts_category_monthly_balances(year)
-
-    root_categories = Category.query.filter(
-        Category.parent == None, Category.name.in_(['Assetts', 'Liabilities'])
-    ).all()
+    today = date.today()
+    report_range = get_report_range()
+    # Balances run up to this month, there's nothing to show for later ranges
+    clipped_range = report_range.clipped((today.year, today.month))
+    if not clipped_range.is_empty():
+        report_range = clipped_range
+
+    def get_totals():
+        if clipped_range.is_empty():
+            return {}
+        return get_accounts_category_monthly_balances(
+            report_range.first_year, report_range.last_year
+        )
 
-    return render_template(
-        "finance/financial_statement.html",
-        year=year,
-        page_title='{} Balance Sheet'.format(year),
-        root_categories=root_categories,
-        category_monthly_totals=current_monthly_totals,
+    return render_statement(
+        'balance_sheet',
+        report_range,
+        ['Assetts', 'Liabilities'],
+        get_totals,
         summary_row_items=['Working Capital', 'Net Worth'],
-        month_choices=month_choices(),
     )
 
 
 @finance.route('/income_statement')
 @login_required
+@conditional(get_current_user_id, daily=True)
 def income_statement():
-    year = int(request.args.get('year', date.today().year))
-    start_date = date(year, 1, 1)
-    end_date = date(year, 12, 31)
-
-    category_monthly_totals = get_category_monthly_totals(start_date, end_date)
-
-    root_categories = Category.query.filter(
-        Category.parent == None, Category.name.in_(['Income', 'Expense', 'Tax'])
-    ).all()
-
-    return render_template(
-        "finance/financial_statement.html",
-        year=year,
-        page_title='{} Income Statement'.format(year),
-        root_categories=root_categories,
-        category_monthly_totals=category_monthly_totals,
+    report_range = get_report_range()
+    return render_statement(
+        'income_statement',
+        report_range,
+        ['Income', 'Expense', 'Tax'],
+        lambda: get_category_monthly_totals(report_range),
         summary_row_items=['Income After Taxes', 'Net Income'],
-        month_choices=month_choices(),
     )
 
 
 @finance.route('/cash_flow')
 @login_required
+@conditional(get_current_user_id, daily=True)
 def cash_flow():
-    year = int(request.args.get('year', date.today().year))
-    start_date = date(year, 1, 1)
-    end_date = date(year, 12, 31)
-
-    category_monthly_totals = get_category_monthly_totals(start_date, end_date)
-
-    root_categories = Category.query.filter(
-        Category.parent == None, Category.name == 'Investment'
-    ).all()
-
-    return render_template(
-        "finance/financial_statement.html",
-        page_title='{} Cash Flow Statement'.format(year),
-        year=year,
-        root_categories=root_categories,
-        category_monthly_totals=category_monthly_totals,
+    report_range = get_report_range()
+    return render_statement(
+        'cash_flow',
+        report_range,
+        ['Investment'],
+        lambda: get_category_monthly_totals(report_range),
         header_row_items=['Net Income'],
         summary_row_items=['Net Cash Difference'],
-        month_choices=month_choices(),
     )
 
 
@@ -340,31 +285,33 @@ def get_transactions_for_category(category_id, month, year):
     start_date = date(year, month, 1)
     last_day = calendar.monthrange(start_date.year, month)[1]
     end_date = date(year, month, last_day)
-    category = Category.query.get(category_id)
+    category = get_category_tree().get(category_id)
+    if category is None:
+        abort(404)
 
     data = None
     if category.category_type == 'transaction':
-        if category.is_transaction_level:
-            transactions_q = Transaction.query.filter(
-                Transaction.category_id == category_id
+        data = (
+            Transaction.query.join(
+                CategoryClosure,
+                CategoryClosure.descendant_id == Transaction.category_id,
             )
-        else:
-            children_category_ids = [
-                category.id for category in category.get_transaction_level_children()
-            ]
-            transactions_q = Transaction.query.filter(
-                Transaction.category_id.in_(children_category_ids)
+            .filter(
+                CategoryClosure.ancestor_id == category_id,
+                Transaction.date.between(start_date, end_date),
             )
-
-        data = transactions_q.filter(
-            Transaction.date.between(start_date, end_date)
-        ).all()
+            .options(joinedload(Transaction.category))
+            .all()
+        )
 
     elif category.category_type == 'account':
-        accounts = Account.query.filter(Account.category_id == category_id).all()
-        data = {
-            account.name: account.get_ending_balance(end_date) for account in accounts
-        }
+        accounts = Account.query.filter(
+            Account.user_id == current_user.id, Account.category_id == category_id
+        ).all()
+        balances = get_account_balances(
+            end_date=end_date, account_ids=[account.id for account in accounts]
+        )
+        data = {account.name: balances[account.id] for account in accounts}
 
     return render_template(
         'finance/transactions_for_category.html',
@@ -375,16 +322,10 @@ def get_transactions_for_category(category_id, month, year):
     )
 
 
-def get_plotting_data_for_category(data):
-    months = []
-    amounts = []
-    for month_num, amount in data.items():
-        months.append(calendar.month_abbr[month_num])
-        amounts.append(abs(round(amount, 2)))
-
-    months = json.dumps(months)
-    amounts = json.dumps(amounts)
-    return months, amounts
+def get_plotting_data_for_category(columns, row):
+    labels = [label for label, _, _ in columns]
+    amounts = [abs(round(amount, 2)) for amount in row]
+    return json.dumps(labels), json.dumps(amounts)
 
 
 @finance.route('/charts/')
@@ -392,35 +333,20 @@ def get_plotting_data_for_category(data):
     '/charts/<string:category_name>/'
 )  # don't like because includes accounts and other non-category things
 @login_required
+@conditional(get_current_user_id, daily=True)
 def charts(category_name=None):
-    year = 2018
-    start_date = date(year, 1, 1)
-    end_date = date(year, 12, 31)
+    report_range = get_report_range()
+    columns = report_range.get_columns()
+    category_monthly_totals = get_category_monthly_totals(report_range)
 
     charts = []
-    category_monthly_totals = get_category_monthly_totals(start_date, end_date)
-    if category_name:
-        category_data = category_monthly_totals.get(category_name)
-        if category_data:
-            title = f'{year} {category_name}'.title()
-            months, amounts = get_plotting_data_for_category(category_data)
-            charts.append({'title': title, 'x-axis': months, 'y-axis': amounts})
-    else:
-        income_data = category_monthly_totals.get('Income')
-        income_title = f'{year} Income'.title()
-        income_months, income_amounts = get_plotting_data_for_category(income_data)
-        charts.append(
-            {'title': income_title, 'x-axis': income_months, 'y-axis': income_amounts}
-        )
-        expense_title = f'{year} Expense'.title()
-        expense_data = category_monthly_totals.get('Expense')
-        expense_months, expense_amounts = get_plotting_data_for_category(expense_data)
-        charts.append(
-            {
-                'title': expense_title,
-                'x-axis': expense_months,
-                'y-axis': expense_amounts,
-            }
+    for name in [category_name] if category_name else ['Income', 'Expense']:
+        category_data = category_monthly_totals.get(name)
+        if category_data is None:
+            continue
+        labels, amounts = get_plotting_data_for_category(
+            columns, report_range.get_row(category_data)
         )
+        title = '{} {}'.format(report_range.get_title(), name).title()
+        charts.append({'title': title, 'x-axis': labels, 'y-axis': amounts})
     return render_template('finance/charts.html', charts=charts)
-
@@ -1,5 +1,7 @@
 from decimal import Decimal, ROUND_HALF_UP
 
+from app.money import Cents
+
 
 def percentage(fraction):
     return '{:.2%}'.format(fraction)
@@ -9,7 +11,9 @@ def money(amount, show_as_positive=False):
     if amount is None:
         return None
 
-    if isinstance(amount, Decimal):
+    if isinstance(amount, Cents):
+        amount = amount.to_decimal()
+    elif isinstance(amount, Decimal):
         amount = amount.quantize(Decimal('1.00'), rounding=ROUND_HALF_UP)
     else:
         amount = round(amount, 2)
@@ -0,0 +1,297 @@
+import abc
+from datetime import datetime
+import json
+import logging
+import queue
+import threading
+import uuid
+
+from flask import current_app
+
+from app import db
+from app.redis_connection import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+PROGRESS_FIELDS = ['rows_parsed', 'inserted', 'skipped']
+
+_tasks = {}
+
+
+def task(name):
+    def register(func):
+        _tasks[name] = func
+        return func
+
+    return register
+
+
+class Job:
+    def __init__(
+        self,
+        id,
+        task,
+        kwargs=None,
+        user_id=None,
+        redirect_url=None,
+        status=QUEUED,
+        error=None,
+        created_at=None,
+        **progress
+    ):
+        self.id = id
+        self.task = task
+        self.kwargs = kwargs or {}
+        self.user_id = user_id
+        self.redirect_url = redirect_url
+        self.status = status
+        self.error = error
+        self.created_at = created_at or datetime.utcnow().isoformat()
+        for field in PROGRESS_FIELDS:
+            setattr(self, field, int(progress.get(field) or 0))
+        self.queue = None
+
+    def __repr__(self):
+        return '<Job {} {} {}>'.format(self.id, self.task, self.status)
+
+    @property
+    def is_done(self):
+        return self.status in [FINISHED, FAILED]
+
+    def report_progress(self, result):
+        for field in PROGRESS_FIELDS:
+            setattr(self, field, getattr(result, field))
+        self.queue.save(self)
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'task': self.task,
+            'kwargs': self.kwargs,
+            'user_id': self.user_id,
+            'redirect_url': self.redirect_url,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+        }
+        for field in PROGRESS_FIELDS:
+            data[field] = getattr(self, field)
+        return data
+
+    def get_api_repr(self):
+        data = self.to_dict()
+        data.pop('kwargs')
+        data['done'] = self.is_done
+        return data
+
+
+class JobQueue(abc.ABC):
+    def enqueue(self, task_name, payload, user_id=None, redirect_url=None, **kwargs):
+        if task_name not in _tasks:
+            raise ValueError('Unknown task {}'.format(task_name))
+        job = Job(
+            str(uuid.uuid4()),
+            task_name,
+            kwargs=kwargs,
+            user_id=user_id,
+            redirect_url=redirect_url,
+        )
+        job.queue = self
+        self.push(job, payload)
+        logger.info('Queued %s', job)
+        return job
+
+    def execute(self, job, payload):
+        job.queue = self
+        job.status = RUNNING
+        self.save(job)
+        try:
+            _tasks[job.task](job, payload, **job.kwargs)
+            job.status = FINISHED
+        except Exception as e:
+            logger.exception('%s failed', job)
+            db.session.rollback()
+            job.status = FAILED
+            job.error = str(e)
+        self.save(job)
+        logger.info('%s done', job)
+
+    def work(self, burst=False, timeout=5):
+        while True:
+            item = self.pop(timeout)
+            if item is None:
+                if burst:
+                    return
+                continue
+            try:
+                self.execute(*item)
+            finally:
+                # Every job starts from a fresh session
+                db.session.remove()
+
+    @abc.abstractmethod
+    def push(self, job, payload):
+        pass
+
+    @abc.abstractmethod
+    def pop(self, timeout):
+        pass
+
+    @abc.abstractmethod
+    def save(self, job):
+        pass
+
+    @abc.abstractmethod
+    def get_job(self, job_id):
+        pass
+
+
+# Runs jobs on a background thread of the current process. Only suitable for
+# development and tests since other gunicorn workers can't see its jobs, their
+# progress polls would get a 404
+class InMemoryJobQueue(JobQueue):
+    def __init__(self, app, threaded=True):
+        self.app = app
+        self.threaded = threaded
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def push(self, job, payload):
+        self.save(job)
+        self._queue.put((job, payload))
+        if self.threaded:
+            self._start_worker()
+
+    def pop(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def execute(self, job, payload):
+        try:
+            super().execute(job, payload)
+        finally:
+            self._queue.task_done()
+
+    def save(self, job):
+        with self._lock:
+            self._jobs[job.id] = job.to_dict()
+
+    def get_job(self, job_id):
+        with self._lock:
+            data = self._jobs.get(job_id)
+        return Job(**data) if data else None
+
+    def join(self):
+        self._queue.join()
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        with self.app.app_context():
+            self.work()
+
+
+# Runs each job as soon as it's queued, inside the request that queued it, like
+# uploads were imported before there was a job queue. Works with any number of
+# workers since nothing is left to poll for, the job is done when enqueue returns
+class InlineJobQueue(JobQueue):
+    def push(self, job, payload):
+        self.execute(job, payload)
+
+    def pop(self, timeout):
+        return None
+
+    def save(self, job):
+        pass
+
+    def get_job(self, job_id):
+        return None
+
+
+class RedisJobQueue(JobQueue):
+    queue_key = 'financial:jobs'
+    job_key = 'financial:job:{}'
+    payload_key = 'financial:job:{}:payload'
+    expire_seconds = 60 * 60 * 24
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def push(self, job, payload):
+        pipeline = self.connection.pipeline()
+        pipeline.set(self.payload_key.format(job.id), payload, ex=self.expire_seconds)
+        pipeline.set(
+            self.job_key.format(job.id),
+            json.dumps(job.to_dict()),
+            ex=self.expire_seconds,
+        )
+        pipeline.rpush(self.queue_key, job.id)
+        pipeline.execute()
+
+    def pop(self, timeout):
+        # BLPOP takes whole seconds and treats 0 as block forever
+        item = self.connection.blpop([self.queue_key], timeout=max(int(timeout), 1))
+        if item is None:
+            return None
+        job_id = item[1].decode('utf-8')
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        payload_key = self.payload_key.format(job_id)
+        payload = self.connection.get(payload_key)
+        self.connection.delete(payload_key)
+        return job, payload
+
+    def save(self, job):
+        self.connection.set(
+            self.job_key.format(job.id),
+            json.dumps(job.to_dict()),
+            ex=self.expire_seconds,
+        )
+
+    def get_job(self, job_id):
+        data = self.connection.get(self.job_key.format(job_id))
+        return Job(**json.loads(data.decode('utf-8'))) if data else None
+
+
+def init_app(app):
+    backend = app.config.get('JOB_QUEUE_BACKEND', 'inline')
+    if backend == 'redis':
+        connection = get_redis_connection(app)
+        if connection is None:
+            raise ValueError('REDIS_HOST must be set to use the redis job queue')
+        job_queue = RedisJobQueue(connection)
+    elif backend == 'inline':
+        job_queue = InlineJobQueue()
+    elif backend == 'memory':
+        if not (app.debug or app.testing):
+            # Another worker process would answer the job's progress polls
+            # with 404
+            raise ValueError(
+                'The memory job queue needs DEBUG or TESTING, use the inline '
+                'job queue or set REDIS_HOST for the redis one'
+            )
+        job_queue = InMemoryJobQueue(
+            app, threaded=app.config.get('JOB_QUEUE_THREADED', True)
+        )
+    else:
+        raise ValueError('Unknown job queue backend {}'.format(backend))
+    app.extensions['job_queue'] = job_queue
+
+
+def get_job_queue():
+    return current_app.extensions['job_queue']
@@ -1,11 +1,15 @@
-from datetime import date
+from datetime import date, datetime
+import hashlib
 import json
 
 from flask_login import UserMixin
+from sqlalchemy import func, literal, select
 from sqlalchemy.orm import joinedload
+from sqlalchemy.types import Integer, TypeDecorator
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from app import db, login
+from app.money import Cents, get_cents
 
 
 @login.user_loader
@@ -39,6 +43,19 @@ class Properties:
         self.set_properties(current_properties)
 
 
+class Money(TypeDecorator):
+    # Stored as whole cents so sums are exact in SQL, loaded as Cents. Values
+    # bound as anything but Cents (form strings, floats, Decimals) are dollars
+    impl = Integer
+
+    def process_bind_param(self, value, dialect):
+        value = get_cents(value)
+        return None if value is None else value.value
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else Cents(value)
+
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
@@ -60,14 +77,47 @@ class User(db.Model, UserMixin):
         return '<User {}>'.format(self.username)
 
 
+def get_transaction_fingerprint(date, description, amount):
+    key = '{:%Y-%m-%d}|{}|{}'.format(
+        date, description, Cents.from_amount(amount).value
+    )
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_fitid_fingerprint(fitid):
+    # OFX/QFX transactions carry a stable id from the bank, dedup on that instead
+    return hashlib.sha1('fitid|{}'.format(fitid).encode('utf-8')).hexdigest()
+
+
+def default_transaction_fingerprint(context):
+    params = context.get_current_parameters()
+    if params.get('date') is None or params.get('amount') is None:
+        return None
+    return get_transaction_fingerprint(
+        params['date'], params.get('description'), params['amount']
+    )
+
+
 class Transaction(db.Model, Properties):
+    __table_args__ = (
+        db.Index(
+            'ix_transaction_account_id_fingerprint',
+            'account_id',
+            'fingerprint',
+            unique=True,
+        ),
+        # Keyset pagination of an account's register in (date, id) order
+        db.Index('ix_transaction_account_id_date_id', 'account_id', 'date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date)
     description = db.Column(db.String(240))
-    amount = db.Column(db.Float)
+    amount = db.Column(Money)
     category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
     category = db.relationship('Category')
     account_id = db.Column(db.Integer, db.ForeignKey("account.id"))
+    fingerprint = db.Column(db.String(40), default=default_transaction_fingerprint)
 
     def __repr__(self):
         return '<Transaction- date: {}, amount: {}, description: {}, category: {}>'.format(
@@ -80,7 +130,7 @@ class Account(db.Model, Properties):
     name = db.Column(db.String(64))
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     transactions = db.relationship('Transaction', backref='account')
-    starting_balance = db.Column(db.Float)
+    starting_balance = db.Column(Money)
     category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
     category = db.relationship('Category')
 
@@ -99,6 +149,7 @@ class Account(db.Model, Properties):
         description_column,
         amount_column,
         category_column,
+        delimiter=',',
     ):
         format_data = {
             'file_format': {
@@ -109,20 +160,29 @@ class Account(db.Model, Properties):
                 'description_column': int(description_column),
                 'amount_column': int(amount_column),
                 'category_column': int(category_column),
+                'delimiter': delimiter or ',',
             }
         }
         self.update_properties(format_data)
 
+    def get_import_rules(self):
+        return self.get_property('import_rules', {})
+
+    def update_import_rules(self, **rules):
+        import_rules = self.get_import_rules()
+        import_rules.update(rules)
+        self.update_properties({'import_rules': import_rules})
+
     def get_ending_balance(self, end_date=None):
         today = date.today()
         if end_date and end_date > today:
             return 0  # return something else
-        ending_balance = self.starting_balance
-        for transaction in self.transactions:
-            if end_date and transaction.date > end_date:
-                continue
-            ending_balance += transaction.amount
-        return ending_balance
+        query = db.session.query(func.sum(Transaction.amount)).filter(
+            Transaction.account_id == self.id
+        )
+        if end_date:
+            query = query.filter(Transaction.date <= end_date)
+        return Cents() + (self.starting_balance or 0) + (query.scalar() or 0)
 
     @classmethod
     def get_brokerage_accounts(cls, user_id):
@@ -135,6 +195,45 @@ class Account(db.Model, Properties):
         )
 
 
+class ImportJournal(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint(
+            'account_id',
+            'content_hash',
+            name='uq_import_journal_account_id_content_hash',
+        ),
+    )
+
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey("account.id"))
+    content_hash = db.Column(db.String(64))
+    format_hash = db.Column(db.String(40))
+    status = db.Column(db.String(16), default=RUNNING)
+    chunks_committed = db.Column(db.Integer, default=0)
+    rows_parsed = db.Column(db.Integer, default=0)
+    inserted = db.Column(db.Integer, default=0)
+    skipped = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    def restart(self, format_hash):
+        self.format_hash = format_hash
+        self.status = self.RUNNING
+        self.chunks_committed = 0
+        self.rows_parsed = 0
+        self.inserted = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return '<ImportJournal {} {}>'.format(self.content_hash, self.status)
+
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64))
@@ -154,48 +253,187 @@ class Category(db.Model):
         return self.parent and not bool(self.children)
 
     def top_level_parent(self):
-        return self.get_parent_categories()[0]
+        return (
+            Category.query.join(
+                CategoryClosure, CategoryClosure.ancestor_id == Category.id
+            )
+            .filter(CategoryClosure.descendant_id == self.id)
+            .order_by(CategoryClosure.depth.desc())
+            .first()
+        )
 
     def get_parent_categories(self):
-        parent_categories = [self]
-        parent_category = self.parent
-        while parent_category:
-            parent_categories.append(parent_category)
-            parent_category = parent_category.parent
-        parent_categories.reverse()
-        return parent_categories
+        return (
+            Category.query.join(
+                CategoryClosure, CategoryClosure.ancestor_id == Category.id
+            )
+            .filter(CategoryClosure.descendant_id == self.id)
+            .order_by(CategoryClosure.depth.desc())
+            .all()
+        )
 
     def get_transaction_level_children(self):
-        transaction_level_children = []
-        for child_category in self.children:
-            if child_category.is_transaction_level:
-                transaction_level_children.append(child_category)
-            else:
-                transaction_level_children.extend(
-                    child_category.get_transaction_level_children()
+        return (
+            Category.query.join(
+                CategoryClosure, CategoryClosure.descendant_id == Category.id
+            )
+            .filter(
+                CategoryClosure.ancestor_id == self.id,
+                CategoryClosure.depth > 0,
+                ~Category.children.any(),
+            )
+            .all()
+        )
+
+    def add_to_closure(self):
+        # Needs the category's id, so call after a flush. The parent's rows
+        # already exist since categories are only ever added under a parent
+        closure = CategoryClosure.__table__
+        db.session.execute(
+            closure.insert().values(
+                ancestor_id=self.id, descendant_id=self.id, depth=0
+            )
+        )
+        if self.parent_id is not None:
+            db.session.execute(
+                closure.insert().from_select(
+                    ['ancestor_id', 'descendant_id', 'depth'],
+                    select(
+                        [
+                            closure.c.ancestor_id,
+                            literal(self.id),
+                            closure.c.depth + 1,
+                        ]
+                    ).where(closure.c.descendant_id == self.parent_id),
                 )
-        return transaction_level_children
+            )
 
     def __repr__(self):
         return '<Category {}>'.format(self.name)
 
 
+class CategoryClosure(db.Model):
+    # One row for every (ancestor, descendant) pair including each category with
+    # itself at depth 0, so subtree and ancestor lookups are a single join
+    ancestor_id = db.Column(
+        db.Integer, db.ForeignKey("category.id"), primary_key=True
+    )
+    descendant_id = db.Column(
+        db.Integer, db.ForeignKey("category.id"), primary_key=True, index=True
+    )
+    depth = db.Column(db.Integer)
+
+    @classmethod
+    def get_rows(cls, parent_ids):
+        # parent_ids maps every category id to its parent id
+        rows = []
+        for category_id in parent_ids:
+            ancestor_id, depth = category_id, 0
+            while ancestor_id is not None:
+                rows.append(
+                    {
+                        'ancestor_id': ancestor_id,
+                        'descendant_id': category_id,
+                        'depth': depth,
+                    }
+                )
+                ancestor_id, depth = parent_ids.get(ancestor_id), depth + 1
+        return rows
+
+    @classmethod
+    def rebuild(cls):
+        parent_ids = dict(db.session.query(Category.id, Category.parent_id))
+        db.session.execute(cls.__table__.delete())
+        rows = cls.get_rows(parent_ids)
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+
+    def __repr__(self):
+        return '<CategoryClosure {} {} {}>'.format(
+            self.ancestor_id, self.descendant_id, self.depth
+        )
+
+
 class Paycheck(db.Model, Properties):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date)
     company_name = db.Column(db.String(64))
-    gross_pay = db.Column(db.Float)
-    federal_income_tax = db.Column(db.Float)
-    social_security_tax = db.Column(db.Float)
-    medicare_tax = db.Column(db.Float)
-    state_income_tax = db.Column(db.Float)
-    health_insurance = db.Column(db.Float)
-    dental_insurance = db.Column(db.Float)
-    traditional_retirement = db.Column(db.Float)
-    roth_retirement = db.Column(db.Float)
-    retirement_match = db.Column(db.Float)
-    net_pay = db.Column(db.Float)
+    gross_pay = db.Column(Money)
+    federal_income_tax = db.Column(Money)
+    social_security_tax = db.Column(Money)
+    medicare_tax = db.Column(Money)
+    state_income_tax = db.Column(Money)
+    health_insurance = db.Column(Money)
+    dental_insurance = db.Column(Money)
+    traditional_retirement = db.Column(Money)
+    roth_retirement = db.Column(Money)
+    retirement_match = db.Column(Money)
+    net_pay = db.Column(Money)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
 
     def __repr__(self):
         return '<Paycheck {}>'.format(self.date)
+
+
+class DataVersion(db.Model):
+    # Counters bumped whenever cached data changes, see app.versions
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, default=0)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    def __repr__(self):
+        return '<DataVersion {} {}>'.format(self.name, self.version)
+
+
+class CategoryMonthTotal(db.Model):
+    # Pre-aggregated ledger, one row per user, category and month. Kept up to
+    # date by app.finance.rollups whenever transactions change
+    __table_args__ = (
+        db.UniqueConstraint(
+            'user_id',
+            'category_id',
+            'year',
+            'month',
+            name='uq_category_month_total_user_id_category_id_year_month',
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
+    year = db.Column(db.Integer)
+    month = db.Column(db.Integer)
+    total = db.Column(Money, default=0)
+    count = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return '<CategoryMonthTotal {} {}-{:02d} {}>'.format(
+            self.category_id, self.year, self.month, self.total
+        )
+
+
+class AccountMonthBalance(db.Model):
+    # Month end balance of an account for every month it had transactions in,
+    # later months without a row carry the last balance forward
+    __table_args__ = (
+        db.UniqueConstraint(
+            'account_id',
+            'year',
+            'month',
+            name='uq_account_month_balance_account_id_year_month',
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey("account.id"))
+    year = db.Column(db.Integer)
+    month = db.Column(db.Integer)
+    net_change = db.Column(Money, default=0)
+    ending_balance = db.Column(Money, default=0)
+
+    def __repr__(self):
+        return '<AccountMonthBalance {} {}-{:02d} {}>'.format(
+            self.account_id, self.year, self.month, self.ending_balance
+        )
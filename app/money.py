@@ -0,0 +1,110 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+
+CENTS = Decimal('0.01')
+
+
+@total_ordering
+class Cents:
+    # An amount of money as a whole number of cents. Adding, subtracting and
+    # comparing stay exact, anything that isn't Cents is read as dollars
+    __slots__ = ('value',)
+
+    def __init__(self, value=0):
+        self.value = int(value)
+
+    @classmethod
+    def from_amount(cls, amount):
+        if isinstance(amount, Cents):
+            return amount
+        if isinstance(amount, Decimal):
+            return cls((amount / CENTS).to_integral_value(rounding=ROUND_HALF_UP))
+        if isinstance(amount, str):
+            try:
+                amount = Decimal(amount)
+            except InvalidOperation:
+                raise ValueError('Invalid amount: {!r}'.format(amount))
+            if not amount.is_finite():
+                raise ValueError('Invalid amount: {!r}'.format(amount))
+            return cls((amount / CENTS).to_integral_value(rounding=ROUND_HALF_UP))
+        # Dollar floats are exact to the cent well past any real balance
+        return cls(round(amount * 100))
+
+    def to_decimal(self):
+        return Decimal(self.value) * CENTS
+
+    def __reduce__(self):
+        return Cents, (self.value,)
+
+    def __repr__(self):
+        return 'Cents({})'.format(self.value)
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec)
+
+    def __float__(self):
+        return self.value / 100
+
+    def __int__(self):
+        return self.value
+
+    def __round__(self, ndigits=None):
+        return round(float(self), ndigits)
+
+    def __bool__(self):
+        return self.value != 0
+
+    def __hash__(self):
+        # Equal to the hash of the same dollars as an int or Decimal
+        if not self.value % 100:
+            return hash(self.value // 100)
+        return hash(self.to_decimal())
+
+    def __eq__(self, other):
+        if not isinstance(other, (Cents, int, float, Decimal)):
+            return NotImplemented
+        return self.value == Cents.from_amount(other).value
+
+    def __lt__(self, other):
+        return self.value < Cents.from_amount(other).value
+
+    def __neg__(self):
+        return Cents(-self.value)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Cents(abs(self.value))
+
+    def __add__(self, other):
+        if other.__class__ is not Cents:
+            other = Cents.from_amount(other)
+        return Cents(self.value + other.value)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if other.__class__ is not Cents:
+            other = Cents.from_amount(other)
+        return Cents(self.value - other.value)
+
+    def __rsub__(self, other):
+        return Cents(Cents.from_amount(other).value - self.value)
+
+    def __mul__(self, factor):
+        # Scaling only, e.g. by the sign of a paycheck field
+        if not isinstance(factor, int):
+            return NotImplemented
+        return Cents(self.value * factor)
+
+    __rmul__ = __mul__
+
+
+def get_cents(amount):
+    if amount is None or (isinstance(amount, str) and not amount.strip()):
+        return None
+    return Cents.from_amount(amount)
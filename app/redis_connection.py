@@ -0,0 +1,17 @@
+from flask import current_app
+
+
+def get_redis_connection(app=None):
+    app = app or current_app
+    if not app.config.get('REDIS_HOST'):
+        return None
+
+    connection = app.extensions.get('redis')
+    if connection is None:
+        import redis
+
+        connection = redis.StrictRedis(
+            host=app.config['REDIS_HOST'], port=app.config['REDIS_PORT']
+        )
+        app.extensions['redis'] = connection
+    return connection
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+import os
+import shutil
+import tempfile
+
+from flask import current_app
+
+# Uploads are spooled to UPLOAD_FOLDER and their jobs get the path, so neither
+# the request nor the job queue holds a whole file in memory. With the redis job
+# queue the folder has to be shared with the `flask worker` processes
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_upload_folder():
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+@contextmanager
+def create_upload():
+    # A new file in the upload folder, its name is the job payload
+    spool = tempfile.NamedTemporaryFile(
+        dir=get_upload_folder(), suffix='.upload', delete=False
+    )
+    try:
+        with spool:
+            yield spool
+    except Exception:
+        os.remove(spool.name)
+        raise
+
+
+def spool_upload(stream):
+    with create_upload() as spool:
+        shutil.copyfileobj(stream, spool, COPY_BUFFER_SIZE)
+    return spool.name
+
+
+def remove_upload(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def open_upload(payload):
+    # The payload is the spooled path, as bytes when it went through redis. The
+    # file is removed once the job is done with it, whether the job worked or not
+    path = os.fsdecode(payload)
+    try:
+        with open(path, 'rb') as stream:
+            yield stream
+    finally:
+        remove_upload(path)
@@ -0,0 +1,100 @@
+from datetime import datetime
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import DataVersion
+from app.redis_connection import get_redis_connection
+
+# Version counters let every worker process keep its own cache of rarely changing
+# data and reload it only after another process changed it. The counters live in
+# redis when it's configured, otherwise in the data_version table.
+
+version_key = 'financial:version:{}'
+updated_at_key = 'financial:version:{}:updated_at'
+
+CATEGORY_VERSION = 'categories'
+
+
+def get_version(name):
+    connection = get_redis_connection()
+    if connection is not None:
+        return int(connection.get(version_key.format(name)) or 0)
+
+    version = (
+        db.session.query(DataVersion.version).filter(DataVersion.name == name).scalar()
+    )
+    return version or 0
+
+
+def bump_version(name):
+    # Call after committing the change so no process can reload the old data
+    # under the new version
+    connection = get_redis_connection()
+    if connection is not None:
+        pipeline = connection.pipeline()
+        pipeline.incr(version_key.format(name))
+        pipeline.set(updated_at_key.format(name), time.time())
+        return pipeline.execute()[0]
+
+    table = DataVersion.__table__
+    update = (
+        table.update()
+        .where(table.c.name == name)
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+    )
+    if not db.session.execute(update).rowcount:
+        try:
+            db.session.execute(
+                table.insert().values(
+                    name=name, version=1, updated_at=datetime.utcnow()
+                )
+            )
+            db.session.commit()
+        except IntegrityError:
+            # Another process created the counter first
+            db.session.rollback()
+            db.session.execute(update)
+            db.session.commit()
+    else:
+        db.session.commit()
+    return get_version(name)
+
+
+def get_versions(names):
+    # name -> (version, updated_at) in one round trip, updated_at is a naive utc
+    # datetime or None for counters that were never bumped
+    versions = {name: (0, None) for name in names}
+    connection = get_redis_connection()
+    if connection is not None:
+        keys = [version_key.format(name) for name in names]
+        keys += [updated_at_key.format(name) for name in names]
+        values = connection.mget(keys)
+        for index, name in enumerate(names):
+            version, updated_at = values[index], values[index + len(names)]
+            if updated_at is not None:
+                updated_at = datetime.utcfromtimestamp(float(updated_at))
+            versions[name] = (int(version or 0), updated_at)
+        return versions
+
+    rows = db.session.query(
+        DataVersion.name, DataVersion.version, DataVersion.updated_at
+    ).filter(DataVersion.name.in_(names))
+    for name, version, updated_at in rows:
+        versions[name] = (version or 0, updated_at)
+    return versions
+
+
+def get_ledger_version_name(user_id):
+    # Bumped on every change to a user's transactions, paychecks or accounts and
+    # by every other write in finance.actions
+    return 'ledger:{}'.format(user_id)
+
+
+def get_ledger_version(user_id):
+    return get_version(get_ledger_version_name(user_id))
+
+
+def bump_ledger_version(user_id):
+    return bump_version(get_ledger_version_name(user_id))
@@ -1,4 +1,6 @@
+import json
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -9,5 +11,31 @@ class Config(object):
         'DATABASE_URL'
     ) or 'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    REDIS_HOST = os.environ.get('REDIS_HOST') or 'localhost'
-    REDIS_PORT = os.environ.get('REDIS_PORT') or 6379
+    # Redis is optional, features that can use it fall back to in-process state
+    REDIS_HOST = os.environ.get('REDIS_HOST')
+    REDIS_PORT = int(os.environ.get('REDIS_PORT') or 6379)
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE') or 1000)
+    # Worker processes for batch uploads, defaults to the number of cores
+    IMPORT_PROCESSES = int(os.environ.get('IMPORT_PROCESSES') or 0) or None
+    # Overrides for importer.DEFAULT_PAYCHECK_COLUMNS, e.g. {"gtl": 18}
+    PAYCHECK_COLUMNS = json.loads(os.environ.get('PAYCHECK_COLUMNS') or '{}')
+    # 'redis' runs jobs in `flask worker`. Without redis 'inline' imports uploads
+    # in the request, and 'memory' runs them on a thread of the process that
+    # queued them, which only works with one worker so needs DEBUG or TESTING
+    JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND') or (
+        'redis' if REDIS_HOST else 'inline'
+    )
+    # Uploads wait here for their import job, shared with the workers
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(
+        tempfile.gettempdir(), 'financial-uploads'
+    )
+    TRANSACTIONS_PER_PAGE = int(os.environ.get('TRANSACTIONS_PER_PAGE') or 100)
+    # Statements computed per worker process, keyed by the user's ledger version
+    STATEMENT_CACHE_SIZE = int(os.environ.get('STATEMENT_CACHE_SIZE') or 256)
+    STATEMENT_CACHE_TTL = int(os.environ.get('STATEMENT_CACHE_TTL') or 600)
+    # Rendered statement tables, shared between workers when redis is configured
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND') or (
+        'redis' if REDIS_HOST else 'memory'
+    )
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 512)
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 3600)
@@ -1,12 +1,20 @@
 from app import db, create_app
+from app.finance import rollups, snapshots
+from app.finance.importer import fingerprint_transactions
+from app.jobs import get_job_queue
 from app.models import Account, Transaction, User
+from app.money import Cents
+from app.versions import bump_ledger_version
 
+import click
 import decimal
 import flask.json
 
 
 class MyJSONEncoder(flask.json.JSONEncoder):
     def default(self, obj):
+        if isinstance(obj, Cents):
+            return str(obj)
         if isinstance(obj, decimal.Decimal) or isinstance(obj, float):
             # Convert decimal instances to strings.
             return str(round(obj, 2))
@@ -20,3 +28,88 @@ app.json_encoder = MyJSONEncoder
 @app.shell_context_processor
 def make_shell_context():
     return {'db': db, 'User': User, 'Transaction': Transaction, 'Account': Account}
+
+
+@app.cli.command()
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+def worker(burst):
+    """Run queued import jobs."""
+    get_job_queue().work(burst=burst)
+
+
+def get_accounts(user_id=None):
+    query = Account.query
+    if user_id is not None:
+        query = query.filter(Account.user_id == user_id)
+    return query.all()
+
+
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, help='Only rebuild this user\'s totals.')
+def rebuild_rollups(user_id):
+    """Rebuild the category month totals and account balances."""
+    inserted = rollups.rebuild(user_id=user_id)
+    click.echo('Rebuilt {} category month totals'.format(inserted))
+    inserted = snapshots.rebuild(get_accounts(user_id))
+    click.echo('Rebuilt {} account month balances'.format(inserted))
+    db.session.commit()
+
+
+@app.cli.command('check-rollups')
+@click.option('--user-id', type=int, help='Only check this user\'s totals.')
+def check_rollups(user_id):
+    """Compare the category month totals and account balances with the transactions."""
+    mismatches = rollups.check(user_id=user_id)
+    for key, ledger, rollup in mismatches:
+        click.echo(
+            'user {} category {} {}-{:02d}: ledger {:.2f} ({}), '
+            'rollup {:.2f} ({})'.format(*key, *ledger, *rollup)
+        )
+    balance_mismatches = snapshots.check(get_accounts(user_id))
+    for account_id, year, month, expected, stored in balance_mismatches:
+        click.echo(
+            'account {} {}-{:02d}: ledger {}, snapshot {}'.format(
+                account_id, year, month, expected, stored
+            )
+        )
+    if mismatches or balance_mismatches:
+        raise click.ClickException(
+            '{} rollups are out of date, run rebuild-rollups'.format(
+                len(mismatches) + len(balance_mismatches)
+            )
+        )
+    click.echo('Rollups match the transactions')
+
+
+@app.cli.command('remove-duplicate-transactions')
+@click.option('--user-id', type=int, help='Only check this user\'s accounts.')
+@click.option('--dry-run', is_flag=True, help='List the duplicates, delete nothing.')
+def remove_duplicate_transactions(user_id, dry_run):
+    """Delete exact duplicate transactions the fingerprint migration left."""
+    accounts = get_accounts(user_id)
+    duplicates = fingerprint_transactions([account.id for account in accounts])
+    for transaction in duplicates:
+        click.echo(
+            'account {} transaction {}: {:%Y-%m-%d} {} {}'.format(
+                transaction.account_id,
+                transaction.id,
+                transaction.date,
+                transaction.description,
+                transaction.amount,
+            )
+        )
+    if dry_run:
+        db.session.rollback()
+        click.echo('Found {} duplicate transactions'.format(len(duplicates)))
+        return
+
+    for transaction in duplicates:
+        db.session.delete(transaction)
+    if duplicates:
+        rollups.rebuild(user_id=user_id)
+        snapshots.rebuild(accounts)
+    db.session.commit()
+    if duplicates:
+        for account_user_id in {account.user_id for account in accounts}:
+            bump_ledger_version(account_user_id)
+    click.echo('Deleted {} duplicate transactions'.format(len(duplicates)))
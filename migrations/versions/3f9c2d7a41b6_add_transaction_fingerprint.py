@@ -0,0 +1,99 @@
+"""add transaction fingerprint
+
+Revision ID: 3f9c2d7a41b6
+Revises: 8d1dba812cef
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+import hashlib
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2d7a41b6'
+down_revision = '8d1dba812cef'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def fingerprint(date, description, amount):
+    # Frozen copy of app.models.get_transaction_fingerprint at this revision
+    key = '{:%Y-%m-%d}|{}|{}'.format(date, description, int(round(amount * 100)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=40), nullable=True))
+
+    connection = op.get_bind()
+    transaction = sa.table(
+        'transaction',
+        sa.column('id', sa.Integer),
+        sa.column('date', sa.Date),
+        sa.column('description', sa.String),
+        sa.column('amount', sa.Float),
+        sa.column('account_id', sa.Integer),
+        sa.column('fingerprint', sa.String),
+    )
+    rows = connection.execute(
+        sa.select(
+            [
+                transaction.c.id,
+                transaction.c.date,
+                transaction.c.description,
+                transaction.c.amount,
+                transaction.c.account_id,
+            ]
+        ).order_by(transaction.c.id)
+    ).fetchall()
+
+    # Exact duplicates already in the ledger keep a NULL fingerprint so the
+    # unique index can be created; only the first occurrence is fingerprinted.
+    # `flask remove-duplicate-transactions` deletes the rest
+    seen = set()
+    updates = []
+    duplicates = 0
+    for row in rows:
+        if row.date is None or row.amount is None:
+            continue
+        key = (row.account_id, fingerprint(row.date, row.description, row.amount))
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        updates.append({'transaction_id': row.id, 'fingerprint': key[1]})
+
+    update = (
+        transaction.update()
+        .where(transaction.c.id == sa.bindparam('transaction_id'))
+        .values(fingerprint=sa.bindparam('fingerprint'))
+    )
+    for index in range(0, len(updates), BATCH_SIZE):
+        connection.execute(update, updates[index : index + BATCH_SIZE])
+    if duplicates:
+        logger.warning(
+            'Left %s duplicate transactions without a fingerprint, run '
+            'flask remove-duplicate-transactions to delete them',
+            duplicates,
+        )
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_transaction_account_id_fingerprint',
+            ['account_id', 'fingerprint'],
+            unique=True,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_account_id_fingerprint')
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,73 @@
+"""store money as cents
+
+Revision ID: b3d8e6f1a925
+Revises: 0a6e3b5d7c21
+Create Date: 2026-10-18 18:04:12.381904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d8e6f1a925'
+down_revision = '0a6e3b5d7c21'
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    'transaction': ['amount'],
+    'account': ['starting_balance'],
+    'paycheck': [
+        'gross_pay',
+        'federal_income_tax',
+        'social_security_tax',
+        'medicare_tax',
+        'state_income_tax',
+        'health_insurance',
+        'dental_insurance',
+        'traditional_retirement',
+        'roth_retirement',
+        'retirement_match',
+        'net_pay',
+    ],
+    'category_month_total': ['total'],
+    'account_month_balance': ['net_change', 'ending_balance'],
+}
+
+
+def get_table(table_name, type_):
+    return sa.table(
+        table_name,
+        *[sa.column(name, type_) for name in MONEY_COLUMNS[table_name]]
+    )
+
+
+def upgrade():
+    for table_name, columns in MONEY_COLUMNS.items():
+        table = get_table(table_name, sa.Float)
+        op.execute(
+            table.update().values(
+                {name: sa.func.round(table.c[name] * 100) for name in columns}
+            )
+        )
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in columns:
+                batch_op.alter_column(
+                    name, existing_type=sa.Float(), type_=sa.Integer()
+                )
+
+
+def downgrade():
+    for table_name, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in columns:
+                batch_op.alter_column(
+                    name, existing_type=sa.Integer(), type_=sa.Float()
+                )
+        table = get_table(table_name, sa.Float)
+        op.execute(
+            table.update().values(
+                {name: table.c[name] / 100.0 for name in columns}
+            )
+        )
@@ -0,0 +1,86 @@
+"""move account import rules to properties
+
+Revision ID: c41e8b6f07d2
+Revises: a7e5c1d92b30
+Create Date: 2026-10-18 11:26:05.114872
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8b6f07d2'
+down_revision = 'a7e5c1d92b30'
+branch_labels = None
+depends_on = None
+
+# Import rules that used to be hard-coded by account id in finance.transactions
+ACCOUNT_IMPORT_RULES = {
+    # TD Ameritrade
+    10: {
+        'ignore_description_prefixes': [
+            'CASH ALTERNATIVES PURCHASE',
+            'CASH ALTERNATIVES REDEMPTION',
+        ],
+        'description_categories': [
+            {'description_prefix': 'Sold', 'category': 'Options Premium'},
+            {'description_prefix': 'Bought', 'category': 'Options Premium Paid'},
+        ],
+        # Interest is in the quantity column right of the description column,
+        # wherever the account's file format puts that
+        'amount_column_overrides': [
+            {
+                'description_prefix': 'CASH ALTERNATIVES INTEREST',
+                'description_offset': 1,
+            }
+        ],
+    },
+    # Merrill Edge
+    12: {'ignore_description_prefixes': ['Deposit ML', 'Withdrawal ML']},
+    # Capital One
+    14: {'invert_amount': True, 'credit_column_fallback': True},
+    # American Express and Apple Card
+    15: {'invert_amount': True},
+    16: {'invert_amount': True},
+}
+
+account = sa.table(
+    'account', sa.column('id', sa.Integer), sa.column('properties', sa.Text)
+)
+
+
+def get_properties(connection, account_id):
+    properties = connection.execute(
+        sa.select([account.c.properties]).where(account.c.id == account_id)
+    ).scalar()
+    return json.loads(properties) if properties else {}
+
+
+def set_properties(connection, account_id, properties):
+    connection.execute(
+        account.update()
+        .where(account.c.id == account_id)
+        .values(properties=json.dumps(properties))
+    )
+
+
+def upgrade():
+    connection = op.get_bind()
+    existing_accounts = connection.execute(
+        sa.select([account.c.id]).where(account.c.id.in_(list(ACCOUNT_IMPORT_RULES)))
+    ).fetchall()
+    for (account_id,) in existing_accounts:
+        properties = get_properties(connection, account_id)
+        properties['import_rules'] = ACCOUNT_IMPORT_RULES[account_id]
+        set_properties(connection, account_id, properties)
+
+
+def downgrade():
+    connection = op.get_bind()
+    for account_id in ACCOUNT_IMPORT_RULES:
+        properties = get_properties(connection, account_id)
+        if properties.pop('import_rules', None) is not None:
+            set_properties(connection, account_id, properties)
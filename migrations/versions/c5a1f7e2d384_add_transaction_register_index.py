@@ -0,0 +1,27 @@
+"""add transaction register index
+
+Revision ID: c5a1f7e2d384
+Revises: b3d8e6f1a925
+Create Date: 2026-10-18 21:26:37.105482
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a1f7e2d384'
+down_revision = 'b3d8e6f1a925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_transaction_account_id_date_id', ['account_id', 'date', 'id']
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_account_id_date_id')
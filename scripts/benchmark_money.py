@@ -0,0 +1,165 @@
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+import random
+import sys
+import os
+import time
+
+if os.path.abspath(os.curdir) not in sys.path:
+    sys.path.append(os.path.abspath(os.curdir))
+
+import sqlalchemy as sa
+
+from app.models import Money
+from app.money import Cents
+from app.utils import get_decimal, round_decimal
+
+parser = argparse.ArgumentParser(
+    description='Check that integer cents give the same balance and statement totals '
+    'as Float amounts with Decimal conversion, and time both. SQLite dominates '
+    'the time, expect about the same speed, the gain is exact totals'
+)
+parser.add_argument('--rows', type=int, default=200000, help='Transactions')
+parser.add_argument('--accounts', type=int, default=10, help='Accounts')
+parser.add_argument('--categories', type=int, default=50, help='Leaf categories')
+parser.add_argument('--repeat', type=int, default=3, help='Best of N runs')
+args = parser.parse_args()
+
+engine = sa.create_engine('sqlite://')
+metadata = sa.MetaData()
+tables = {
+    name: sa.Table(
+        '{}_transaction'.format(name),
+        metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('account_id', sa.Integer),
+        sa.Column('category_id', sa.Integer),
+        sa.Column('date', sa.Date),
+        sa.Column('amount', type_),
+    )
+    for name, type_ in [('float', sa.Float), ('cents', Money)]
+}
+
+
+def generate_rows(num_rows):
+    rand = random.Random(0)
+    start = date(2015, 1, 1)
+    rows = []
+    for index in range(num_rows):
+        rows.append(
+            {
+                'account_id': rand.randint(1, args.accounts),
+                'category_id': rand.randint(1, args.categories),
+                'date': start + timedelta(days=index * 1500 // num_rows),
+                'amount': float('{:.2f}'.format(rand.uniform(-2000, 2000))),
+            }
+        )
+    return rows
+
+
+def month_totals(table, *group_by):
+    year = sa.extract('year', table.c.date)
+    month = sa.extract('month', table.c.date)
+    columns = [table.c[name] for name in group_by] + [year, month]
+    return (
+        sa.select(columns + [sa.func.sum(table.c.amount)])
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+
+
+def float_balances(connection):
+    # Month end balances the way they were read before, every float sum is
+    # converted to a Decimal and rounded so the grid adds up to the cent
+    balances = defaultdict(lambda: get_decimal(0))
+    month_ends = {}
+    for account_id, year, month, total in connection.execute(
+        month_totals(tables['float'], 'account_id')
+    ):
+        balances[account_id] += round_decimal(total)
+        month_ends[account_id, int(year), int(month)] = balances[account_id]
+    return month_ends
+
+
+def cents_balances(connection):
+    balances = defaultdict(Cents)
+    month_ends = {}
+    for account_id, year, month, total in connection.execute(
+        month_totals(tables['cents'], 'account_id')
+    ):
+        balances[account_id] += total
+        month_ends[account_id, int(year), int(month)] = balances[account_id]
+    return month_ends
+
+
+def float_row_totals(connection):
+    # The per transaction loop AccountData ran before the snapshots
+    table = tables['float']
+    totals = defaultdict(lambda: get_decimal(0))
+    for account_id, amount in connection.execute(
+        sa.select([table.c.account_id, table.c.amount])
+    ):
+        totals[account_id] += get_decimal(amount)
+    return totals
+
+
+def cents_row_totals(connection):
+    table = tables['cents']
+    totals = defaultdict(Cents)
+    for account_id, amount in connection.execute(
+        sa.select([table.c.account_id, table.c.amount])
+    ):
+        totals[account_id] += amount
+    return totals
+
+
+def float_statement(connection):
+    return {
+        (category_id, int(year), int(month)): round_decimal(total)
+        for category_id, year, month, total in connection.execute(
+            month_totals(tables['float'], 'category_id')
+        )
+    }
+
+
+def cents_statement(connection):
+    return {
+        (category_id, int(year), int(month)): total
+        for category_id, year, month, total in connection.execute(
+            month_totals(tables['cents'], 'category_id')
+        )
+    }
+
+
+def best_time(func, connection):
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = func(connection)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+metadata.create_all(engine)
+rows = generate_rows(args.rows)
+with engine.connect() as connection:
+    for table in tables.values():
+        connection.execute(table.insert(), rows)
+
+    for path, float_func, cents_func in [
+        ('row totals', float_row_totals, cents_row_totals),
+        ('balances', float_balances, cents_balances),
+        ('statement', float_statement, cents_statement),
+    ]:
+        float_time, float_result = best_time(float_func, connection)
+        cents_time, cents_result = best_time(cents_func, connection)
+        if {key: value.to_decimal() for key, value in cents_result.items()} != (
+            float_result
+        ):
+            print('{}: float and cents totals disagree'.format(path))
+            sys.exit(1)
+        print('{}, {:,} rows'.format(path, len(cents_result)))
+        for name, elapsed in [('float', float_time), ('cents', cents_time)]:
+            print('  {:<8} {:8.3f}s'.format(name, elapsed))
+        print('  float/cents {:.2f}'.format(float_time / cents_time))
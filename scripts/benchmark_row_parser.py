@@ -0,0 +1,211 @@
+import argparse
+import csv
+from datetime import date, datetime, timedelta
+import io
+import random
+import sys
+import os
+import time
+
+if os.path.abspath(os.curdir) not in sys.path:
+    sys.path.append(os.path.abspath(os.curdir))
+
+from app.finance.parsers import compile_row_parser
+from app.models import get_transaction_fingerprint
+
+parser = argparse.ArgumentParser(
+    description='Compare the compiled import row parser with the per-row branch loop'
+)
+parser.add_argument('--rows', type=int, default=100000, help='Rows in the test file')
+parser.add_argument('--repeat', type=int, default=3, help='Best of N runs')
+args = parser.parse_args()
+
+ACCOUNT_ID = 10
+FILE_FORMAT = {
+    'header_rows': 1,
+    'num_columns': 5,
+    'date_column': 1,
+    'date_format': '%m/%d/%Y',
+    'description_column': 2,
+    'amount_column': 4,
+    'category_column': 6,
+}
+IMPORT_RULES = {
+    'ignore_description_prefixes': [
+        'CASH ALTERNATIVES PURCHASE',
+        'CASH ALTERNATIVES REDEMPTION',
+    ],
+    'description_categories': [
+        {'description_prefix': 'Sold', 'category': 'Options Premium'},
+        {'description_prefix': 'Bought', 'category': 'Options Premium Paid'},
+    ],
+    'amount_column_overrides': [
+        {'description_prefix': 'CASH ALTERNATIVES INTEREST', 'description_offset': 1}
+    ],
+}
+CATEGORY_IDS = {
+    'Uncategorized Expense': 1,
+    'Other Income': 2,
+    'Options Premium': 3,
+    'Options Premium Paid': 4,
+}
+DESCRIPTIONS = [
+    'Sold 1 AAPL Jan 20 2023 150.0 Call',
+    'Bought 1 AAPL Jan 20 2023 150.0 Call',
+    'CASH ALTERNATIVES INTEREST',
+    'CASH ALTERNATIVES PURCHASE',
+    'ORDINARY DIVIDEND',
+    'CLIENT REQUESTED ELECTRONIC FUNDING RECEIPT',
+]
+
+
+def generate_file(num_rows):
+    rand = random.Random(0)
+    start = date(2015, 1, 1)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Date', 'Description', 'Quantity', 'Amount', 'Symbol'])
+    for index in range(num_rows):
+        writer.writerow(
+            [
+                '{:%m/%d/%Y}'.format(start + timedelta(days=index // 20)),
+                rand.choice(DESCRIPTIONS),
+                '{:.2f}'.format(rand.uniform(0, 5)),
+                '${:,.2f}'.format(rand.uniform(-5000, 5000)),
+                'AAPL',
+            ]
+        )
+    return output.getvalue().splitlines()
+
+
+def parse_uncompiled(data, account_id, file_format, category_ids):
+    # The row loop as it was before compile_row_parser
+    header_rows = file_format['header_rows']
+    has_category_column = len(data[header_rows]) >= file_format['category_column']
+    uncategorized_expense_id = category_ids.get('Uncategorized Expense')
+    uncategorized_income_id = category_ids.get('Other Income')
+
+    rows = []
+    for row in data[header_rows:]:
+        if not row:
+            continue
+
+        date_data = row[file_format['date_column'] - 1]
+        date_data = date_data.strip()
+        if date_data in [
+            '',
+            '** No Record found for the given criteria **',
+            '***END OF FILE***',
+        ] or date_data.startswith('Total activity from'):
+            continue
+
+        date = datetime.strptime(date_data, file_format['date_format']).date()
+
+        amount_needs_invert = False
+        if account_id in [14, 15, 16]:
+            amount_needs_invert = True
+
+        amount_data = row[file_format['amount_column'] - 1]
+        if account_id == 14 and amount_data == '':
+            amount_data = row[file_format['amount_column']]
+            amount_needs_invert = False
+
+        amount_data = amount_data.replace('$', '')
+        amount_data = amount_data.replace('+', '')
+        amount_data = amount_data.replace(' ', '')
+        amount_data = amount_data.replace(',', '')
+        amount_data = float(amount_data)
+
+        if amount_needs_invert:
+            amount_data = -amount_data
+
+        description = row[file_format['description_column'] - 1]
+        description = description.strip()
+
+        if account_id == 12 and (
+            description.startswith('Deposit ML')
+            or description.startswith('Withdrawal ML')
+        ):
+            continue
+
+        if account_id == 10:
+            if description.startswith(
+                'CASH ALTERNATIVES PURCHASE'
+            ) or description.startswith('CASH ALTERNATIVES REDEMPTION'):
+                continue
+            elif description.startswith('CASH ALTERNATIVES INTEREST'):
+                amount_data = float(row[file_format['description_column']])
+
+        category_id = None
+        if has_category_column:
+            category_id = category_ids.get(row[file_format['category_column'] - 1])
+        elif account_id == 10:
+            if description.startswith('Sold'):
+                category_id = category_ids.get('Options Premium')
+            elif description.startswith('Bought'):
+                category_id = category_ids.get('Options Premium Paid')
+
+        if category_id is None:
+            category_id = (
+                uncategorized_expense_id
+                if amount_data < 0
+                else uncategorized_income_id
+            )
+
+        rows.append(
+            {
+                'date': date,
+                'description': description,
+                'amount': amount_data,
+                'category_id': category_id,
+                'account_id': account_id,
+                'fingerprint': get_transaction_fingerprint(
+                    date, description, amount_data
+                ),
+            }
+        )
+    return rows
+
+
+def parse_compiled(data, account_id, file_format, category_ids):
+    header_rows = file_format['header_rows']
+    parse_row = compile_row_parser(
+        account_id,
+        file_format,
+        IMPORT_RULES,
+        category_ids,
+        has_category_column=len(data[header_rows]) >= file_format['category_column'],
+    )
+    rows = []
+    for row in data[header_rows:]:
+        parsed_row = parse_row(row)
+        if parsed_row:
+            rows.append(parsed_row)
+    return rows
+
+
+def best_time(func, data):
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        rows = func(data, ACCOUNT_ID, FILE_FORMAT, CATEGORY_IDS)
+        timings.append(time.perf_counter() - start)
+    return min(timings), rows
+
+
+lines = generate_file(args.rows)
+data = list(csv.reader(lines))
+
+uncompiled_time, uncompiled_rows = best_time(parse_uncompiled, data)
+compiled_time, compiled_rows = best_time(parse_compiled, data)
+
+if uncompiled_rows != compiled_rows:
+    print('Parsers disagree on the parsed rows')
+    sys.exit(1)
+
+print('{:,} rows, {:,} imported'.format(args.rows, len(compiled_rows)))
+for name, elapsed in [('uncompiled', uncompiled_time), ('compiled', compiled_time)]:
+    print(
+        '{:<12} {:8.3f}s {:>12,.0f} rows/sec'.format(name, elapsed, args.rows / elapsed)
+    )
+print('speedup      {:.2f}x'.format(uncompiled_time / compiled_time))
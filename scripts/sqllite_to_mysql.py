@@ -87,6 +87,10 @@ for category in categories:
     category.parent_id = category_parent_ids.get(category.id)
 destination_session.flush()
 
+closure_rows = m.CategoryClosure.get_rows(category_parent_ids)
+destination_session.execute(m.CategoryClosure.__table__.insert(), closure_rows)
+destination_session.flush()
+
 accounts = []
 for account in source_session.query(m.Account):
     accounts.append(
@@ -0,0 +1,138 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app, db
+from app.finance import categories
+from app.finance.importer import TransactionImporter
+from app.models import Account, Category, CategoryClosure, User
+from app.money import Cents
+from config import Config
+
+CATEGORIES = {
+    'Income': {'Salary': None, 'Other Income': None},
+    'Expense': {
+        'Food': {'Groceries': None, 'Restaurants': None},
+        'Rent': None,
+        'Uncategorized Expense': None,
+    },
+    'Transfer': {'Credit Card Payment': None},
+    'Assetts': {'Current Assetts': {'Checking Account': None}},
+    'Liabilities': {'Current Liabilities': {'Credit Card': None}},
+}
+ACCOUNT_ROOTS = ('Assetts', 'Liabilities')
+
+# Date, Description, Amount, Category
+CSV_FORMAT = {
+    'header_rows': 1,
+    'num_columns': 4,
+    'date_column': 1,
+    'date_format': '%m/%d/%Y',
+    'description_column': 2,
+    'amount_column': 3,
+    'category_column': 4,
+}
+
+
+def make_csv(rows, header='Date,Description,Amount,Category'):
+    lines = [header] + [','.join(str(value) for value in row) for row in rows]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class AppTestCase(unittest.TestCase):
+    # An app on a throwaway sqlite database with the CATEGORIES tree, a user and
+    # a checking account with CSV_FORMAT
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        directory = self.directory
+
+        class TestConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'test.db')
+            # Keeps create_app from writing logs/ into the working directory
+            DEBUG = True
+            TESTING = True
+            WTF_CSRF_ENABLED = False
+            REDIS_HOST = None
+            JOB_QUEUE_BACKEND = 'memory'
+            JOB_QUEUE_THREADED = False
+            FRAGMENT_CACHE_BACKEND = 'memory'
+            UPLOAD_FOLDER = os.path.join(directory, 'uploads')
+
+        self.app = create_app(TestConfig)
+        # Failing imports are part of the tests, keep their tracebacks quiet
+        logging.disable(logging.CRITICAL)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        # The process wide tree is keyed by a version every new database starts
+        # at, so it would outlive the database it was loaded from
+        categories._tree = None
+
+        self.add_categories(CATEGORIES)
+        CategoryClosure.rebuild()
+        self.categories = {category.name: category for category in Category.query}
+        self.user = User(username='test', email='test@example.com')
+        self.user.set_password('password')
+        db.session.add(self.user)
+        db.session.flush()
+        self.account = self.add_account('Checking', 'Checking Account')
+        self.account.update_file_format(**CSV_FORMAT)
+        db.session.commit()
+        # Jobs close the session they run in, which detaches the objects above
+        self.user_id = self.user.id
+        self.account_id = self.account.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        shutil.rmtree(self.directory)
+        logging.disable(logging.NOTSET)
+
+    def add_categories(self, tree, parent=None):
+        for rank, (name, children) in enumerate(tree.items()):
+            if parent is None:
+                category_type = 'account' if name in ACCOUNT_ROOTS else 'transaction'
+            else:
+                category_type = parent.category_type
+            category = Category(
+                name=name, parent=parent, rank=rank, category_type=category_type
+            )
+            db.session.add(category)
+            db.session.flush()
+            if children:
+                self.add_categories(children, category)
+
+    def add_account(self, name, category_name, starting_balance=0):
+        account = Account(
+            name=name,
+            user=self.user,
+            starting_balance=Cents(starting_balance),
+            category=self.categories[category_name],
+        )
+        db.session.add(account)
+        db.session.flush()
+        return account
+
+    def import_rows(self, rows, account=None):
+        importer = TransactionImporter(account or self.account)
+        return importer.import_stream(io.BytesIO(make_csv(rows)))
+
+    def login(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'test', 'password': 'password'})
+        return client
+
+    def upload(self, client, url, data, filename='statement.csv'):
+        return client.post(
+            url,
+            data={'file_upload': (io.BytesIO(data), filename)},
+            content_type='multipart/form-data',
+        )
+
+    def run_jobs(self):
+        self.app.extensions['job_queue'].work(burst=True, timeout=0)
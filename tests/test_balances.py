@@ -0,0 +1,71 @@
+from datetime import date
+import unittest
+
+from app import db
+from app.finance.balances import get_account_balances
+from app.models import Account, User
+from app.money import Cents
+from tests.base import CSV_FORMAT, AppTestCase
+
+ROWS = [
+    ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+    ('01/15/2019', 'Paycheck', '1000.00', 'Salary'),
+    ('03/03/2019', 'Groceries', '-45.10', 'Groceries'),
+]
+
+
+class AccountBalanceTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.account.starting_balance = Cents(10000)
+        # Never used, only its starting balance counts
+        self.savings = self.add_account('Savings', 'Checking Account', 500)
+        other_user = User(username='other', email='other@example.com')
+        db.session.add(other_user)
+        db.session.flush()
+        other = Account(name='Other', user=other_user, starting_balance=Cents(1))
+        other.update_file_format(**CSV_FORMAT)
+        db.session.add(other)
+        db.session.commit()
+        self.savings_id = self.savings.id
+        self.import_rows(ROWS)
+        self.import_rows(ROWS, other)
+
+    def test_balances(self):
+        self.assertEqual(
+            get_account_balances(user_id=self.user_id),
+            {self.account_id: Cents(105140), self.savings_id: Cents(500)},
+        )
+
+    def test_balances_up_to_a_date(self):
+        balances = get_account_balances(
+            user_id=self.user_id, end_date=date(2019, 1, 15)
+        )
+        self.assertEqual(balances[self.account_id], Cents(109650))
+        # The account is kept even without transactions up to the date
+        balances = get_account_balances(end_date=date(2018, 12, 31))
+        self.assertEqual(balances[self.account_id], Cents(10000))
+        self.assertEqual(len(balances), 3)
+
+    def test_matches_the_ending_balance(self):
+        account = Account.query.get(self.account_id)
+        for end_date in (date(2019, 1, 2), date(2019, 2, 28), None):
+            self.assertEqual(
+                get_account_balances(account_ids=[account.id], end_date=end_date),
+                {account.id: account.get_ending_balance(end_date)},
+            )
+
+    def test_accounts_api(self):
+        response = self.app.test_client().get(
+            '/api/user/{}/accounts'.format(self.user_id)
+        )
+        accounts = {
+            account['name']: account for account in response.get_json()['accounts']
+        }
+        self.assertEqual(accounts['Checking']['current_balance'], 1051.40)
+        self.assertEqual(accounts['Savings']['current_balance'], 5.0)
+        self.assertEqual(accounts['Checking']['type'], 'Checking Account')
+
+
+if __name__ == '__main__':
+    unittest.main()
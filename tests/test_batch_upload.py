@@ -0,0 +1,89 @@
+import io
+import os
+import unittest
+import zipfile
+
+from flask import get_flashed_messages
+
+from app import db
+from app.finance import rollups
+from app.models import Transaction
+from tests.base import CSV_FORMAT, AppTestCase, make_csv
+
+
+def make_zip(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as archive:
+        for name, contents in files.items():
+            archive.writestr(name, contents)
+    return data.getvalue()
+
+
+class BatchUploadTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.credit_card = self.add_account('Credit Card', 'Credit Card')
+        self.credit_card.update_file_format(**CSV_FORMAT)
+        db.session.commit()
+        self.credit_card_id = self.credit_card.id
+        self.client = self.login()
+
+    def post_files(self, files):
+        return self.client.post(
+            '/accounts/batch_upload',
+            data={'files': [(io.BytesIO(data), name) for name, data in files.items()]},
+            content_type='multipart/form-data',
+        )
+
+    def test_zip_upload(self):
+        archive = make_zip(
+            {
+                'Checking/2019-01.csv': make_csv(
+                    [
+                        ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+                        ('01/03/2019', 'Paycheck', '1000.00', 'Salary'),
+                    ]
+                ),
+                'Credit Card 2019-01.csv': make_csv(
+                    [('01/04/2019', 'Groceries', '-45.10', 'Groceries')]
+                ),
+                '__MACOSX/._Checking': b'',
+            }
+        )
+        response = self.post_files({'statements.zip': archive})
+        self.assertEqual(response.status_code, 302)
+        self.run_jobs()
+
+        counts = dict(
+            db.session.query(Transaction.account_id, db.func.count()).group_by(
+                Transaction.account_id
+            )
+        )
+        self.assertEqual(counts, {self.account_id: 2, self.credit_card_id: 1})
+        self.assertEqual(rollups.check(self.user_id), [])
+        # Nothing is left spooled once the job is done
+        self.assertEqual(os.listdir(self.app.config['UPLOAD_FOLDER']), [])
+
+    def test_csv_and_zip_upload_with_an_unmatched_file(self):
+        with self.client:
+            self.post_files(
+                {
+                    'checking.csv': make_csv(
+                        [('01/02/2019', 'Coffee', '-3.50', 'Restaurants')]
+                    ),
+                    'more.zip': make_zip(
+                        {
+                            'Savings.csv': make_csv(
+                                [('01/02/2019', 'Interest', '1.00', 'Salary')]
+                            )
+                        }
+                    ),
+                }
+            )
+            self.assertEqual(get_flashed_messages(), ['No account matched Savings.csv'])
+        self.run_jobs()
+        self.assertEqual(Transaction.query.count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
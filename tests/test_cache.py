@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+from app import cache as cache_module
+from app.cache import LRUCache
+from app.finance import statements
+from app.money import Cents
+from tests.base import AppTestCase
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_least_recently_used_goes_first(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c'), len(cache)), (1, 3, 2))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_expired_entries_are_dropped(self):
+        cache = LRUCache(ttl=10)
+        with mock.patch.object(cache_module.time, 'monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch.object(cache_module.time, 'monotonic', return_value=109):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch.object(cache_module.time, 'monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_get_or_set(self):
+        cache = LRUCache()
+        compute = mock.Mock(return_value=None)
+        # None is a value like any other
+        self.assertIsNone(cache.get_or_set('a', compute))
+        self.assertIsNone(cache.get_or_set('a', compute))
+        self.assertEqual(compute.call_count, 1)
+
+
+class StatementCacheTest(AppTestCase):
+    def test_statement_years_are_shared_until_the_ledger_changes(self):
+        self.import_rows([('01/02/2019', 'Coffee', '-3.50', 'Restaurants')])
+        compute = mock.Mock(wraps=statements.compute_statement_years)
+        with mock.patch.object(statements, 'compute_statement_years', compute):
+            first = statements.get_statement_matrices(self.user_id, 2019, 2019)
+            self.assertIs(
+                statements.get_statement_matrices(self.user_id, 2019, 2019), first
+            )
+            # Only the year that is not cached yet is computed
+            statements.get_statement_matrices(self.user_id, 2018, 2019)
+            self.assertEqual(
+                [call[0] for call in compute.call_args_list],
+                [(self.user_id, 2019, 2019), (self.user_id, 2018, 2018)],
+            )
+
+            self.import_rows([('01/03/2019', 'Tea', '-2.00', 'Restaurants')])
+            matrices = statements.get_statement_matrices(self.user_id, 2019, 2019)
+            self.assertEqual(compute.call_count, 3)
+        self.assertEqual(matrices['Restaurants'].get(2019, 1), Cents(-550))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from unittest import mock
+
+from app import db
+from app.finance import categories
+from app.finance.categories import get_category_tree
+from app.models import Category, CategoryClosure
+from app.versions import CATEGORY_VERSION, bump_version
+from tests.base import AppTestCase
+
+
+class CategoryClosureTest(AppTestCase):
+    def add_category(self, client, name, parent_name=None):
+        parent_id = self.categories[parent_name].id if parent_name else 0
+        client.post('/add_category', data={'name': name, 'parent': parent_id})
+        category = Category.query.filter_by(name=name).one()
+        self.categories[name] = category
+        return category
+
+    def get_closure(self):
+        return {
+            (row.ancestor_id, row.descendant_id, row.depth)
+            for row in CategoryClosure.query
+        }
+
+    def test_add_category_keeps_the_closure(self):
+        client = self.login()
+        self.add_category(client, 'Coffee Shops', 'Restaurants')
+        espresso = self.add_category(client, 'Espresso', 'Coffee Shops')
+        self.add_category(client, 'Gifts')
+
+        parent_ids = dict(db.session.query(Category.id, Category.parent_id))
+        self.assertEqual(
+            self.get_closure(),
+            {
+                (row['ancestor_id'], row['descendant_id'], row['depth'])
+                for row in CategoryClosure.get_rows(parent_ids)
+            },
+        )
+        self.assertEqual(
+            [category.name for category in espresso.get_parent_categories()],
+            ['Expense', 'Food', 'Restaurants', 'Coffee Shops', 'Espresso'],
+        )
+        self.assertEqual(espresso.top_level_parent().name, 'Expense')
+        self.assertEqual(
+            sorted(
+                c.name for c in self.categories['Food'].get_transaction_level_children()
+            ),
+            ['Espresso', 'Groceries'],
+        )
+
+    def test_unknown_parent(self):
+        response = self.login().post(
+            '/add_category', data={'name': 'Orphan', 'parent': 9999}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(Category.query.filter_by(name='Orphan').first())
+
+
+class CategoryTreeTest(AppTestCase):
+    def test_tree_matches_the_rows(self):
+        tree = get_category_tree()
+        self.assertEqual(
+            [node.name for node in tree.roots],
+            ['Income', 'Expense', 'Transfer', 'Assetts', 'Liabilities'],
+        )
+        groceries = tree.get_by_name('Groceries')
+        self.assertEqual(
+            [node.name for node in groceries.get_parent_categories()],
+            ['Expense', 'Food', 'Groceries'],
+        )
+        self.assertEqual(tree.top_level_parent(groceries.id).name, 'Expense')
+        self.assertEqual(
+            [node.name for node in tree.get_transaction_level_categories(['Income'])],
+            ['Salary', 'Other Income'],
+        )
+
+    def test_reloaded_after_a_version_bump(self):
+        tree = get_category_tree()
+        # Another worker adds a category
+        db.session.add(
+            Category(name='Gifts', rank=9, parent_id=tree.get_by_name('Expense').id)
+        )
+        db.session.commit()
+        self.assertIs(get_category_tree(), tree)
+        self.assertIsNone(get_category_tree().get_by_name('Gifts'))
+
+        bump_version(CATEGORY_VERSION)
+        reloaded = get_category_tree()
+        self.assertIsNot(reloaded, tree)
+        self.assertEqual(reloaded.get_by_name('Gifts').parent.name, 'Expense')
+
+    def test_version_is_read_once_per_request(self):
+        with mock.patch.object(
+            categories, 'get_version', wraps=categories.get_version
+        ) as get_version:
+            with self.app.test_request_context():
+                tree = get_category_tree()
+                self.assertIs(get_category_tree(), tree)
+            self.assertEqual(get_version.call_count, 1)
+
+    def test_add_category_reloads_the_tree(self):
+        client = self.login()
+        client.post(
+            '/add_category',
+            data={'name': 'Gifts', 'parent': self.categories['Expense'].id},
+        )
+        self.assertIsNotNone(get_category_tree().get_by_name('Gifts'))
+        response = client.get('/add_category')
+        self.assertIn('Gifts', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from app.versions import CATEGORY_VERSION, bump_version
+from tests.base import AppTestCase
+
+ROWS = [('01/02/2019', 'Coffee', '-3.50', 'Restaurants')]
+
+
+class ConditionalTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_rows(ROWS)
+        self.client = self.login()
+
+    def test_api_etag(self):
+        url = '/api/user/{}/accounts'.format(self.user_id)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        # A new import changes the ledger version
+        self.import_rows([('01/03/2019', 'Tea', '-2.00', 'Restaurants')])
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_statement_last_modified(self):
+        response = self.client.get('/income_statement?year=2019')
+        last_modified = response.headers['Last-Modified']
+        response = self.client.get(
+            '/income_statement?year=2019', headers={'If-Modified-Since': last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_category_changes_invalidate(self):
+        etag = self.client.get('/income_statement').headers['ETag']
+        self.assertEqual(
+            self.client.get(
+                '/income_statement', headers={'If-None-Match': etag}
+            ).status_code,
+            304,
+        )
+        bump_version(CATEGORY_VERSION)
+        self.assertEqual(
+            self.client.get(
+                '/income_statement', headers={'If-None-Match': etag}
+            ).status_code,
+            200,
+        )
+
+    def test_errors_are_not_tagged(self):
+        response = self.client.get('/income_statement?start=2019-05&end=2019-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
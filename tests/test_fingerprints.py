@@ -0,0 +1,77 @@
+from datetime import date
+import unittest
+
+from app import db
+from app.finance import rollups
+from app.finance.importer import TransactionImporter, fingerprint_transactions
+from app.models import Transaction, get_transaction_fingerprint
+from app.money import Cents
+from tests.base import AppTestCase, make_csv
+
+ROWS = [
+    ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+    ('01/03/2019', 'Paycheck', '1000.00', 'Salary'),
+    ('01/04/2019', 'Groceries', '-45.10', 'Groceries'),
+]
+
+
+class FingerprintTest(AppTestCase):
+    def import_rows(self, rows):
+        importer = TransactionImporter(self.account)
+        return importer.import_file(make_csv(rows).decode('utf-8').splitlines())
+
+    def test_reimport_skips_known_rows(self):
+        result = self.import_rows(ROWS)
+        self.assertEqual((result.inserted, result.skipped), (3, 0))
+
+        result = self.import_rows(ROWS + [('01/05/2019', 'Rent', '-900', 'Rent')])
+        self.assertEqual((result.inserted, result.skipped), (1, 3))
+        self.assertEqual(Transaction.query.count(), 4)
+
+    def test_duplicate_rows_in_one_file_are_imported_once(self):
+        result = self.import_rows(ROWS + ROWS[:1])
+        self.assertEqual((result.inserted, result.skipped), (3, 1))
+
+    def test_fingerprint_ignores_how_the_amount_is_written(self):
+        self.assertEqual(
+            get_transaction_fingerprint(date(2019, 1, 2), 'Coffee', Cents(-350)),
+            get_transaction_fingerprint(date(2019, 1, 2), 'Coffee', '-3.50'),
+        )
+
+    def test_insert_ignore_drops_rows_already_in_the_ledger(self):
+        self.import_rows(ROWS)
+        importer = TransactionImporter(self.account)
+        rows = list(importer.parse(iter([row for row in ROWS])))
+        # As if another import inserted them between the lookup and the insert
+        self.assertEqual(importer.insert(rows), 0)
+        db.session.commit()
+        self.assertEqual(Transaction.query.count(), 3)
+        self.assertEqual(rollups.check(self.user.id), [])
+
+    def test_fingerprint_transactions_returns_the_duplicates(self):
+        restaurants = self.categories['Restaurants'].id
+        rows = [
+            {
+                'date': date(2019, 1, 2),
+                'description': 'Coffee',
+                'amount': Cents(-350),
+                'category_id': restaurants,
+                'account_id': self.account.id,
+                'fingerprint': None,
+            }
+            for _ in range(3)
+        ]
+        db.session.execute(Transaction.__table__.insert(), rows)
+
+        duplicates = fingerprint_transactions([self.account.id])
+        self.assertEqual(len(duplicates), 2)
+        kept = Transaction.query.filter(Transaction.fingerprint.isnot(None)).one()
+        self.assertEqual(
+            kept.fingerprint,
+            get_transaction_fingerprint(date(2019, 1, 2), 'Coffee', Cents(-350)),
+        )
+        self.assertNotIn(kept, duplicates)
+
+
+if __name__ == '__main__':
+    unittest.main()
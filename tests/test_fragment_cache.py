@@ -0,0 +1,57 @@
+import unittest
+
+from flask import Flask
+
+from app.cache import MemoryFragmentCache, get_fragment_cache
+from tests.base import AppTestCase
+
+ROWS = [('01/02/2019', 'Coffee', '-3.50', 'Restaurants')]
+
+
+class FragmentCacheTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_rows(ROWS)
+        self.client = self.login()
+        self.cache = get_fragment_cache(self.app)
+
+    def get_statement(self, query='year=2019'):
+        response = self.client.get('/income_statement?' + query)
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True)
+
+    def test_table_is_rendered_once(self):
+        page = self.get_statement()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        self.assertEqual(self.get_statement(), page)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.get_statement('year=2018')
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_new_transactions_are_shown(self):
+        self.assertIn('($3.50)', self.get_statement())
+        self.import_rows([('01/03/2019', 'Tea', '-2.00', 'Restaurants')])
+        self.assertIn('($5.50)', self.get_statement())
+        self.assertEqual(self.cache.hits, 0)
+
+
+class FragmentCacheConfigTest(unittest.TestCase):
+    def get_cache(self, **config):
+        app = Flask(__name__)
+        app.config.update(
+            FRAGMENT_CACHE_TTL=60, FRAGMENT_CACHE_SIZE=8, REDIS_HOST=None, **config
+        )
+        return get_fragment_cache(app)
+
+    def test_backends(self):
+        self.assertIsInstance(
+            self.get_cache(FRAGMENT_CACHE_BACKEND='memory'), MemoryFragmentCache
+        )
+        with self.assertRaises(ValueError):
+            self.get_cache(FRAGMENT_CACHE_BACKEND='redis')
+        with self.assertRaises(ValueError):
+            self.get_cache(FRAGMENT_CACHE_BACKEND='disk')
+
+
+if __name__ == '__main__':
+    unittest.main()
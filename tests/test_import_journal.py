@@ -0,0 +1,92 @@
+import io
+import unittest
+from unittest import mock
+
+from app import db
+from app.finance import rollups, snapshots
+from app.finance.importer import TransactionImporter
+from app.models import ImportJournal, Transaction
+from tests.base import AppTestCase, make_csv
+
+ROWS = [
+    ('01/{:02d}/2019'.format(day), 'Purchase {}'.format(day), '-1{}.00'.format(day), '')
+    for day in range(1, 11)
+]
+
+
+class ImportJournalTest(AppTestCase):
+    def import_file(self, data):
+        importer = TransactionImporter(self.account, chunk_size=3)
+        return importer.import_stream(io.BytesIO(data))
+
+    def get_journal(self):
+        return ImportJournal.query.filter_by(account_id=self.account_id).one()
+
+    def test_resume_after_a_failed_chunk(self):
+        data = make_csv(ROWS)
+        insert = TransactionImporter.insert
+        calls = []
+
+        def fail_third_chunk(importer, rows):
+            calls.append(len(rows))
+            if len(calls) == 3:
+                raise RuntimeError('Lost the connection')
+            return insert(importer, rows)
+
+        with mock.patch.object(TransactionImporter, 'insert', fail_third_chunk):
+            with self.assertRaises(RuntimeError):
+                self.import_file(data)
+
+        journal = self.get_journal()
+        self.assertEqual(journal.status, ImportJournal.FAILED)
+        self.assertEqual((journal.chunks_committed, journal.rows_parsed), (2, 6))
+        self.assertEqual(Transaction.query.count(), 6)
+
+        result = self.import_file(data)
+        # The counts of the chunks committed before carry over from the journal
+        self.assertEqual(
+            (result.rows_parsed, result.inserted, result.skipped), (10, 10, 0)
+        )
+        journal = self.get_journal()
+        self.assertEqual(journal.status, ImportJournal.COMPLETE)
+        self.assertEqual(journal.chunks_committed, 4)
+        self.assertEqual(Transaction.query.count(), 10)
+        self.assertEqual(rollups.check(self.user_id), [])
+        self.assertEqual(snapshots.check([self.account]), [])
+
+    def test_parse_error_keeps_the_committed_chunks(self):
+        rows = list(ROWS)
+        rows[7] = ('not a date', 'Broken', '-1.00', '')
+        with self.assertRaises(ValueError):
+            self.import_file(make_csv(rows))
+        journal = self.get_journal()
+        self.assertEqual(
+            (journal.status, journal.rows_parsed), (ImportJournal.FAILED, 6)
+        )
+        self.assertEqual(Transaction.query.count(), 6)
+
+    def test_completed_file_is_skipped(self):
+        data = make_csv(ROWS)
+        self.import_file(data)
+        Transaction.query.delete()
+        db.session.commit()
+
+        result = self.import_file(data)
+        self.assertEqual((result.inserted, result.skipped), (0, 10))
+        self.assertEqual(Transaction.query.count(), 0)
+
+    def test_new_file_format_restarts_the_journal(self):
+        data = make_csv(ROWS)
+        self.import_file(data)
+        Transaction.query.delete()
+        db.session.commit()
+
+        self.account.update_import_rules(invert_amount=True)
+        db.session.commit()
+        result = self.import_file(data)
+        self.assertEqual(result.inserted, 10)
+        self.assertTrue(all(t.amount > 0 for t in Transaction.query))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from flask import Flask, get_flashed_messages
+
+from app import jobs
+from app.models import Transaction
+from tests.base import AppTestCase, make_csv
+
+
+class JobQueueTest(AppTestCase):
+    def use_inline_queue(self):
+        self.app.config['JOB_QUEUE_BACKEND'] = 'inline'
+        jobs.init_app(self.app)
+
+    def test_inline_queue_imports_in_the_request(self):
+        self.use_inline_queue()
+        client = self.login()
+        data = make_csv([('01/02/2019', 'Coffee', '-3.50', 'Restaurants')])
+        response = self.upload(
+            client, '/account/{}/transactions'.format(self.account.id), data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            response.location.endswith('/account/{}/'.format(self.account.id))
+        )
+        self.assertEqual(Transaction.query.count(), 1)
+
+    def test_inline_queue_reports_a_failed_import(self):
+        self.use_inline_queue()
+        client = self.login()
+        data = make_csv([('not a date', 'Coffee', '-3.50', 'Restaurants')])
+        with client:
+            response = self.upload(
+                client, '/account/{}/transactions'.format(self.account.id), data
+            )
+            self.assertEqual(response.status_code, 302)
+            messages = get_flashed_messages()
+        self.assertEqual(len(messages), 1)
+        self.assertIn('The import failed', messages[0])
+        self.assertEqual(Transaction.query.count(), 0)
+
+    def test_memory_queue_runs_jobs_once_worked(self):
+        client = self.login()
+        data = make_csv([('01/02/2019', 'Coffee', '-3.50', 'Restaurants')])
+        response = self.upload(
+            client, '/account/{}/transactions'.format(self.account.id), data
+        )
+        job_id = response.location.rsplit('/', 1)[1]
+        self.assertEqual(
+            client.get('/import/{}/progress'.format(job_id)).get_json()['status'],
+            jobs.QUEUED,
+        )
+
+        self.run_jobs()
+        progress = client.get('/import/{}/progress'.format(job_id)).get_json()
+        self.assertEqual((progress['status'], progress['inserted']), (jobs.FINISHED, 1))
+
+
+class JobQueueConfigTest(unittest.TestCase):
+    def test_memory_queue_needs_debug_or_testing(self):
+        app = Flask(__name__)
+        app.config['JOB_QUEUE_BACKEND'] = 'memory'
+        with self.assertRaises(ValueError):
+            jobs.init_app(app)
+
+        app.config['TESTING'] = True
+        jobs.init_app(app)
+        self.assertIsInstance(app.extensions['job_queue'], jobs.InMemoryJobQueue)
+
+    def test_inline_queue_is_the_default_without_redis(self):
+        app = Flask(__name__)
+        jobs.init_app(app)
+        self.assertIsInstance(app.extensions['job_queue'], jobs.InlineJobQueue)
+
+    def test_job_queue_is_abstract(self):
+        with self.assertRaises(TypeError):
+            jobs.JobQueue()
+
+
+if __name__ == '__main__':
+    unittest.main()
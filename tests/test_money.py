@@ -0,0 +1,51 @@
+from decimal import Decimal
+import unittest
+
+from app.finance.parsers import parse_amount
+from app.money import Cents, get_cents
+
+
+class CentsTest(unittest.TestCase):
+    def test_from_amount(self):
+        self.assertEqual(Cents.from_amount('1003.50').value, 100350)
+        self.assertEqual(Cents.from_amount(' -0.015 ').value, -2)
+        # Parsed as written, float('1.005') * 100 would round down
+        self.assertEqual(Cents.from_amount('1.005').value, 101)
+        self.assertEqual(Cents.from_amount('90071992547409.93').value, 9007199254740993)
+        self.assertEqual(Cents.from_amount(Decimal('2.345')).value, 235)
+        self.assertEqual(Cents.from_amount(12.34).value, 1234)
+        for amount in ('', 'abc', 'nan', 'inf'):
+            with self.assertRaises(ValueError):
+                Cents.from_amount(amount)
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount('$1,003.50'), Cents(100350))
+        self.assertIsNone(get_cents(' '))
+
+    def test_equal_amounts_hash_equal(self):
+        for cents, other in [
+            (Cents(100), 1),
+            (Cents(-200), -2),
+            (Cents(150), Decimal('1.5')),
+            (Cents(150), 1.5),
+            (Cents(0), 0),
+        ]:
+            self.assertEqual(cents, other)
+            self.assertEqual(hash(cents), hash(other))
+        self.assertEqual(len({Cents(100), 1, Decimal('1.00')}), 1)
+
+    def test_other_types_are_not_equal(self):
+        self.assertNotEqual(Cents(100), '1')
+        self.assertNotEqual(Cents(0), None)
+        self.assertIsNone({Cents(100): 'a'}.get('1'))
+
+    def test_arithmetic(self):
+        self.assertEqual(Cents(150) + 1, Cents(250))
+        self.assertEqual(2 - Cents(50), Cents(150))
+        self.assertEqual(sum([Cents(1), Cents(2)]), Cents(3))
+        self.assertEqual(-1 * Cents(5), Cents(-5))
+        self.assertLess(Cents(-1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
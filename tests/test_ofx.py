@@ -0,0 +1,117 @@
+from datetime import date
+import io
+import json
+import unittest
+
+from app import db
+from app.finance.parsers import iter_ofx_transactions, parse_ofx_rows
+from app.models import Account, Transaction
+from app.money import Cents
+from tests.base import AppTestCase
+
+SGML_TRANSACTION = """<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>201901{day:02d}120000[-5:EST]
+<TRNAMT>-{index}.25
+<FITID>ABC{index}
+<NAME>Coffee &amp; Co {index}
+</STMTTRN>
+"""
+
+
+def make_sgml(count):
+    transactions = ''.join(
+        SGML_TRANSACTION.format(day=index % 28 + 1, index=index)
+        for index in range(count)
+    )
+    return (
+        'OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n\n'
+        '<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS>'
+        '</SONRS></SIGNONMSGSRSV1>\n<BANKMSGSRSV1><STMTTRNRS><STMTRS>'
+        '<BANKTRANLIST>\n{}</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1>'
+        '</OFX>'.format(transactions)
+    )
+
+
+XML = (
+    '<?xml version="1.0"?><OFX><STMTTRN><TRNTYPE>CREDIT</TRNTYPE>'
+    '<DTPOSTED>20190105</DTPOSTED><TRNAMT>100.00</TRNAMT><FITID>X1</FITID>'
+    '<MEMO>Pay</MEMO></STMTTRN></OFX>'
+)
+
+
+class OFXParserTest(unittest.TestCase):
+    def test_sgml_with_open_leaf_tags(self):
+        transactions = list(iter_ofx_transactions(io.StringIO(make_sgml(3))))
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual(
+            transactions[1],
+            {
+                'TRNTYPE': 'DEBIT',
+                'DTPOSTED': '20190102120000[-5:EST]',
+                'TRNAMT': '-1.25',
+                'FITID': 'ABC1',
+                'NAME': 'Coffee & Co 1',
+            },
+        )
+
+    def test_xml(self):
+        transactions = list(iter_ofx_transactions(io.StringIO(XML)))
+        self.assertEqual(
+            transactions,
+            [
+                {
+                    'TRNTYPE': 'CREDIT',
+                    'DTPOSTED': '20190105',
+                    'TRNAMT': '100.00',
+                    'FITID': 'X1',
+                    'MEMO': 'Pay',
+                }
+            ],
+        )
+
+    def test_tags_cut_by_the_block_boundary(self):
+        sgml = make_sgml(50)
+        expected = list(iter_ofx_transactions(io.StringIO(sgml)))
+        for block_size in (1, 7, 13, 100):
+            self.assertEqual(
+                list(iter_ofx_transactions(io.StringIO(sgml), block_size)), expected
+            )
+
+    def test_rows(self):
+        category_ids = {'Uncategorized Expense': 1, 'Other Income': 2}
+        rows = list(parse_ofx_rows(io.StringIO(XML + make_sgml(1)), 7, category_ids))
+        self.assertEqual(
+            [(row['date'], row['amount'], row['category_id']) for row in rows],
+            [(date(2019, 1, 5), Cents(10000), 2), (date(2019, 1, 1), Cents(-25), 1)],
+        )
+        self.assertEqual(rows[0]['description'], 'Pay')
+        self.assertEqual(json.loads(rows[0]['properties']), {'fitid': 'X1'})
+
+
+class OFXImportTest(AppTestCase):
+    def upload_ofx(self, client, sgml, filename='statement.ofx'):
+        self.upload(
+            client,
+            '/account/{}/transactions'.format(self.account_id),
+            sgml.encode('utf-8'),
+            filename=filename,
+        )
+        self.run_jobs()
+
+    def test_dedup_on_fitid(self):
+        client = self.login()
+        self.upload_ofx(client, make_sgml(20), filename='statement.QFX')
+        self.assertEqual(Transaction.query.count(), 20)
+
+        # Same transactions with one new FITID, without a file format
+        account = Account.query.get(self.account_id)
+        account.remove_property('file_format')
+        db.session.commit()
+        sgml = make_sgml(20).replace('<FITID>ABC19', '<FITID>NEW19')
+        self.upload_ofx(client, sgml)
+        self.assertEqual(Transaction.query.count(), 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
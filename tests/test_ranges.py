@@ -0,0 +1,102 @@
+from datetime import date
+import unittest
+
+from app.finance.matrix import MonthMatrix
+from app.finance.ranges import MAX_YEARS, ReportRange, get_range_args
+from app.money import Cents
+from tests.base import AppTestCase
+
+
+class ReportRangeTest(unittest.TestCase):
+    def test_from_args(self):
+        today = date(2019, 2, 10)
+        self.assertEqual(ReportRange.trailing_months(3, today).start, (2018, 12))
+        for args, start, end in [
+            ({'year': '2019'}, (2019, 1), (2019, 12)),
+            ({'start': '2019-04', 'end': '2020-03'}, (2019, 4), (2020, 3)),
+            ({'start': '2019-04', 'end': '2019-04'}, (2019, 4), (2019, 4)),
+        ]:
+            report_range = ReportRange.from_args(args)
+            self.assertEqual((report_range.start, report_range.end), (start, end))
+
+    def test_invalid_args(self):
+        for args in [
+            {'start': '2020-01', 'end': '2019-12'},
+            {'start': '2019-13', 'end': '2020-01'},
+            {'start': '2019-04'},
+            {'year': 'last'},
+            {'months': '0'},
+            {'years': str(MAX_YEARS + 1)},
+            {'start': '1900-01', 'end': '{}-01'.format(1900 + MAX_YEARS)},
+        ]:
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                ReportRange.from_args(args)
+        # The longest range allowed
+        ReportRange.from_args(
+            {'start': '1900-01', 'end': '{}-12'.format(1900 + MAX_YEARS - 1)}
+        )
+
+    def test_columns_and_rows(self):
+        matrix = MonthMatrix(2018, 2019)
+        for month in range(1, 13):
+            matrix.set(2018, month, month)
+            matrix.set(2019, month, 100 + month)
+
+        report_range = ReportRange((2018, 11), (2019, 2))
+        self.assertEqual(
+            [label for label, _, _ in report_range.get_columns()],
+            ['Nov 2018', 'Dec 2018', 'Jan 2019', 'Feb 2019'],
+        )
+        self.assertEqual(
+            report_range.get_row(matrix),
+            [Cents(1100), Cents(1200), Cents(10100), Cents(10200)],
+        )
+        # Months outside the matrix are zero
+        self.assertEqual(
+            ReportRange((2017, 12), (2018, 1)).get_row(matrix), [Cents(), Cents(100)]
+        )
+
+        yearly = ReportRange((2018, 11), (2019, 2), yearly=True)
+        self.assertEqual(
+            yearly.get_columns(), [('2018', 2018, None), ('2019', 2019, None)]
+        )
+        self.assertEqual(yearly.get_row(matrix), [Cents(2300), Cents(20300)])
+        self.assertEqual(
+            yearly.get_row(matrix, balances=True), [Cents(1200), Cents(10200)]
+        )
+
+    def test_clipped(self):
+        report_range = ReportRange.for_year(2019).clipped((2019, 3))
+        self.assertEqual(
+            (report_range.end, report_range.get_title()),
+            ((2019, 3), 'Jan 2019 - Mar 2019'),
+        )
+        self.assertTrue(ReportRange.for_year(2019).clipped((2018, 12)).is_empty())
+
+    def test_range_args(self):
+        self.assertEqual(
+            get_range_args({'year': '2019', 'page': '2', 'months': ''}),
+            {'year': '2019'},
+        )
+
+
+class StatementRangeTest(AppTestCase):
+    def test_links_follow_the_range_args(self):
+        client = self.login()
+        client.get('/income_statement?year=2019&utm_source=mail')
+        page = client.get('/income_statement?year=2019').get_data(as_text=True)
+        self.assertNotIn('utm_source', page)
+
+        page = client.get('/income_statement?start=2019-01&end=2019-12').get_data(
+            as_text=True
+        )
+        self.assertNotIn('?year=2019', page)
+        self.assertIn('end=2019-12', page)
+
+    def test_invalid_range(self):
+        response = self.login().get('/income_statement?start=2019-05&end=2019-01')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
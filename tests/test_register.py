@@ -0,0 +1,84 @@
+from datetime import date
+import unittest
+
+from app.finance.register import format_cursor, get_register_page, parse_cursor
+from app.models import Transaction
+from app.money import Cents
+from tests.base import AppTestCase
+
+# Two rows on the 5th so the id breaks the tie
+ROWS = [
+    ('01/{:02d}/2019'.format(day), 'Purchase {}'.format(index), '-1.00', '')
+    for index, day in enumerate([1, 2, 5, 5, 9, 12, 20])
+]
+
+
+class RegisterTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_rows(ROWS)
+        self.transactions = Transaction.query.order_by(
+            Transaction.date, Transaction.id
+        ).all()
+
+    def get_page(self, **kwargs):
+        page = get_register_page(self.account_id, per_page=3, **kwargs)
+        descriptions = [transaction.description for transaction, _ in page.rows]
+        return page, [int(d.split()[1]) for d in descriptions]
+
+    def cursor(self, index):
+        return parse_cursor(format_cursor(self.transactions[index]))
+
+    def test_forward(self):
+        page, indexes = self.get_page()
+        self.assertEqual(indexes, [0, 1, 2])
+        self.assertEqual((page.has_previous, page.has_next), (False, True))
+
+        page, indexes = self.get_page(after=parse_cursor(page.next_cursor))
+        self.assertEqual(indexes, [3, 4, 5])
+        self.assertEqual((page.has_previous, page.has_next), (True, True))
+
+        page, indexes = self.get_page(after=parse_cursor(page.next_cursor))
+        self.assertEqual(indexes, [6])
+        self.assertEqual((page.has_previous, page.has_next), (True, False))
+        self.assertIsNone(page.next_cursor)
+
+    def test_backward(self):
+        page, indexes = self.get_page(before=self.cursor(6))
+        self.assertEqual(indexes, [3, 4, 5])
+        self.assertEqual((page.has_previous, page.has_next), (True, True))
+
+        page, indexes = self.get_page(before=parse_cursor(page.previous_cursor))
+        self.assertEqual(indexes, [0, 1, 2])
+        self.assertEqual((page.has_previous, page.has_next), (False, True))
+
+    def test_cursors_past_the_ends(self):
+        # Back from beyond the last transaction, there's nothing after the page
+        page, indexes = self.get_page(before=(date(2019, 2, 1), 0))
+        self.assertEqual(indexes, [4, 5, 6])
+        self.assertEqual((page.has_previous, page.has_next), (True, False))
+
+        page, indexes = self.get_page(after=(date(2018, 12, 31), 0))
+        self.assertEqual(indexes, [0, 1, 2])
+        self.assertEqual((page.has_previous, page.has_next), (False, True))
+
+    def test_running_balance(self):
+        self.account.starting_balance = Cents(1000)
+        page, _ = self.get_page(before=self.cursor(6), running_balance=True)
+        self.assertEqual(
+            [balance for _, balance in page.rows], [Cents(600), Cents(500), Cents(400)]
+        )
+
+    def test_view(self):
+        self.app.config['TRANSACTIONS_PER_PAGE'] = 3
+        client = self.login()
+        url = '/account/{}/view_transactions'.format(self.account_id)
+        page = client.get(
+            url, query_string={'after': format_cursor(self.transactions[2])}
+        )
+        self.assertIn('Purchase 3', page.get_data(as_text=True))
+        self.assertEqual(client.get(url + '?after=yesterday').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+from datetime import date
+import unittest
+from unittest import mock
+
+from sqlalchemy.sql.expression import Update
+
+from app import db
+from app.finance import rollups
+from app.models import Account, CategoryMonthTotal, Transaction
+from app.money import Cents
+from tests.base import CSV_FORMAT, AppTestCase
+
+ROWS = [
+    ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+    ('01/20/2019', 'Dinner', '-40.00', 'Restaurants'),
+    ('02/03/2019', 'Groceries', '-45.10', 'Groceries'),
+    ('02/15/2019', 'Paycheck', '1000.00', 'Salary'),
+]
+
+
+class RollupTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.categories_by_id = {
+            category.id: name for name, category in self.categories.items()
+        }
+
+    def get_totals(self):
+        return {
+            (self.categories_by_id[category_id], year, month): total
+            for category_id, year, month, total in rollups.get_month_totals(
+                self.user_id, date(2019, 1, 1), date(2019, 12, 31)
+            )
+        }
+
+    def test_import(self):
+        self.import_rows(ROWS)
+        self.assertEqual(
+            self.get_totals(),
+            {
+                ('Restaurants', 2019, 1): Cents(-4350),
+                ('Groceries', 2019, 2): Cents(-4510),
+                ('Salary', 2019, 2): Cents(100000),
+            },
+        )
+        self.assertEqual(rollups.check(self.user_id), [])
+
+    def test_category_moves(self):
+        self.import_rows(ROWS)
+        client = self.login()
+        dinner = Transaction.query.filter_by(description='Dinner').one()
+        for category in ('Groceries', 'Rent', 'Restaurants', 'Rent'):
+            client.post(
+                '/transaction/{}/edit_category'.format(dinner.id),
+                data={'category': self.categories[category].id},
+            )
+            self.assertEqual(rollups.check(self.user_id), [])
+        totals = self.get_totals()
+        self.assertEqual(totals[('Restaurants', 2019, 1)], Cents(-350))
+        self.assertEqual(totals[('Rent', 2019, 1)], Cents(-4000))
+        # Emptied months are dropped rather than left at zero
+        self.assertEqual(
+            CategoryMonthTotal.query.filter_by(
+                category_id=self.categories['Groceries'].id, month=1
+            ).count(),
+            0,
+        )
+
+    def test_delete_account(self):
+        self.import_rows(ROWS)
+        credit_card = self.add_account('Credit Card', 'Credit Card')
+        credit_card.update_file_format(**CSV_FORMAT)
+        db.session.commit()
+        self.import_rows(
+            [('01/05/2019', 'Lunch', '-12.00', 'Restaurants')], credit_card
+        )
+        self.assertEqual(self.get_totals()[('Restaurants', 2019, 1)], Cents(-5550))
+
+        self.login().get('/account/{}/delete/'.format(self.account_id))
+        self.assertIsNone(Account.query.get(self.account_id))
+        self.assertEqual(self.get_totals(), {('Restaurants', 2019, 1): Cents(-1200)})
+        self.assertEqual(rollups.check(self.user_id), [])
+
+    def test_month_inserted_by_another_worker(self):
+        self.import_rows(ROWS)
+        table = CategoryMonthTotal.__table__
+        category_id = self.categories['Rent'].id
+        execute = db.session.execute
+        raced = []
+
+        def racing_execute(statement, *args, **kwargs):
+            # The other worker inserts the month right after our update missed it
+            if isinstance(statement, Update) and not raced:
+                raced.append(statement)
+                execute(
+                    table.insert().values(
+                        user_id=self.user_id,
+                        category_id=category_id,
+                        year=2019,
+                        month=3,
+                        total=Cents(-100000),
+                        count=1,
+                    )
+                )
+                return mock.Mock(rowcount=0)
+            return execute(statement, *args, **kwargs)
+
+        # A change made earlier in the same transaction
+        Transaction.query.filter_by(description='Coffee').delete()
+        with mock.patch.object(db.session, 'execute', racing_execute):
+            rollups.apply_deltas(
+                self.user_id, {(category_id, 2019, 3): [Cents(-5000), 1]}
+            )
+        db.session.commit()
+
+        self.assertTrue(raced)
+        self.assertEqual(self.get_totals()[('Rent', 2019, 3)], Cents(-105000))
+        self.assertIsNone(Transaction.query.filter_by(description='Coffee').first())
+
+
+if __name__ == '__main__':
+    unittest.main()
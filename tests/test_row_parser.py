@@ -0,0 +1,106 @@
+from datetime import date
+import unittest
+
+from app.finance.parsers import compile_row_parser, parse_rows
+from app.money import Cents
+
+# Date, Description, Quantity, Amount, Credit
+FILE_FORMAT = {
+    'header_rows': 1,
+    'num_columns': 5,
+    'date_column': 1,
+    'date_format': '%m/%d/%Y',
+    'description_column': 2,
+    'amount_column': 4,
+    'category_column': 6,
+}
+CATEGORY_IDS = {
+    'Uncategorized Expense': 1,
+    'Other Income': 2,
+    'Options Premium': 3,
+    'Groceries': 4,
+}
+
+
+def parse(row, has_category_column=False, file_format=FILE_FORMAT, **rules):
+    parse_row = compile_row_parser(
+        7, file_format, rules, CATEGORY_IDS, has_category_column
+    )
+    return parse_row(row)
+
+
+class RowParserTest(unittest.TestCase):
+    def test_default_rules(self):
+        row = parse(['01/02/2019', ' Coffee ', '', '$1,003.50', ''])
+        self.assertEqual(row['date'], date(2019, 1, 2))
+        self.assertEqual(row['description'], 'Coffee')
+        self.assertEqual(row['amount'], Cents(100350))
+        self.assertEqual(row['account_id'], 7)
+        self.assertEqual(row['category_id'], CATEGORY_IDS['Other Income'])
+
+    def test_skipped_rows(self):
+        self.assertIsNone(parse([]))
+        self.assertIsNone(parse(['', 'Blank', '', '1', '']))
+        self.assertIsNone(parse(['Total activity from 01/01', '', '', '1', '']))
+
+    def test_invert_amount(self):
+        row = parse(['01/02/2019', 'Charge', '', '25.00', ''], invert_amount=True)
+        self.assertEqual(row['amount'], Cents(-2500))
+        self.assertEqual(row['category_id'], CATEGORY_IDS['Uncategorized Expense'])
+
+    def test_credit_column_fallback(self):
+        row = parse(
+            ['01/02/2019', 'Payment', '', '', '40.00'],
+            invert_amount=True,
+            credit_column_fallback=True,
+        )
+        # Read from the credit column as is
+        self.assertEqual(row['amount'], Cents(4000))
+
+    def test_ignore_description_prefixes(self):
+        row = ['01/02/2019', 'CASH ALTERNATIVES PURCHASE', '', '1.00', '']
+        self.assertIsNone(
+            parse(row, ignore_description_prefixes=['CASH ALTERNATIVES PURCHASE'])
+        )
+
+    def test_amount_column_overrides(self):
+        row = ['01/02/2019', 'CASH ALTERNATIVES INTEREST', '0.42', '0.00', '']
+        override = {'description_prefix': 'CASH ALTERNATIVES INTEREST'}
+        by_column = dict(override, amount_column=3)
+        self.assertEqual(
+            parse(row, amount_column_overrides=[by_column])['amount'], Cents(42)
+        )
+
+        # An offset follows the description column when the format moves it
+        by_offset = dict(override, description_offset=1)
+        moved = dict(FILE_FORMAT, description_column=3, amount_column=5)
+        row = ['01/02/2019', '', 'CASH ALTERNATIVES INTEREST', '0.42', '0.00']
+        row = parse(row, file_format=moved, amount_column_overrides=[by_offset])
+        self.assertEqual(row['amount'], Cents(42))
+
+    def test_categories(self):
+        rules = {
+            'description_categories': [
+                {'description_prefix': 'Sold', 'category': 'Options Premium'}
+            ]
+        }
+        row = parse(['01/02/2019', 'Sold 1 SPY', '', '12.00', ''], **rules)
+        self.assertEqual(row['category_id'], CATEGORY_IDS['Options Premium'])
+
+        # A category column wins over the description rules
+        row = ['01/02/2019', 'Sold 1 SPY', '', '12.00', '', 'Groceries']
+        row = parse(row, has_category_column=True, **rules)
+        self.assertEqual(row['category_id'], CATEGORY_IDS['Groceries'])
+
+    def test_parse_rows_skips_the_header(self):
+        reader = [
+            ['Date', 'Description', 'Quantity', 'Amount', 'Credit'],
+            ['01/02/2019', 'Coffee', '', '-3.50', ''],
+            ['01/03/2019', 'Tea', '', '-2.00', ''],
+        ]
+        rows = list(parse_rows(reader, 7, FILE_FORMAT, {}, CATEGORY_IDS))
+        self.assertEqual([row['description'] for row in rows], ['Coffee', 'Tea'])
+
+
+if __name__ == '__main__':
+    unittest.main()
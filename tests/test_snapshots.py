@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+from sqlalchemy.sql.expression import Select
+
+from app import db
+from app.finance import snapshots
+from app.models import Account, AccountMonthBalance
+from app.money import Cents
+from tests.base import AppTestCase
+
+ROWS = [
+    ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+    ('01/15/2019', 'Paycheck', '1000.00', 'Salary'),
+    ('03/03/2019', 'Groceries', '-45.10', 'Groceries'),
+]
+
+# The edit account form fields of CSV_FORMAT
+CSV_FORM = {
+    'header_rows': '1',
+    'num_columns': '4',
+    'date_column': '1',
+    'date_format': '%m/%d/%Y',
+    'description_column': '2',
+    'amount_column': '3',
+    'category_column': '4',
+    'delimiter': ',',
+}
+
+
+class SnapshotTest(AppTestCase):
+    def get_balances(self):
+        return snapshots.get_snapshots([self.account_id])[self.account_id]
+
+    def check(self):
+        return snapshots.check(Account.query.filter_by(id=self.account_id).all())
+
+    def test_imports_in_any_order(self):
+        self.import_rows(ROWS[2:])
+        # An earlier month moves every later month end
+        self.import_rows(ROWS[:2])
+        self.assertEqual(
+            self.get_balances(), [(2019, 1, Cents(99650)), (2019, 3, Cents(95140))]
+        )
+        self.assertEqual(self.check(), [])
+
+    def test_starting_balance_edit(self):
+        self.import_rows(ROWS)
+        self.login().post(
+            '/account/{}/edit'.format(self.account_id),
+            data=dict(
+                CSV_FORM,
+                name='Checking',
+                starting_balance='100.00',
+                account_category=self.categories['Checking Account'].id,
+            ),
+        )
+        self.assertEqual(self.get_balances()[-1], (2019, 3, Cents(105140)))
+        self.assertEqual(self.check(), [])
+
+    def test_delete_account(self):
+        self.import_rows(ROWS)
+        self.login().get('/account/{}/delete/'.format(self.account_id))
+        self.assertEqual(AccountMonthBalance.query.count(), 0)
+
+    def test_month_inserted_by_another_worker(self):
+        self.import_rows(ROWS)
+        table = AccountMonthBalance.__table__
+        execute = db.session.execute
+        raced = []
+
+        def racing_execute(statement, *args, **kwargs):
+            # The other worker inserts the month right after our lookup missed it
+            if isinstance(statement, Select) and not raced:
+                raced.append(statement)
+                execute(
+                    table.insert().values(
+                        account_id=self.account_id,
+                        year=2019,
+                        month=2,
+                        net_change=0,
+                        ending_balance=Cents(99650),
+                    )
+                )
+                return mock.Mock(scalar=mock.Mock(return_value=None))
+            return execute(statement, *args, **kwargs)
+
+        with mock.patch.object(db.session, 'execute', racing_execute):
+            snapshots.add_net_change(self.account_id, 2019, 2, Cents(-1000))
+        db.session.commit()
+
+        self.assertTrue(raced)
+        self.assertEqual(
+            self.get_balances(),
+            [(2019, 1, Cents(99650)), (2019, 2, Cents(98650)), (2019, 3, Cents(94140))],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
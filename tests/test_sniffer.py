@@ -0,0 +1,146 @@
+import html
+import json
+import re
+import unittest
+
+from app.finance.sniffer import FormatDetectionError, detect_file_format
+from app.models import Account
+from tests.base import CSV_FORMAT, AppTestCase
+
+
+def make_text(header, rows):
+    lines = [header] if header else []
+    return '\n'.join(lines + [','.join(row) for row in rows]) + '\n'
+
+
+ROWS = [
+    ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+    ('01/03/2019', 'Paycheck', '1000.00', 'Salary'),
+    ('01/04/2019', 'Groceries', '-45.10', 'Groceries'),
+]
+DEBIT_CREDIT_ROWS = [
+    ('01/02/2019', 'Coffee', '3.50', '', '996.50'),
+    ('01/03/2019', 'Paycheck', '', '1000.00', '1996.50'),
+    ('01/04/2019', 'Groceries', '45.10', '', '1951.40'),
+]
+
+
+class DetectFileFormatTest(unittest.TestCase):
+    def test_named_columns(self):
+        text = make_text('Date,Description,Amount,Category', ROWS)
+        file_format, import_rules = detect_file_format(text)
+        self.assertEqual(
+            file_format,
+            {
+                'header_rows': 1,
+                'num_columns': 4,
+                'date_column': 1,
+                'date_format': '%m/%d/%Y',
+                'description_column': 2,
+                'amount_column': 3,
+                'category_column': 4,
+                'delimiter': ',',
+            },
+        )
+        self.assertEqual(import_rules, {})
+
+    def test_headerless_file(self):
+        file_format, _ = detect_file_format(make_text(None, ROWS))
+        self.assertEqual(file_format['header_rows'], 0)
+        self.assertEqual(file_format['amount_column'], 3)
+
+    def test_debit_and_credit_columns(self):
+        text = make_text(
+            'Transaction Date,Payee,Debit,Credit,Balance', DEBIT_CREDIT_ROWS
+        )
+        file_format, import_rules = detect_file_format(text)
+        # The running balance is never the amount
+        self.assertEqual(file_format['amount_column'], 3)
+        self.assertEqual(file_format['description_column'], 2)
+        self.assertEqual(
+            import_rules, {'credit_column_fallback': True, 'invert_amount': True}
+        )
+
+    def test_negative_debits_are_not_inverted(self):
+        rows = [
+            row[:2] + ('-' + row[2] if row[2] else '',) + row[3:]
+            for row in DEBIT_CREDIT_ROWS
+        ]
+        text = make_text('Date,Description,Withdrawals,Deposits,Balance', rows)
+        _, import_rules = detect_file_format(text)
+        self.assertFalse(import_rules['invert_amount'])
+
+    def test_credit_before_debit(self):
+        rows = [(row[0], row[1], row[3], row[2], row[4]) for row in DEBIT_CREDIT_ROWS]
+        text = make_text('Date,Payee,Credit,Debit,Balance', rows)
+        with self.assertRaises(FormatDetectionError):
+            detect_file_format(text)
+
+    def test_balance_and_total_columns_are_skipped(self):
+        rows = [
+            ('01/02/2019', 'Coffee', '-3.50', '996.50'),
+            ('01/03/2019', 'Paycheck', '1000.00', '1996.50'),
+        ]
+        text = make_text('Date,Payee,Change,Running Total', rows)
+        file_format, _ = detect_file_format(text)
+        self.assertEqual(file_format['amount_column'], 3)
+
+    def test_unnamed_amount_columns_are_ambiguous(self):
+        rows = [(row[0], row[1], row[2] or '0.00', row[4]) for row in DEBIT_CREDIT_ROWS]
+        text = make_text('Date,Payee,Out,Left', rows)
+        with self.assertRaises(FormatDetectionError):
+            detect_file_format(text)
+
+
+class DetectFormatViewTest(AppTestCase):
+    def get_hidden_field(self, page, name):
+        match = re.search(r'name="{}"[^>]* value="([^"]*)"'.format(name), page)
+        return html.unescape(match.group(1))
+
+    def test_format_is_saved_once_confirmed(self):
+        client = self.login()
+        text = make_text(
+            'Transaction Date,Payee,Debit,Credit,Balance', DEBIT_CREDIT_ROWS
+        )
+        response = self.upload(
+            client,
+            '/account/{}/detect_format'.format(self.account_id),
+            text.encode('utf-8'),
+        )
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+        # The preview reads the Paycheck from the credit column
+        self.assertIn('1,000.00', page)
+        account = Account.query.get(self.account_id)
+        self.assertEqual(account.get_file_format()['amount_column'], 3)
+        self.assertEqual(account.get_import_rules(), {})
+
+        file_format = self.get_hidden_field(page, 'file_format')
+        response = client.post(
+            '/account/{}/file_format'.format(self.account_id),
+            data={
+                'file_format': file_format,
+                'import_rules': self.get_hidden_field(page, 'import_rules'),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        account = Account.query.get(self.account_id)
+        self.assertEqual(account.get_file_format(), json.loads(file_format))
+        self.assertEqual(account.get_file_format()['num_columns'], 5)
+        self.assertTrue(account.get_import_rules()['credit_column_fallback'])
+
+    def test_bad_format_is_rejected(self):
+        client = self.login()
+        url = '/account/{}/file_format'.format(self.account_id)
+        for data in (
+            {'file_format': 'not json'},
+            {'file_format': json.dumps(dict(CSV_FORMAT, colour='red'))},
+            {'file_format': json.dumps(CSV_FORMAT), 'import_rules': '{"x": 1}'},
+        ):
+            self.assertEqual(client.post(url, data=data).status_code, 400)
+        account = Account.query.get(self.account_id)
+        self.assertEqual(account.get_file_format()['num_columns'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from datetime import date
+import unittest
+
+from app.finance import statements
+from app.finance.reports import CategoryRollup, get_ledger_leaf_totals
+from app.money import Cents
+from tests.base import AppTestCase
+
+ROWS = [
+    ('01/02/2019', 'Coffee', '-3.50', 'Restaurants'),
+    ('01/05/2019', 'Groceries', '-45.10', 'Groceries'),
+    ('01/20/2019', 'Dinner', '-40.00', 'Restaurants'),
+    ('01/31/2019', 'Paycheck', '1000.00', 'Salary'),
+    ('02/01/2019', 'Rent', '-800.00', 'Rent'),
+    ('02/15/2019', 'Paycheck', '1000.00', 'Salary'),
+    ('02/16/2019', 'Interest', '0.25', 'Other Income'),
+    ('02/20/2019', 'Card payment', '-100.00', 'Credit Card Payment'),
+    ('12/31/2018', 'Last year', '-9.99', 'Groceries'),
+]
+
+
+class StatementTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_rows(ROWS)
+
+    def get_months(self, matrices, name, months=(1, 2)):
+        return [matrices[name].get(2019, month) for month in months]
+
+    def test_leaf_totals_roll_up_the_tree(self):
+        matrices = statements.compute_statement_years(self.user_id, 2019, 2019)[2019]
+        self.assertEqual(
+            self.get_months(matrices, 'Restaurants'), [Cents(-4350), Cents(0)]
+        )
+        self.assertEqual(self.get_months(matrices, 'Food'), [Cents(-8860), Cents(0)])
+        self.assertEqual(
+            self.get_months(matrices, 'Expense'), [Cents(-8860), Cents(-80000)]
+        )
+        self.assertEqual(
+            self.get_months(matrices, 'Income'), [Cents(100000), Cents(100025)]
+        )
+        self.assertEqual(
+            self.get_months(matrices, 'Net Income'), [Cents(91140), Cents(20025)]
+        )
+        self.assertEqual(
+            self.get_months(matrices, 'Transfer'), [Cents(0), Cents(-10000)]
+        )
+
+    def test_years_are_kept_apart(self):
+        years = statements.compute_statement_years(self.user_id, 2018, 2019)
+        self.assertEqual(years[2018]['Food'].get(2018, 12), Cents(-999))
+        matrices = statements.get_statement_matrices(self.user_id, 2018, 2019)
+        self.assertEqual(matrices['Food'].get(2018, 12), Cents(-999))
+        self.assertEqual(matrices['Food'].get(2019, 1), Cents(-8860))
+
+    def test_partial_months_read_the_ledger(self):
+        rollup = CategoryRollup(date(2019, 1, 1), date(2019, 1, 15))
+        rollup.add_all(
+            get_ledger_leaf_totals(self.user_id, date(2019, 1, 1), date(2019, 1, 15))
+        )
+        totals = rollup.get_totals()
+        self.assertEqual(totals['Food'].get(2019, 1), Cents(-4860))
+        self.assertNotIn('Income', totals)
+
+
+if __name__ == '__main__':
+    unittest.main()